@@ -0,0 +1,81 @@
+"""
+Hosts in a ring, each connected to the next, over loopback TCP against the
+in-memory transport. Reports how long connecting the ring takes and how many
+echo requests per second go around it, with optional latency and bandwidth
+shaping of the memory connections.
+"""
+import argparse
+import asyncio
+import time
+
+import multiaddr
+
+from libp2p import new_node
+from libp2p.transport.memory.memory import MEMORY_PROTOCOL, MemoryTransport
+
+from benchmarks.utils import echo
+
+PROTOCOL_ID = "/echo/1.0.0"
+
+
+async def run_ring(nodes, listen_addr, requests, latency=0):
+    for node in nodes:
+        await node.get_network().listen(multiaddr.Multiaddr(listen_addr))
+        node.set_stream_handler(PROTOCOL_ID, echo)
+
+    start = time.perf_counter()
+    streams = []
+    for node, next_node in zip(nodes, nodes[1:] + nodes[:1]):
+        node.get_peerstore().add_addrs(next_node.get_id(), next_node.get_addrs(), 10)
+        streams.append(await node.new_stream(next_node.get_id(), [PROTOCOL_ID]))
+    connect_elapsed = time.perf_counter() - start
+
+    async def worker(stream):
+        for _ in range(requests):
+            await stream.write(b"ping")
+            await stream.read()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(stream) for stream in streams])
+    echo_elapsed = time.perf_counter() - start
+
+    # Let the echo handlers finish before closing the connections
+    for stream in streams:
+        await stream.close()
+    await asyncio.sleep(0.1 + 2 * latency)
+    for node in nodes:
+        for muxed_conn in list(node.get_network().connections.values()):
+            muxed_conn.close()
+    return connect_elapsed, len(streams) * requests / echo_elapsed
+
+
+async def main(num_hosts, requests, latency, bandwidth):
+    # Keys are generated once, it is by far the slowest part of creating a host
+    nodes = [await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"]) for _ in range(num_hosts)]
+    print("hosts: %d, echo requests per host: %d" % (num_hosts, requests))
+
+    connect, rate = await run_ring(nodes, "/ip4/127.0.0.1/tcp/0", requests)
+    print("tcp:    connected in %6.3f s, %8.0f requests/sec" % (connect, rate))
+
+    nodes = [await new_node(id_opt=node.get_id()) for node in nodes]
+    for node in nodes:
+        node.get_network().add_transport(
+            MEMORY_PROTOCOL, MemoryTransport(latency=latency, bandwidth=bandwidth))
+    connect, rate = await run_ring(nodes, "/ip6/100::", requests, latency)
+    print("memory: connected in %6.3f s, %8.0f requests/sec" % (connect, rate))
+
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--hosts", type=int, default=20)
+    PARSER.add_argument("--requests", type=int, default=200)
+    PARSER.add_argument("--latency", type=float, default=0,
+                        help="one-way latency of memory connections, in seconds")
+    PARSER.add_argument("--bandwidth", type=int, default=None,
+                        help="bandwidth of memory connections, in bytes per second")
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.hosts, ARGS.requests, ARGS.latency, ARGS.bandwidth))
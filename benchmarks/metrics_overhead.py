@@ -0,0 +1,66 @@
+"""
+Throughput of many small messages over a single Mplex stream, read and
+written through net streams, with and without traffic metrics. Small
+messages make the per frame and per message counting as visible as it gets.
+"""
+import argparse
+import asyncio
+import time
+
+from libp2p.metrics.metrics import Metrics
+from libp2p.network.stream.net_stream import NetStream
+from libp2p.tools.connections import create_muxer_pair
+
+
+async def run_once(total_size, write_size, metrics):
+    received = 0
+    done = asyncio.Event()
+
+    async def count_bytes(muxed_stream):
+        nonlocal received
+        stream = NetStream(muxed_stream, metrics)
+        stream.set_protocol("/bench/1.0.0")
+        while received < total_size:
+            received += len(await stream.read())
+        done.set()
+
+    kwargs = {"metrics": metrics} if metrics is not None else {}
+    mplex_a, mplex_b = await create_muxer_pair(handler_b=count_bytes, **kwargs)
+    stream = NetStream(await mplex_a.open_stream("/bench/1.0.0", None), metrics)
+    stream.set_protocol("/bench/1.0.0")
+    payload = bytes(write_size)
+
+    start = time.perf_counter()
+    for _ in range(total_size // write_size):
+        await stream.write(payload)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+
+    mplex_a.close()
+    mplex_b.close()
+    return total_size / elapsed / (1 << 20)
+
+
+async def main(total_size, write_size, rounds):
+    without_metrics = []
+    with_metrics = []
+    # Alternate the runs so that both see the same machine noise
+    for _ in range(rounds):
+        without_metrics.append(await run_once(total_size, write_size, None))
+        with_metrics.append(await run_once(total_size, write_size, Metrics()))
+    before = max(without_metrics)
+    after = max(with_metrics)
+    print("payload: %d MiB, write size: %d bytes, best of %d"
+          % (total_size >> 20, write_size, rounds))
+    print("without metrics: %8.1f MiB/sec" % before)
+    print("with metrics:    %8.1f MiB/sec" % after)
+    print("overhead: %.1f%%" % (100 * (before - after) / before))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--mib", type=int, default=16)
+    PARSER.add_argument("--write-bytes", type=int, default=1024)
+    PARSER.add_argument("--rounds", type=int, default=5)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.mib << 20, ARGS.write_bytes, ARGS.rounds))
@@ -0,0 +1,78 @@
+"""
+Round trip latency of small control messages on one Mplex stream while
+another stream on the same connection saturates it with a bulk transfer,
+comparing a single FIFO outbound queue against the deficit round-robin
+scheduler.
+"""
+import argparse
+import asyncio
+import time
+
+from libp2p.stream_muxer.mplex.mplex_stream import MplexStreamReset
+from libp2p.tools.connections import create_muxer_pair
+
+from benchmarks.utils import percentile, stop_handlers
+
+
+async def run_once(bulk_size, write_size, num_pings, fair):
+    handlers = []
+
+    async def handler(stream):
+        # Echo back the control messages, swallow the bulk transfer
+        handlers.append(asyncio.current_task())
+        try:
+            while True:
+                data = await stream.read()
+                if not data:
+                    break
+                if len(data) < 64:
+                    await stream.write(data)
+        except MplexStreamReset:
+            pass
+
+    mplex_a, mplex_b = await create_muxer_pair(handler_b=handler,
+                                               stream_window_size=4 * write_size)
+    if not fair:
+        # Outbound path before the scheduler: every frame in one FIFO queue
+        queue_frames = mplex_a.queue_frames
+        mplex_a.queue_frames = lambda _stream_id, frames, flushed=None: \
+            queue_frames(0, frames, flushed)
+
+    bulk_stream = await mplex_a.open_stream("/bulk/1.0.0", None)
+    control_stream = await mplex_a.open_stream("/control/1.0.0", None)
+    payload = memoryview(bytearray(write_size))
+
+    async def send_bulk():
+        for _ in range(bulk_size // write_size):
+            await bulk_stream.write(payload)
+
+    bulk = asyncio.ensure_future(send_bulk())
+    latencies = []
+    for _ in range(num_pings):
+        start = time.perf_counter()
+        await control_stream.write(b"ping")
+        await control_stream.readexactly(4)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.001)
+    await stop_handlers([bulk] + handlers)
+
+    mplex_a.close()
+    mplex_b.close()
+    return latencies
+
+
+async def main(bulk_size, write_size, num_pings):
+    print("bulk writes: %d MiB, control messages: %d" % (write_size >> 20, num_pings))
+    for name, fair in (("fifo queue:     ", False), ("round-robin:    ", True)):
+        latencies = await run_once(bulk_size, write_size, num_pings, fair)
+        print("%s p50: %7.2f ms  p99: %7.2f ms"
+              % (name, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--bulk-mib", type=int, default=4096)
+    PARSER.add_argument("--write-mib", type=int, default=16)
+    PARSER.add_argument("--pings", type=int, default=200)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.bulk_mib << 20, ARGS.write_mib << 20, ARGS.pings))
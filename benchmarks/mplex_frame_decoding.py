@@ -0,0 +1,89 @@
+"""
+Frames per second decoded off a loopback TCP connection, comparing the old
+per-byte varint reads against the buffered FrameDecoder used by Mplex.
+"""
+import argparse
+import asyncio
+import struct
+import time
+
+from libp2p.stream_muxer.mplex.constants import READ_CHUNK_SIZE
+from libp2p.stream_muxer.mplex.frame_decoder import FrameDecoder
+from libp2p.stream_muxer.mplex.utils import encode_uvarint
+
+
+def encode_frames(num_frames, message_size):
+    message = b"x" * message_size
+    frame = encode_uvarint(3 << 3 | 2) + encode_uvarint(message_size) + message
+    return frame * num_frames
+
+
+async def decode_uvarint_from_stream(reader, timeout):
+    """
+    Varint read one byte at a time, as Mplex used to read frame headers
+    """
+    shift = 0
+    result = 0
+    while True:
+        byte = await asyncio.wait_for(reader.read(1), timeout=timeout)
+        i = struct.unpack('>H', b'\x00' + byte)[0]
+        result |= (i & 0x7f) << shift
+        shift += 7
+        if not i & 0x80:
+            break
+
+    return result
+
+
+async def decode_per_byte(reader, num_frames):
+    for _ in range(num_frames):
+        await decode_uvarint_from_stream(reader, 10)
+        length = await decode_uvarint_from_stream(reader, 10)
+        await reader.readexactly(length)
+
+
+async def decode_buffered(reader, num_frames):
+    decoder = FrameDecoder()
+    decoded = 0
+    while decoded < num_frames:
+        data = await reader.read(READ_CHUNK_SIZE)
+        decoded += len(decoder.feed(data))
+
+
+async def run_once(decode, num_frames, message_size):
+    payload = encode_frames(num_frames, message_size)
+
+    async def handler(_reader, writer):
+        writer.write(payload)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    start = time.perf_counter()
+    await decode(reader, num_frames)
+    elapsed = time.perf_counter() - start
+
+    writer.close()
+    server.close()
+    await server.wait_closed()
+    return num_frames / elapsed
+
+
+async def main(num_frames, message_size):
+    before = await run_once(decode_per_byte, num_frames, message_size)
+    after = await run_once(decode_buffered, num_frames, message_size)
+    print("frames: %d, message size: %d bytes" % (num_frames, message_size))
+    print("per-byte varint reads: %12.0f frames/sec" % before)
+    print("buffered FrameDecoder: %12.0f frames/sec" % after)
+    print("speedup: %.1fx" % (after / before))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--frames", type=int, default=100000)
+    PARSER.add_argument("--size", type=int, default=64)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.frames, ARGS.size))
@@ -0,0 +1,62 @@
+"""
+Throughput of a large payload sent over a single Mplex stream, comparing
+frames built by concatenating header and payload against payloads queued
+as separate buffers.
+"""
+import argparse
+import asyncio
+import time
+
+from libp2p.stream_muxer.mplex.constants import MAX_MESSAGE_SIZE
+from libp2p.stream_muxer.mplex.utils import encode_uvarint
+from libp2p.tools.connections import create_muxer_pair
+
+from benchmarks.utils import create_byte_counter, stop_handlers
+
+
+async def send_concatenated(mplex, flag, data, stream_id):
+    # Send path before payloads were queued as separate buffers
+    header = encode_uvarint((stream_id << 3) | flag)
+    if data is None:
+        return await mplex.write_frames(stream_id, [(header + encode_uvarint(0),)])
+    frame = header + encode_uvarint(len(data)) + bytes(data)
+    return await mplex.write_frames(stream_id, [(frame,)])
+
+
+async def run_once(total_size, write_size, zero_copy):
+    count_bytes, done, handlers = create_byte_counter(total_size)
+    mplex_a, mplex_b = await create_muxer_pair(handler_b=count_bytes)
+    if not zero_copy:
+        mplex_a.send_message = lambda flag, data, stream_id: \
+            send_concatenated(mplex_a, flag, data, stream_id)
+
+    stream = await mplex_a.open_stream("/bench/1.0.0", True)
+    payload = memoryview(bytearray(total_size))
+
+    start = time.perf_counter()
+    for offset in range(0, total_size, write_size):
+        await stream.write(payload[offset:offset + write_size])
+    await done.wait()
+    elapsed = time.perf_counter() - start
+
+    await stop_handlers(handlers)
+    mplex_a.close()
+    mplex_b.close()
+    return total_size / elapsed / (1 << 20)
+
+
+async def main(total_size, write_size):
+    before = await run_once(total_size, write_size, False)
+    after = await run_once(total_size, write_size, True)
+    print("payload: %d MiB, write size: %d KiB" % (total_size >> 20, write_size >> 10))
+    print("concatenated frames: %8.1f MiB/sec" % before)
+    print("separate buffers:    %8.1f MiB/sec" % after)
+    print("speedup: %.2fx" % (after / before))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--mib", type=int, default=64)
+    PARSER.add_argument("--write-kib", type=int, default=MAX_MESSAGE_SIZE >> 10)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.mib << 20, ARGS.write_kib << 10))
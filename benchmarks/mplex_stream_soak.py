@@ -0,0 +1,53 @@
+"""
+Soak test opening and closing a large number of short-lived Mplex streams
+on one connection, printing peak memory along the way. Memory should stay
+flat once the first batches of streams have been reclaimed.
+"""
+import argparse
+import asyncio
+import resource
+import time
+
+from libp2p.tools.connections import create_muxer_pair
+
+
+async def main(num_streams, concurrency):
+    async def respond_and_close(stream):
+        await stream.read()
+        await stream.write(b"response")
+        await stream.close()
+
+    mplex_a, mplex_b = await create_muxer_pair(handler_b=respond_and_close)
+    per_worker = num_streams // concurrency
+    report_every = max(per_worker // 10, 1)
+    start = time.perf_counter()
+
+    async def worker(index):
+        for i in range(per_worker):
+            stream = await mplex_a.open_stream("/soak/1.0.0", True)
+            await stream.write(b"request")
+            await stream.close()
+            await stream.read()
+            await stream.read()
+
+            if index == 0 and (i + 1) % report_every == 0:
+                print("%9d streams, %4d live, peak rss %7d KiB, %6.0f streams/sec" % (
+                    (i + 1) * concurrency,
+                    len(mplex_a.streams) + len(mplex_b.streams),
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                    (i + 1) * concurrency / (time.perf_counter() - start)))
+
+    await asyncio.gather(*[worker(i) for i in range(concurrency)])
+    await asyncio.sleep(0.1)
+    print("live streams after soak: %d" % (len(mplex_a.streams) + len(mplex_b.streams)))
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--streams", type=int, default=1000000)
+    PARSER.add_argument("--concurrency", type=int, default=100)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.streams, ARGS.concurrency))
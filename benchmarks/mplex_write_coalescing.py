@@ -0,0 +1,65 @@
+"""
+Time to send 1 KiB messages across 100 concurrent Mplex streams, comparing
+a drain after every frame against the coalescing outbound queue.
+"""
+import argparse
+import asyncio
+import time
+
+from libp2p.tools.connections import create_muxer_pair
+
+from benchmarks.utils import create_byte_counter, stop_handlers
+
+
+async def write_and_drain(mplex, frames):
+    # Outbound path before frames were coalesced: one write and drain per frame
+    length = 0
+    for frame in frames:
+        mplex.raw_conn.writer.writelines(frame)
+        await mplex.raw_conn.writer.drain()
+        length += sum(len(buffer) for buffer in frame)
+    return length
+
+
+async def run_once(num_streams, num_messages, message_size, coalesce):
+    count_bytes, done, handlers = create_byte_counter(num_streams * num_messages * message_size)
+    mplex_a, mplex_b = await create_muxer_pair(handler_b=count_bytes)
+    if not coalesce:
+        mplex_a.write_frames = lambda _stream_id, frames, wait_flushed=False: \
+            write_and_drain(mplex_a, frames)
+
+    streams = [await mplex_a.open_stream("/bench/1.0.0", True) for _ in range(num_streams)]
+    message = b"x" * message_size
+
+    async def send(stream):
+        for _ in range(num_messages):
+            await stream.write(message)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[send(stream) for stream in streams])
+    await done.wait()
+    elapsed = time.perf_counter() - start
+
+    await stop_handlers(handlers)
+    mplex_a.close()
+    mplex_b.close()
+    return num_streams * num_messages / elapsed
+
+
+async def main(num_streams, num_messages, message_size):
+    before = await run_once(num_streams, num_messages, message_size, False)
+    after = await run_once(num_streams, num_messages, message_size, True)
+    print("streams: %d, messages per stream: %d, message size: %d bytes"
+          % (num_streams, num_messages, message_size))
+    print("drain per frame:  %10.0f messages/sec" % before)
+    print("coalesced writes: %10.0f messages/sec" % after)
+    print("speedup: %.1fx" % (after / before))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--streams", type=int, default=100)
+    PARSER.add_argument("--messages", type=int, default=200)
+    PARSER.add_argument("--size", type=int, default=1024)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.streams, ARGS.messages, ARGS.size))
@@ -0,0 +1,78 @@
+"""
+Mplex against Yamux on one connection carrying a bulk transfer next to a
+latency sensitive ping-pong stream. Reports the bulk throughput and the
+round trip latency percentiles of the ping-pong stream while the bulk
+transfer is running.
+"""
+import argparse
+import asyncio
+import time
+
+from libp2p.stream_muxer.mplex.mplex import Mplex
+from libp2p.stream_muxer.yamux.yamux import Yamux
+from libp2p.tools.connections import create_muxer_pair
+
+from benchmarks.utils import percentile
+
+
+async def run_once(muxer_class, bulk_size, chunk_size, ping_size):
+    async def handler(stream):
+        # Echo back anything short, swallow the bulk transfer
+        while True:
+            data = await stream.read()
+            if not data:
+                break
+            if len(data) <= ping_size:
+                await stream.write(data)
+
+    muxer_a, muxer_b = await create_muxer_pair(muxer_class, handler_b=handler)
+    bulk_stream = await muxer_a.open_stream("/bulk/1.0.0", None)
+    ping_stream = await muxer_a.open_stream("/ping/1.0.0", None)
+    bulk_done = asyncio.Event()
+
+    async def send_bulk():
+        chunk = b"x" * chunk_size
+        for _ in range(bulk_size // chunk_size):
+            await bulk_stream.write(chunk)
+        bulk_done.set()
+
+    async def ping_pong():
+        ping = b"p" * ping_size
+        latencies = []
+        while not bulk_done.is_set():
+            start = time.perf_counter()
+            await ping_stream.write(ping)
+            await ping_stream.readexactly(ping_size)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    _, latencies = await asyncio.gather(send_bulk(), ping_pong())
+    elapsed = time.perf_counter() - start
+
+    # Let the handlers see EOF before the connections go away
+    await bulk_stream.close()
+    await ping_stream.close()
+    await asyncio.sleep(0.1)
+    muxer_a.close()
+    muxer_b.close()
+    return bulk_size / elapsed / (1 << 20), latencies
+
+
+async def main(bulk_size, chunk_size, ping_size):
+    print("bulk transfer: %d MiB in %d KiB writes, ping size: %d bytes"
+          % (bulk_size >> 20, chunk_size >> 10, ping_size))
+    for muxer_class in (Mplex, Yamux):
+        throughput, latencies = await run_once(muxer_class, bulk_size, chunk_size, ping_size)
+        print("%-6s %8.1f MiB/s  pings: %5d  p50: %7.2f ms  p99: %7.2f ms"
+              % (muxer_class.__name__, throughput, len(latencies),
+                 percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--bulk-mib", type=int, default=256)
+    PARSER.add_argument("--chunk-kib", type=int, default=64)
+    PARSER.add_argument("--ping-size", type=int, default=64)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.bulk_mib << 20, ARGS.chunk_kib << 10, ARGS.ping_size))
@@ -0,0 +1,63 @@
+"""
+Multistream-select negotiations per second over a RawConnection, the path
+taken by the security and stream muxer handshakes, comparing newline
+delimited text messages against varint length-prefixed messages.
+"""
+import argparse
+import asyncio
+import time
+
+from libp2p.protocol_muxer.multiselect import Multiselect
+from libp2p.protocol_muxer.multiselect_client import MultiselectClient
+from libp2p.tools.connections import create_raw_conn_pair
+
+
+async def write_line(conn, data):
+    # Framing before length prefixes: messages only end with a newline
+    conn.writer.write(data)
+    await conn.writer.drain()
+
+
+async def read_line(conn):
+    return await conn.reader.readline()
+
+
+async def run_once(num_negotiations, protocols, length_prefixed):
+    conn_a, conn_b = await create_raw_conn_pair()
+    if not length_prefixed:
+        for conn in (conn_a, conn_b):
+            conn.write = lambda data, conn=conn: write_line(conn, data)
+            conn.read = lambda conn=conn: read_line(conn)
+
+    multiselect = Multiselect()
+    multiselect.add_handler(protocols[-1], None)
+    client = MultiselectClient()
+
+    start = time.perf_counter()
+    for _ in range(num_negotiations):
+        # The listener only supports the last protocol proposed
+        await asyncio.gather(client.select_one_of(protocols, conn_a),
+                             multiselect.negotiate(conn_b))
+    elapsed = time.perf_counter() - start
+
+    conn_a.close()
+    conn_b.close()
+    return num_negotiations / elapsed
+
+
+async def main(num_negotiations, num_protocols):
+    protocols = ["/proto/%d.0.0" % i for i in range(num_protocols)]
+    before = await run_once(num_negotiations, protocols, False)
+    after = await run_once(num_negotiations, protocols, True)
+    print("negotiations: %d, protocols proposed: %d" % (num_negotiations, num_protocols))
+    print("newline delimited: %8.0f negotiations/sec" % before)
+    print("length prefixed:   %8.0f negotiations/sec" % after)
+    print("speedup: %.2fx" % (after / before))
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--negotiations", type=int, default=5000)
+    PARSER.add_argument("--protocols", type=int, default=3)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.negotiations, ARGS.protocols))
@@ -0,0 +1,78 @@
+"""
+Request/response echo between two hosts, opening and negotiating a new
+stream for every request against reusing streams from a stream pool.
+Reports requests per second and the mean latency of a request.
+"""
+import argparse
+import asyncio
+import time
+
+import multiaddr
+
+from libp2p import new_node
+from libp2p.network.stream_pool import StreamPool
+
+from benchmarks.utils import echo
+
+PROTOCOL_ID = "/echo/1.0.0"
+
+
+async def set_up_hosts():
+    node_a = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"])
+    node_b = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"])
+    await node_b.get_network().listen(multiaddr.Multiaddr("/ip4/127.0.0.1/tcp/0"))
+    node_b.set_stream_handler(PROTOCOL_ID, echo)
+    node_a.get_peerstore().add_addrs(node_b.get_id(), node_b.get_addrs(), 10)
+    # Connect ahead, so that only streams are measured
+    await node_a.get_network().dial_peer(node_b.get_id())
+    return node_a, node_b
+
+
+async def run_requests(requests, concurrency, send_request):
+    async def worker(count):
+        for _ in range(count):
+            await send_request()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(requests // concurrency) for _ in range(concurrency)])
+    return time.perf_counter() - start
+
+
+async def main(requests, concurrency, size):
+    node_a, node_b = await set_up_hosts()
+    peer_id = node_b.get_id()
+    payload = bytes(size)
+
+    async def new_stream_request():
+        stream = await node_a.new_stream(peer_id, [PROTOCOL_ID])
+        await stream.write(payload)
+        await stream.read()
+        await stream.close()
+
+    pool = StreamPool(node_a.get_network(), max_idle_per_key=concurrency)
+
+    async def pooled_request():
+        async with pool.stream(peer_id, [PROTOCOL_ID]) as stream:
+            await stream.write(payload)
+            await stream.read()
+
+    print("requests: %d, concurrency: %d, payload: %d bytes" % (requests, concurrency, size))
+    for name, send_request in (("new stream per request", new_stream_request),
+                               ("stream pool", pooled_request)):
+        elapsed = await run_requests(requests, concurrency, send_request)
+        print("%-24s %8.0f requests/sec, %6.3f ms/request"
+              % (name + ":", requests / elapsed, 1000 * elapsed * concurrency / requests))
+
+    pool.close()
+    for task in asyncio.all_tasks():
+        if task is not asyncio.current_task():
+            task.cancel()
+
+
+if __name__ == "__main__":
+    PARSER = argparse.ArgumentParser(description=__doc__)
+    PARSER.add_argument("--requests", type=int, default=5000)
+    PARSER.add_argument("--concurrency", type=int, default=8)
+    PARSER.add_argument("--size", type=int, default=64)
+    ARGS = PARSER.parse_args()
+    asyncio.run(main(ARGS.requests, ARGS.concurrency, ARGS.size))
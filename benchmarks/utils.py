@@ -0,0 +1,57 @@
+"""
+Stream handlers and reporting shared by the benchmarks
+"""
+import asyncio
+
+from libp2p.stream_muxer.muxed_stream_interface import MuxedStreamError
+
+
+async def echo(stream):
+    while True:
+        data = await stream.read()
+        if not data:
+            await stream.close()
+            break
+        await stream.write(data)
+
+
+def create_byte_counter(total_size):
+    """
+    Create a stream handler counting the bytes read from every stream it handles
+    :param total_size: number of bytes after which the returned event is set
+    :return: (handler, event set once total_size bytes were read, handler tasks)
+    """
+    received = 0
+    done = asyncio.Event()
+    handlers = []
+
+    async def count_bytes(stream):
+        nonlocal received
+        handlers.append(asyncio.current_task())
+        while True:
+            try:
+                data = await stream.read()
+            except MuxedStreamError:
+                break
+            if not data:
+                break
+            received += len(data)
+            if received >= total_size:
+                done.set()
+
+    return count_bytes, done, handlers
+
+
+async def stop_handlers(handlers):
+    """
+    Cancel stream handler tasks and wait for them to finish
+    :param handlers: handler tasks
+    """
+    for handler in handlers:
+        handler.cancel()
+    await asyncio.gather(*handlers, return_exceptions=True)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -15,12 +15,13 @@ PROTOCOL_ID = '/chat/1.0.0'
 async def read_data(stream):
     while True:
         read_string = await stream.read()
-        if read_string is not None:
-            read_string = read_string.decode()
-            if read_string != "\n":
-                # Green console colour: 	\x1b[32m
-                # Reset console colour: 	\x1b[0m
-                print("\x1b[32m %s\x1b[0m " % read_string, end="")
+        if not read_string:
+            break
+        read_string = read_string.decode()
+        if read_string != "\n":
+            # Green console colour: 	\x1b[32m
+            # Reset console colour: 	\x1b[0m
+            print("\x1b[32m %s\x1b[0m " % read_string, end="")
 
 
 async def write_data(stream):
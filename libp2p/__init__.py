@@ -3,10 +3,13 @@ import multiaddr
 
 from Crypto.PublicKey import RSA
 from libp2p.security.insecure_security import InsecureTransport
+from libp2p.stream_muxer.mplex.mplex import Mplex
 from .peer.peerstore import PeerStore
 from .peer.id import id_from_public_key
+from .network.resource_manager import ResourceManager
 from .network.swarm import Swarm
 from .host.basic_host import BasicHost
+from .metrics.metrics import Metrics
 from .transport.upgrader import TransportUpgrader
 from .transport.tcp.tcp import TCP
 from .kademlia.network import KademliaServer
@@ -54,14 +57,19 @@ def initialize_default_kademlia_router(
 
 def initialize_default_swarm(
         id_opt=None, transport_opt=None, muxer_opt=None,
-        sec_opt=None, peerstore_opt=None, disc_opt=None):
+        sec_opt=None, peerstore_opt=None, disc_opt=None, concurrent_notify=False,
+        conn_manager_opt=None):
     """
     initialize swarm when no swarm is passed in
     :param id_opt: optional id for host
     :param transport_opt: optional choice of transport upgrade
-    :param muxer_opt: optional choice of stream muxer
+    :param muxer_opt: optional mapping from stream muxer protocol id to muxer
+    class, in order of preference
     :param sec_opt: optional choice of security upgrade
     :param peerstore_opt: optional peerstore
+    :param concurrent_notify: true to notify notifees without waiting for them
+    :param conn_manager_opt: optional keyword arguments of the connection
+    manager, e.g. {"low_water": 16, "high_water": 32, "grace_period": 30}
     :return: return a default swarm instance
     """
     # pylint: disable=too-many-arguments, unused-argument
@@ -73,15 +81,17 @@ def initialize_default_swarm(
     transport_opt = transport_opt or ["/ip4/127.0.0.1/tcp/8001"]
     transport = TCP()
 
-    # TODO TransportUpgrader is not doing anything really
-    # TODO parse muxer and sec to pass into TransportUpgrader
-    muxer = muxer_opt or ["mplex/6.7.0"]
+    muxer = muxer_opt or {"/mplex/6.7.0": Mplex}
     sec = sec_opt or {"insecure/1.0.0": InsecureTransport("insecure")}
-    upgrader = TransportUpgrader(sec, muxer)
+    metrics = Metrics()
+    resource_manager = ResourceManager()
+    upgrader = TransportUpgrader(sec, muxer, metrics=metrics,
+                                 resource_manager=resource_manager)
 
     peerstore = peerstore_opt or PeerStore()
     swarm_opt = Swarm(id_opt, peerstore,\
-                      upgrader, transport, disc_opt)
+                      upgrader, transport, disc_opt, concurrent_notify, metrics,
+                      resource_manager, conn_manager_opt)
 
     return swarm_opt
 
@@ -89,14 +99,17 @@ def initialize_default_swarm(
 async def new_node(
         swarm_opt=None, id_opt=None, transport_opt=None,
         muxer_opt=None, sec_opt=None, peerstore_opt=None,
-        disc_opt=None):
+        disc_opt=None, conn_manager_opt=None):
     """
     create new libp2p node
     :param id_opt: optional id for host
     :param transport_opt: optional choice of transport upgrade
-    :param muxer_opt: optional choice of stream muxer
+    :param muxer_opt: optional mapping from stream muxer protocol id to muxer
+    class, in order of preference
     :param sec_opt: optional choice of security upgrade
     :param peerstore_opt: optional peerstore
+    :param conn_manager_opt: optional keyword arguments of the connection
+    manager, e.g. {"low_water": 16, "high_water": 32, "grace_period": 30}
     :return: return a default swarm instance
     """
     # pylint: disable=too-many-arguments
@@ -108,7 +121,8 @@ async def new_node(
         swarm_opt = initialize_default_swarm(
             id_opt=id_opt, transport_opt=transport_opt,
             muxer_opt=muxer_opt, sec_opt=sec_opt,
-            peerstore_opt=peerstore_opt, disc_opt=disc_opt)
+            peerstore_opt=peerstore_opt, disc_opt=disc_opt,
+            conn_manager_opt=conn_manager_opt)
 
     # TODO enable support for other host type
     # TODO routing unimplemented
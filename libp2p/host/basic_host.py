@@ -39,6 +39,18 @@ class BasicHost(IHost):
         :return: mux instance of host
         """
 
+    def get_metrics(self):
+        """
+        :return: Metrics of the traffic of host, per peer and per protocol
+        """
+        return self._network.metrics
+
+    def get_stream_pool(self):
+        """
+        :return: StreamPool of idle streams to reuse for requests to peers
+        """
+        return self._network.stream_pool
+
     def get_addrs(self):
         """
         :return: all the multiaddr addresses this host is listening too
@@ -60,6 +72,26 @@ class BasicHost(IHost):
         """
         return self._network.set_stream_handler(protocol_id, stream_handler)
 
+    def set_stream_handler_match(self, protocol_id, match, stream_handler):
+        """
+        set stream handler for every protocol id match accepts, e.g. a
+        prefix_matcher or semver_matcher of libp2p.protocol_muxer.multiselect
+        :param protocol_id: protocol name, listed in response to ls
+        :param match: function called with a protocol id, returning true if
+        stream_handler handles it
+        :param stream_handler: a stream handler function
+        :return: true if successful
+        """
+        return self._network.set_stream_handler_match(protocol_id, match, stream_handler)
+
+    def remove_stream_handler(self, protocol_id):
+        """
+        remove stream handler set for protocol_id
+        :param protocol_id: protocol id the stream handler was set with
+        :return: true if successful
+        """
+        return self._network.remove_stream_handler(protocol_id)
+
     # protocol_id can be a list of protocol_ids
     # stream will decide which protocol_id to run on
     async def new_stream(self, peer_id, protocol_ids):
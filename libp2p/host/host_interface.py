@@ -21,6 +21,18 @@ class IHost(ABC):
         :return: mux instance of host
         """
 
+    @abstractmethod
+    def get_metrics(self):
+        """
+        :return: Metrics of the traffic of host, per peer and per protocol
+        """
+
+    @abstractmethod
+    def get_stream_pool(self):
+        """
+        :return: StreamPool of idle streams to reuse for requests to peers
+        """
+
     @abstractmethod
     def get_addrs(self):
         """
@@ -36,6 +48,26 @@ class IHost(ABC):
         :return: true if successful
         """
 
+    @abstractmethod
+    def set_stream_handler_match(self, protocol_id, match, stream_handler):
+        """
+        set stream handler for every protocol id match accepts, e.g. a
+        prefix_matcher or semver_matcher of libp2p.protocol_muxer.multiselect
+        :param protocol_id: protocol name, listed in response to ls
+        :param match: function called with a protocol id, returning true if
+        stream_handler handles it
+        :param stream_handler: a stream handler function
+        :return: true if successful
+        """
+
+    @abstractmethod
+    def remove_stream_handler(self, protocol_id):
+        """
+        remove stream handler set for protocol_id
+        :param protocol_id: protocol id the stream handler was set with
+        :return: true if successful
+        """
+
     # protocol_id can be a list of protocol_ids
     # stream will decide which protocol_id to run on
     @abstractmethod
@@ -0,0 +1,259 @@
+import asyncio
+import bisect
+from collections import deque
+
+# Seconds of history rolling rates are computed over
+RATE_WINDOW = 10
+
+# Seconds between the samples rolling rates are computed from
+RATE_SAMPLE_INTERVAL = 1
+
+# Most protocol ids with stats of their own. Protocols of streams are chosen
+# by the peer when handlers match by prefix, so the traffic of the protocols
+# beyond the limit is counted under OTHER_PROTOCOL instead
+MAX_PROTOCOLS = 256
+OTHER_PROTOCOL = "other"
+
+# Upper bounds in seconds of the stream open latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metrics:
+    """
+    Traffic counters of a host, per peer and per protocol id, and the time
+    taken to open streams. Muxed connections count the frames they read and
+    write, net streams count the messages read and written by protocols.
+    Counters are plain attributes, so updating them costs no more than an
+    addition on the hot path.
+
+    Stats of a peer are dropped once it disconnects, and protocols beyond
+    max_protocols share the stats of OTHER_PROTOCOL, so that the maps do
+    not grow with every peer and protocol ever seen.
+
+    Every RATE_SAMPLE_INTERVAL seconds, a timer samples the byte counters of
+    every stats, so rolling rates cover rate_window however often they are read
+    """
+
+    def __init__(self, rate_window=RATE_WINDOW, max_protocols=MAX_PROTOCOLS):
+        """
+        :param rate_window: seconds of history rolling rates are computed over
+        :param max_protocols: most protocol ids with stats of their own
+        """
+        self.rate_window = rate_window
+        self.max_protocols = max_protocols
+
+        # Mapping from peer_id -> TrafficStats
+        self.peers = {}
+        # Mapping from protocol id -> TrafficStats
+        self.protocols = {}
+        # Mapping from protocol id -> LatencyHistogram of opening streams
+        self.stream_open_latency = {}
+        # Timer of the next sample, while there are stats to sample
+        self.sample_timer = None
+
+    def peer_stats(self, peer_id):
+        """
+        :param peer_id: peer the traffic is with
+        :return: TrafficStats of peer_id, created on first use
+        """
+        stats = self.peers.get(peer_id)
+        if stats is None:
+            stats = self.peers[peer_id] = TrafficStats(self.rate_window)
+            self.schedule_sample()
+        return stats
+
+    def remove_peer(self, peer_id):
+        """
+        Forget the stats of a peer that disconnected
+        :param peer_id: peer the traffic was with
+        """
+        self.peers.pop(peer_id, None)
+
+    def protocol_key(self, protocol_id, stats_map):
+        """
+        :param protocol_id: protocol id
+        :param stats_map: mapping from protocol id -> stats
+        :return: protocol_id, or OTHER_PROTOCOL once stats_map is full
+        """
+        if protocol_id in stats_map or len(stats_map) < self.max_protocols:
+            return protocol_id
+        return OTHER_PROTOCOL
+
+    def protocol_stats(self, protocol_id):
+        """
+        :param protocol_id: protocol the traffic runs on
+        :return: TrafficStats of protocol_id, created on first use
+        """
+        protocol_id = self.protocol_key(protocol_id, self.protocols)
+        stats = self.protocols.get(protocol_id)
+        if stats is None:
+            stats = self.protocols[protocol_id] = TrafficStats(self.rate_window)
+            self.schedule_sample()
+        return stats
+
+    def schedule_sample(self):
+        """
+        Sample the stats in RATE_SAMPLE_INTERVAL seconds, unless a sample
+        is already scheduled
+        """
+        if self.sample_timer is None:
+            self.sample_timer = asyncio.get_event_loop().call_later(
+                RATE_SAMPLE_INTERVAL, self.sample)
+
+    def sample(self, now=None):
+        """
+        Sample the byte counters of every stats, and schedule the next
+        sample as long as there are stats left
+        :param now: event loop time, defaults to the current time
+        """
+        if now is None:
+            now = asyncio.get_event_loop().time()
+        for stats in self.peers.values():
+            stats.sample(now)
+        for stats in self.protocols.values():
+            stats.sample(now)
+
+        self.sample_timer = None
+        if self.peers or self.protocols:
+            self.schedule_sample()
+
+    def record_stream_open(self, protocol_id, latency):
+        """
+        :param protocol_id: protocol negotiated on the stream
+        :param latency: seconds taken to open the stream and negotiate its protocol
+        """
+        protocol_id = self.protocol_key(protocol_id, self.stream_open_latency)
+        histogram = self.stream_open_latency.get(protocol_id)
+        if histogram is None:
+            histogram = self.stream_open_latency[protocol_id] = LatencyHistogram()
+        histogram.observe(latency)
+
+    def snapshot(self):
+        """
+        :return: dict of the current counters, rates and histograms, keyed
+        by pretty peer id and protocol id
+        """
+        return {
+            "peers": {peer_id.pretty(): stats.snapshot()
+                      for peer_id, stats in self.peers.items()},
+            "protocols": {protocol_id: stats.snapshot()
+                          for protocol_id, stats in self.protocols.items()},
+            "stream_open_latency": {protocol_id: histogram.snapshot()
+                                    for protocol_id, histogram
+                                    in self.stream_open_latency.items()},
+        }
+
+
+class TrafficStats:
+    """
+    Bytes, frames and messages in and out of a peer or protocol. Frames are
+    counted by muxed connections, messages by net streams
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, rate_window=RATE_WINDOW):
+        """
+        :param rate_window: seconds of history rolling rates are computed over
+        """
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+
+        # (event loop time, bytes_in, bytes_out) samples taken by sample,
+        # oldest first
+        self.rate_window = rate_window
+        self.samples = deque([(asyncio.get_event_loop().time(), 0, 0)])
+
+    def sample(self, now):
+        """
+        Record the byte counters, called every RATE_SAMPLE_INTERVAL seconds
+        :param now: event loop time
+        """
+        self.samples.append((now, self.bytes_in, self.bytes_out))
+        self.drop_old_samples(now)
+
+    def drop_old_samples(self, now):
+        """
+        Drop the samples older than needed, keeping the newest sample at
+        least rate_window old as the base of the rates
+        :param now: event loop time
+        """
+        samples = self.samples
+        while len(samples) > 1 and now - samples[1][0] >= self.rate_window:
+            samples.popleft()
+
+    def rates(self, now=None):
+        """
+        :param now: event loop time, defaults to the current time
+        :return: (bytes in, bytes out) per second over about the last rate_window seconds
+        """
+        if now is None:
+            now = asyncio.get_event_loop().time()
+        self.drop_old_samples(now)
+
+        then, bytes_in, bytes_out = self.samples[0]
+        elapsed = now - then
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (self.bytes_in - bytes_in) / elapsed, (self.bytes_out - bytes_out) / elapsed
+
+    def snapshot(self):
+        """
+        :return: dict of the counters and rolling rates
+        """
+        rate_in, rate_out = self.rates()
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "rate_in": rate_in,
+            "rate_out": rate_out,
+        }
+
+
+class LatencyHistogram:
+    """
+    Counts of observed latencies by bucket, as in a Prometheus histogram
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        :param buckets: increasing upper bounds in seconds of the buckets
+        """
+        self.buckets = buckets
+        # One count per bucket, and the last for latencies above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, latency):
+        """
+        :param latency: seconds observed
+        """
+        self.counts[bisect.bisect_left(self.buckets, latency)] += 1
+        self.count += 1
+        self.sum += latency
+
+    def cumulative_counts(self):
+        """
+        :return: list of (upper bound, number of latencies at most that bound),
+        ending with (float("inf"), count)
+        """
+        total = 0
+        cumulative = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+    def snapshot(self):
+        """
+        :return: dict of the count, sum and cumulative bucket counts
+        """
+        return {"count": self.count, "sum": self.sum, "buckets": self.cumulative_counts()}
@@ -0,0 +1,82 @@
+import asyncio
+
+# Counters of TrafficStats, with the help text of their metric
+TRAFFIC_COUNTERS = (
+    ("bytes_in", "Bytes received"),
+    ("bytes_out", "Bytes sent"),
+    ("frames_in", "Muxer frames received"),
+    ("frames_out", "Muxer frames sent"),
+    ("messages_in", "Stream messages received"),
+    ("messages_out", "Stream messages sent"),
+)
+
+
+def format_metrics(metrics):
+    """
+    Render metrics in the Prometheus text exposition format
+    :param metrics: Metrics to render
+    :return: str of the metrics
+    """
+    lines = []
+    traffic = [("peer", peer_id.pretty(), stats) for peer_id, stats in metrics.peers.items()]
+    traffic += [("protocol", protocol_id, stats)
+                for protocol_id, stats in metrics.protocols.items()]
+
+    for counter, help_text in TRAFFIC_COUNTERS:
+        name = "libp2p_%s_total" % counter
+        lines.append("# HELP %s %s" % (name, help_text))
+        lines.append("# TYPE %s counter" % name)
+        for label, value, stats in traffic:
+            lines.append('%s{%s="%s"} %d' % (name, label, escape(value), getattr(stats, counter)))
+
+    for direction, index in (("in", 0), ("out", 1)):
+        name = "libp2p_bytes_%s_per_second" % direction
+        lines.append("# HELP %s Rolling rate of bytes %s" % (name, direction))
+        lines.append("# TYPE %s gauge" % name)
+        for label, value, stats in traffic:
+            lines.append('%s{%s="%s"} %f' % (name, label, escape(value), stats.rates()[index]))
+
+    name = "libp2p_stream_open_seconds"
+    lines.append("# HELP %s Time taken to open a stream and negotiate its protocol" % name)
+    lines.append("# TYPE %s histogram" % name)
+    for protocol_id, histogram in metrics.stream_open_latency.items():
+        protocol = escape(protocol_id)
+        for bound, count in histogram.cumulative_counts():
+            lines.append('%s_bucket{protocol="%s",le="%s"} %d'
+                         % (name, protocol, "+Inf" if bound == float("inf") else bound, count))
+        lines.append('%s_sum{protocol="%s"} %f' % (name, protocol, histogram.sum))
+        lines.append('%s_count{protocol="%s"} %d' % (name, protocol, histogram.count))
+
+    return "\n".join(lines) + "\n"
+
+
+def escape(label_value):
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+async def serve_metrics(metrics, host="127.0.0.1", port=0):
+    """
+    Serve metrics over HTTP in the Prometheus text format, answering every
+    request with the current metrics
+    :param metrics: Metrics to serve
+    :param host: address to listen on, local only by default
+    :param port: port to listen on, 0 for any free port
+    :return: asyncio server, to be closed to stop serving
+    """
+    async def handle_request(reader, writer):
+        try:
+            # Read the request up to its blank line, its path does not matter
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = format_metrics(metrics).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: %d\r\n"
+                         b"Connection: close\r\n\r\n" % len(body) + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_request, host, port)
@@ -1,7 +1,16 @@
+from libp2p.utils import encode_uvarint, read_uvarint
 from .raw_connection_interface import IRawConnection
 
+# Largest message accepted by read, handshake messages are far smaller
+MAX_MESSAGE_SIZE = 64 * 1024
+
+
 class RawConnection(IRawConnection):
 
+    # Each write is sent as a message that read returns whole, so that
+    # multistream messages need no framing of their own
+    frames_messages = True
+
     def __init__(self, ip, port, reader, writer, initiator):
         # pylint: disable=too-many-arguments
         self.conn_ip = ip
@@ -12,17 +21,30 @@ class RawConnection(IRawConnection):
         self.initiator = initiator
 
     async def write(self, data):
-        self.writer.write(data)
-        self.writer.write("\n".encode())
+        """
+        Write data as a single message, prefixed with its varint encoded length
+        :param data: bytes of the message, which may contain any byte value
+        """
+        self.writer.write(encode_uvarint(len(data)) + data)
         await self.writer.drain()
 
     async def read(self):
-        line = await self.reader.readline()
-        adjusted_line = line.decode().rstrip('\n')
-
-        # TODO: figure out a way to remove \n without going back and forth with
-        # encoding and decoding
-        return adjusted_line.encode()
+        """
+        Read a message written by write on the other end
+        :return: bytes of the message, b"" if the other end hung up
+        :raise RawConnectionError: message is larger than MAX_MESSAGE_SIZE
+        :raise asyncio.IncompleteReadError: other end hung up within a message
+        """
+        try:
+            length = await read_uvarint(self.reader)
+        except ValueError as error:
+            raise RawConnectionError(str(error))
+        if length is None:
+            return b""
+        if length > MAX_MESSAGE_SIZE:
+            raise RawConnectionError("message of %d bytes exceeds maximum of %d bytes"
+                                     % (length, MAX_MESSAGE_SIZE))
+        return await self.reader.readexactly(length)
 
     def close(self):
         self.writer.close()
@@ -35,3 +57,7 @@ class RawConnection(IRawConnection):
         next_id = self._next_id
         self._next_id += 2
         return next_id
+
+
+class RawConnectionError(ValueError):
+    """Raised when a malformed message is read off the connection"""
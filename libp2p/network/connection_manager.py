@@ -0,0 +1,178 @@
+import asyncio
+
+# Connections kept when trimming, and number of connections that triggers a trim
+LOW_WATER = 160
+HIGH_WATER = 192
+
+# Seconds a new connection is safe from trimming
+GRACE_PERIOD = 60
+
+# Seconds between trims while there are too many connections, as connections
+# spared for being new or protected may be trimmed later on
+TRIM_INTERVAL = 10
+
+
+class ConnectionManager:
+    """
+    Keeps the number of connections of a swarm in check. Once more than
+    high_water connections are open, the least valuable connections are
+    closed until low_water are left. Connections younger than grace_period
+    and connections to protected peers are never closed. Value is the sum
+    of the values tagged on a peer, ties go to the connection with the
+    fewest open streams, then to the one idle for longest.
+
+    A trim runs when a connection pushes the count above high_water, then
+    every trim_interval seconds for as long as the count stays above it, so
+    that connections spared for being in their grace period do not stay
+    open for good.
+
+    reference: https://github.com/libp2p/go-libp2p-connmgr/blob/master/connmgr.go
+    """
+
+    def __init__(self, swarm, low_water=LOW_WATER, high_water=HIGH_WATER,
+                 grace_period=GRACE_PERIOD, trim_interval=TRIM_INTERVAL):
+        # pylint: disable=too-many-arguments
+        """
+        :param swarm: swarm whose connections are managed
+        :param low_water: connections kept when trimming
+        :param high_water: number of connections above which a trim starts
+        :param grace_period: seconds a new connection is safe from trimming
+        :param trim_interval: seconds between trims while there are too many connections
+        """
+        if low_water > high_water:
+            raise ValueError("low_water must not exceed high_water")
+        self.swarm = swarm
+        self.low_water = low_water
+        self.high_water = high_water
+        self.grace_period = grace_period
+        self.trim_interval = trim_interval
+        # Timer of the next trim, while there are too many connections
+        self.trim_timer = None
+
+        # Mapping from peer_id -> set of tags protecting the peer
+        self.protected = {}
+        # Mapping from peer_id -> {tag: value}
+        self.tags = {}
+        # Mapping from peer_id -> time its current connection was added
+        self.connected_at = {}
+
+    def protect(self, peer_id, tag):
+        """
+        Never close the connection to peer_id while it is protected by a tag
+        :param peer_id: peer to protect
+        :param tag: reason for protecting the peer, e.g. "gossipsub-mesh"
+        """
+        self.protected.setdefault(peer_id, set()).add(tag)
+
+    def unprotect(self, peer_id, tag):
+        """
+        Remove a protection tag from peer_id
+        :param peer_id: peer protected
+        :param tag: tag passed to protect
+        :return: true if the peer is still protected by other tags
+        """
+        tags = self.protected.get(peer_id)
+        if tags is None:
+            return False
+        tags.discard(tag)
+        if not tags:
+            del self.protected[peer_id]
+            return False
+        return True
+
+    def is_protected(self, peer_id):
+        """
+        :param peer_id: peer to check
+        :return: true if peer_id is protected by any tag
+        """
+        return peer_id in self.protected
+
+    def tag_peer(self, peer_id, tag, value):
+        """
+        Set how much the connection to peer_id is worth to tag. Connections
+        worth less are closed first
+        :param peer_id: peer to tag
+        :param tag: name of the tag
+        :param value: value of the tag
+        """
+        self.tags.setdefault(peer_id, {})[tag] = value
+
+    def untag_peer(self, peer_id, tag):
+        """
+        Remove a tag from peer_id
+        :param peer_id: peer tagged
+        :param tag: name of the tag
+        """
+        tags = self.tags.get(peer_id)
+        if tags is not None:
+            tags.pop(tag, None)
+            if not tags:
+                del self.tags[peer_id]
+
+    def get_value(self, peer_id):
+        """
+        :param peer_id: peer to value
+        :return: sum of the values tagged on peer_id
+        """
+        return sum(self.tags.get(peer_id, {}).values())
+
+    def connected(self, peer_id):
+        """
+        Record a new connection to peer_id, and trim if there are now too many
+        :param peer_id: peer the connection is to
+        """
+        self.connected_at[peer_id] = asyncio.get_event_loop().time()
+        self.trim_if_needed()
+
+    def disconnected(self, peer_id):
+        """
+        Forget the connection to peer_id, tags and protection are kept
+        :param peer_id: peer the connection was to
+        """
+        self.connected_at.pop(peer_id, None)
+
+    def trim_if_needed(self):
+        """
+        Trim if there are too many connections, and schedule another trim
+        if there still are
+        """
+        if len(self.swarm.connections) <= self.high_water:
+            return
+        self.trim_open_conns()
+        if len(self.swarm.connections) > self.high_water and self.trim_timer is None:
+            self.trim_timer = asyncio.get_event_loop().call_later(
+                self.trim_interval, self.periodic_trim)
+
+    def periodic_trim(self):
+        """
+        Called by the trim timer
+        """
+        self.trim_timer = None
+        self.trim_if_needed()
+
+    def trim_open_conns(self):
+        """
+        Close the least valuable connections until low_water are left
+        :return: list of peer_ids whose connection was closed
+        """
+        excess = len(self.swarm.connections) - self.low_water
+        if excess <= 0:
+            return []
+
+        now = asyncio.get_event_loop().time()
+        candidates = [
+            (peer_id, muxed_conn) for peer_id, muxed_conn in self.swarm.connections.items()
+            if not self.is_protected(peer_id)
+            and now - self.connected_at.get(peer_id, now) >= self.grace_period
+        ]
+        candidates.sort(key=lambda candidate: (
+            self.get_value(candidate[0]),
+            len(candidate[1].streams),
+            candidate[1].last_activity,
+        ))
+
+        trimmed = []
+        for peer_id, _ in candidates[:excess]:
+            self.swarm.close_peer(peer_id)
+            trimmed.append(peer_id)
+        return trimmed
@@ -0,0 +1,121 @@
+import asyncio
+import random
+
+# Backoff after the first failed dial, doubled after every further failure
+BACKOFF_BASE = 5
+
+# Longest backoff in seconds
+BACKOFF_MAX = 300
+
+# Backoffs are randomly stretched or shrunk by up to this fraction, so that
+# peers failing together are not all retried together
+BACKOFF_JITTER = 0.2
+
+# Seconds after the last failure at which an entry is forgotten, and
+# backoff starts over from BACKOFF_BASE
+BACKOFF_TTL = 2 * BACKOFF_MAX
+
+
+class DialBackoff:
+    """
+    Remembers recent dial failures so that a peer or address that just
+    failed is not dialed again right away. Each failure in a row doubles
+    the backoff, and a successful dial clears it.
+
+    reference: https://github.com/libp2p/go-libp2p-swarm/blob/master/swarm_dial.go
+    """
+
+    def __init__(self, base=BACKOFF_BASE, maximum=BACKOFF_MAX, jitter=BACKOFF_JITTER,
+                 ttl=BACKOFF_TTL):
+        """
+        :param base: seconds of backoff after the first failure
+        :param maximum: longest backoff in seconds
+        :param jitter: fraction by which backoffs are randomly varied
+        :param ttl: seconds after the last failure at which an entry is forgotten
+        """
+        # pylint: disable=too-many-arguments
+        self.base = base
+        self.maximum = maximum
+        self.jitter = jitter
+        self.ttl = ttl
+
+        # Mapping from key -> BackoffEntry
+        self.entries = {}
+        self.last_prune = 0
+
+    def backoff(self, key):
+        """
+        Record a failed dial of key, and back off from it
+        :param key: peer_id or address string
+        :return: seconds until key may be dialed again
+        """
+        now = asyncio.get_event_loop().time()
+        self.prune(now)
+
+        entry = self.get(key, now)
+        tries = entry.tries + 1 if entry is not None else 1
+        delay = min(self.base * 2 ** (tries - 1), self.maximum)
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+
+        self.entries[key] = BackoffEntry(tries, now, now + delay)
+        return delay
+
+    def clear(self, key):
+        """
+        Forget the failures of key, after a successful dial
+        :param key: peer_id or address string
+        """
+        self.entries.pop(key, None)
+
+    def is_backing_off(self, key):
+        """
+        :param key: peer_id or address string
+        :return: true if key failed recently and should not be dialed yet
+        """
+        now = asyncio.get_event_loop().time()
+        entry = self.get(key, now)
+        return entry is not None and entry.until > now
+
+    def get(self, key, now=None):
+        """
+        Inspect the failures of key
+        :param key: peer_id or address string
+        :param now: event loop time, defaults to the current time
+        :return: BackoffEntry of key, or None if key did not fail recently
+        """
+        if now is None:
+            now = asyncio.get_event_loop().time()
+        entry = self.entries.get(key)
+        if entry is not None and now - entry.last_failure > self.ttl:
+            del self.entries[key]
+            return None
+        return entry
+
+    def prune(self, now):
+        """
+        Forget every entry older than the TTL, at most once per TTL
+        :param now: event loop time
+        """
+        if now - self.last_prune < self.ttl:
+            return
+        self.last_prune = now
+        self.entries = {key: entry for key, entry in self.entries.items()
+                        if now - entry.last_failure <= self.ttl}
+
+
+class BackoffEntry:
+    """
+    Failures in a row of a peer or address
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, tries, last_failure, until):
+        # Number of failed dials in a row
+        self.tries = tries
+        # Event loop time of the last failure
+        self.last_failure = last_failure
+        # Event loop time until which dials fail fast
+        self.until = until
+
+    def __repr__(self):
+        return "BackoffEntry(tries=%d, until=%.1f)" % (self.tries, self.until)
@@ -0,0 +1,228 @@
+import asyncio
+import ipaddress
+
+from lru import LRU
+
+from .dial_backoff import DialBackoff
+
+# Seconds to wait for a dial before also dialing the next best address
+DIAL_STAGGER_DELAY = 0.25
+
+# Seconds a single address may take to connect
+DIAL_TIMEOUT = 10
+
+# Most addresses dialed at once for a single peer
+MAX_PARALLEL_DIALS = 4
+
+# Rank of transports, lower is better. Transports without a rank come last
+TRANSPORT_RANKS = {
+    "tcp": 0
+}
+
+# Weight of a new latency sample in the moving average kept per address
+LATENCY_SMOOTHING = 0.3
+
+# Most addresses whose dial history is kept, the least recently used are
+# forgotten first
+MAX_ADDR_STATS = 4096
+
+
+class Dialer:
+    """
+    Dials a peer over the best of its addresses. Addresses are ranked by
+    transport, address class and how dialing them went before. The best
+    ones are dialed in staggered parallel: each dial gets a head start of
+    stagger_delay seconds before the next address is dialed too, so a dead
+    address costs little. The first connection made wins and the other
+    dials are cancelled.
+    """
+
+    def __init__(self, transport, stagger_delay=DIAL_STAGGER_DELAY,
+                 dial_timeout=DIAL_TIMEOUT, max_parallel_dials=MAX_PARALLEL_DIALS,
+                 addr_backoff=None, max_addr_stats=MAX_ADDR_STATS):
+        # pylint: disable=too-many-arguments
+        """
+        :param transport: transport used to dial, which tells the addresses it can dial
+        :param stagger_delay: head start in seconds of each dial over the next
+        :param dial_timeout: seconds each address may take to connect
+        :param max_parallel_dials: most addresses dialed for a single peer
+        :param addr_backoff: DialBackoff of addresses that failed recently,
+        which are not dialed
+        :param max_addr_stats: most addresses whose dial history is kept
+        """
+        self.transport = transport
+        self.addr_backoff = addr_backoff or DialBackoff()
+        self.stagger_delay = stagger_delay
+        self.dial_timeout = dial_timeout
+        self.max_parallel_dials = max_parallel_dials
+
+        # Mapping from address string -> AddrStats, for addresses dialed
+        # before, bounded as peers keep learning new addresses
+        self.addr_stats = LRU(max_addr_stats)
+
+    def rank_addrs(self, addrs):
+        """
+        Sort addresses from most to least promising: dialable transports
+        first, then addresses whose last dial did not fail, then loopback
+        before private before public addresses, then lowest connect latency
+        :param addrs: multiaddrs of a peer
+        :return: list of multiaddrs, best first
+        """
+        def rank(addr):
+            stats = self.addr_stats.get(str(addr))
+            last_failed = stats is not None and stats.last_failed
+            latency = stats.latency if stats is not None and stats.latency is not None \
+                else float("inf")
+            return (transport_rank(addr), last_failed, address_class(addr), latency)
+
+        return sorted(addrs, key=rank)
+
+    async def dial(self, addrs, self_id):
+        """
+        dial the best of addrs
+        :param addrs: multiaddrs of the peer
+        :param self_id: peer_id of the dialer (to send to receiver)
+        :return: raw connection
+        :raise DialBackoffError: every dialable address failed recently
+        :raise DialError: no address could be dialed
+        """
+        candidates = [addr for addr in self.rank_addrs(addrs) if self.transport.can_dial(addr)]
+        if not candidates:
+            raise DialError("no dialable address", [])
+        candidates = [addr for addr in candidates
+                      if not self.addr_backoff.is_backing_off(str(addr))]
+        if not candidates:
+            raise DialBackoffError("all addresses are backing off", [])
+        candidates = candidates[:self.max_parallel_dials]
+
+        errors = []
+        pending = set()
+        dialed = 0
+        try:
+            while True:
+                if dialed < len(candidates):
+                    pending.add(asyncio.ensure_future(
+                        self.dial_addr(candidates[dialed], self_id)))
+                    dialed += 1
+                elif not pending:
+                    raise DialError("all %d addresses failed" % len(candidates), errors)
+
+                # Wait for a dial to finish, giving up on the head start of the
+                # latest dial only if there is another address left to try
+                timeout = self.stagger_delay if dialed < len(candidates) else None
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                raw_conn = None
+                for task in done:
+                    addr, result = task.result()
+                    if isinstance(result, Exception):
+                        errors.append((addr, result))
+                    elif raw_conn is None:
+                        raw_conn = result
+                    else:
+                        # Finished at the same time as the winner
+                        result.close()
+                if raw_conn is not None:
+                    return raw_conn
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(close_late_connection)
+
+    async def dial_addr(self, addr, self_id):
+        """
+        dial a single address within dial_timeout and record how it went
+        :param addr: multiaddr to dial
+        :param self_id: peer_id of the dialer (to send to receiver)
+        :return: addr, raw connection or the exception raised while dialing
+        """
+        stats = self.addr_stats.setdefault(str(addr), AddrStats())
+        start = asyncio.get_event_loop().time()
+        try:
+            raw_conn = await asyncio.wait_for(
+                self.transport.dial(addr, self_id), self.dial_timeout)
+        except asyncio.CancelledError:
+            # Lost the race to another address, which says nothing about this one
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            stats.record_failure()
+            self.addr_backoff.backoff(str(addr))
+            return addr, error
+        stats.record_success(asyncio.get_event_loop().time() - start)
+        self.addr_backoff.clear(str(addr))
+        return addr, raw_conn
+
+
+class AddrStats:
+    """
+    Outcome of past dials of an address
+    """
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.last_failed = False
+        # Moving average of connect latency in seconds, None until a dial succeeds
+        self.latency = None
+
+    def record_success(self, latency):
+        self.successes += 1
+        self.last_failed = False
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+    def record_failure(self):
+        self.failures += 1
+        self.last_failed = True
+
+
+def transport_rank(addr):
+    """
+    :param addr: multiaddr
+    :return: rank of the transport of addr, len(TRANSPORT_RANKS) if it has no rank
+    """
+    for protocol in addr.protocols():
+        if protocol.name in TRANSPORT_RANKS:
+            return TRANSPORT_RANKS[protocol.name]
+    return len(TRANSPORT_RANKS)
+
+
+def address_class(addr):
+    """
+    :param addr: multiaddr
+    :return: 0 for loopback, 1 for private and 2 for public or unknown addresses
+    """
+    for protocol in addr.protocols():
+        if protocol.name in ("ip4", "ip6"):
+            ip_addr = ipaddress.ip_address(addr.value_for_protocol(protocol.name))
+            if ip_addr.is_loopback:
+                return 0
+            if ip_addr.is_private:
+                return 1
+    return 2
+
+
+def close_late_connection(task):
+    """
+    Close the connection made by a dial that lost the race
+    """
+    if task.cancelled():
+        return
+    _, result = task.result()
+    if not isinstance(result, Exception):
+        result.close()
+
+
+class DialError(ConnectionError):
+    """Raised when none of the addresses of a peer could be dialed"""
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        # (multiaddr, exception) of every failed dial
+        self.errors = errors
+
+
+class DialBackoffError(DialError):
+    """Raised instead of dialing a peer or addresses that failed recently"""
@@ -27,6 +27,23 @@ class INetwork(ABC):
         :return: true if successful
         """
 
+    @abstractmethod
+    def set_stream_handler_match(self, protocol_id, match, stream_handler):
+        """
+        :param protocol_id: protocol name, listed in response to ls
+        :param match: function called with a protocol id proposed on a stream,
+        returning true if stream_handler handles it
+        :param stream_handler: a stream handler instance
+        :return: true if successful
+        """
+
+    @abstractmethod
+    def remove_stream_handler(self, protocol_id):
+        """
+        :param protocol_id: protocol name the stream handler was set with
+        :return: true if successful
+        """
+
     @abstractmethod
     def new_stream(self, peer_id, protocol_ids):
         """
@@ -48,3 +65,19 @@ class INetwork(ABC):
         :param notifee: object implementing Notifee interface
         :return: true if notifee registered successfully, false otherwise
         """
+
+    @abstractmethod
+    def protect_peer(self, peer_id, tag):
+        """
+        Keep the connection to peer_id open while it is protected by a tag
+        :param peer_id: peer to protect
+        :param tag: reason for protecting the peer
+        """
+
+    @abstractmethod
+    def unprotect_peer(self, peer_id, tag):
+        """
+        :param peer_id: peer protected
+        :param tag: tag passed to protect_peer
+        :return: true if the peer is still protected by other tags
+        """
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+
+class NotifeeDispatcher:
+    """
+    Delivers network events to notifees. By default each event is awaited
+    by every notifee in turn before the network goes on, as before. In
+    concurrent mode events are handed off without waiting: every notifee
+    gets its own queue of events per connection, so a slow notifee delays
+    neither the network nor the other notifees, while the events of one
+    connection still reach each notifee in the order they occurred.
+    """
+
+    def __init__(self, network, concurrent=False):
+        """
+        :param network: network the events occur on
+        :param concurrent: true to deliver events without waiting for notifees
+        """
+        self.network = network
+        self.concurrent = concurrent
+        self.notifees = []
+
+        # Mapping from (notifee, key) -> task delivering the last event
+        # queued for it, which the next event waits for
+        self.deliveries = {}
+
+    def add_notifee(self, notifee):
+        """
+        :param notifee: object implementing Notifee interface
+        """
+        self.notifees.append(notifee)
+
+    async def dispatch(self, event, key, arg):
+        """
+        Deliver an event to every notifee
+        :param event: name of the notifee method, e.g. "connected"
+        :param key: object the event is ordered by, such as the muxed connection
+        :param arg: argument passed to the notifee after the network
+        """
+        if not self.concurrent:
+            for notifee in self.notifees:
+                await getattr(notifee, event)(self.network, arg)
+            return
+
+        for notifee in self.notifees:
+            self.queue_delivery(notifee, event, key, arg)
+
+    def queue_delivery(self, notifee, event, key, arg):
+        """
+        Deliver an event to notifee once it has handled the earlier events of key
+        :param notifee: notifee to deliver the event to
+        :param event: name of the notifee method
+        :param key: object the event is ordered by
+        :param arg: argument passed to the notifee after the network
+        """
+        delivery_key = (id(notifee), key)
+        previous = self.deliveries.get(delivery_key)
+        delivery = asyncio.ensure_future(
+            self.deliver(previous, getattr(notifee, event), arg))
+        self.deliveries[delivery_key] = delivery
+
+        def remove_delivery(_):
+            if self.deliveries.get(delivery_key) is delivery:
+                del self.deliveries[delivery_key]
+        delivery.add_done_callback(remove_delivery)
+
+    async def deliver(self, previous, handler, arg):
+        if previous is not None:
+            # Only its completion matters, its failure has been logged already
+            await asyncio.wait([previous])
+        try:
+            await handler(self.network, arg)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("notifee %s failed", handler)
+
+    async def flush(self):
+        """
+        Wait until every event dispatched so far has been delivered
+        """
+        while self.deliveries:
+            await asyncio.wait(list(self.deliveries.values()))
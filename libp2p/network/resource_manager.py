@@ -0,0 +1,283 @@
+RESOURCES = ("connections", "streams", "memory")
+
+
+class ResourceLimits:
+    """
+    Most connections, streams and buffered bytes a scope may hold at once.
+    None means unlimited
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, connections=None, streams=None, memory=None):
+        """
+        :param connections: most open connections
+        :param streams: most open streams
+        :param memory: most bytes buffered
+        """
+        self.connections = connections
+        self.streams = streams
+        self.memory = memory
+
+
+# Limits of the whole host
+SYSTEM_LIMITS = ResourceLimits(connections=1024, streams=16384, memory=1 << 30)
+
+# Limits of all the connections to a single peer
+PEER_LIMITS = ResourceLimits(connections=8, streams=1024, memory=64 << 20)
+
+# Limits of all the streams running a single protocol
+PROTOCOL_LIMITS = ResourceLimits(streams=4096, memory=256 << 20)
+
+# Limits of a single connection
+CONNECTION_LIMITS = ResourceLimits(streams=512, memory=32 << 20)
+
+# Fewest peer or protocol scopes kept before the idle ones are forgotten
+MIN_SCOPES_KEPT = 64
+
+
+class ResourceManager:
+    """
+    Accounts for the connections, streams and buffered bytes of the host, in
+    a hierarchy of scopes: the system, each peer, each protocol, each
+    connection and each stream. A connection is checked out of its peer and
+    the system, a stream out of its connection and, once its protocol is
+    negotiated, out of its protocol. Every reservation has to fit within
+    the limits of all the scopes it is checked out of.
+
+    reference: https://github.com/libp2p/go-libp2p-resource-manager
+    """
+
+    def __init__(self, system_limits=SYSTEM_LIMITS, peer_limits=PEER_LIMITS,
+                 protocol_limits=PROTOCOL_LIMITS, connection_limits=CONNECTION_LIMITS):
+        """
+        :param system_limits: ResourceLimits of the whole host
+        :param peer_limits: ResourceLimits of each peer
+        :param protocol_limits: ResourceLimits of each protocol, unless set
+        with set_protocol_limits
+        :param connection_limits: ResourceLimits of each connection
+        """
+        self.system = ResourceScope("system", system_limits)
+        self.peer_limits = peer_limits
+        self.protocol_limits = protocol_limits
+        self.connection_limits = connection_limits
+
+        # Mapping from peer_id -> ResourceScope, for peers with open connections
+        self.peers = {}
+        # Mapping from protocol id -> ResourceScope, for protocols with open streams
+        self.protocols = {}
+        # Idle scopes hold nothing, and are forgotten once the number of
+        # scopes doubles, so that finding them costs constant amortized time
+        self.max_peers = MIN_SCOPES_KEPT
+        self.max_protocols = MIN_SCOPES_KEPT
+        # Mapping from protocol id -> ResourceLimits overriding protocol_limits
+        self.protocol_overrides = {}
+
+    def set_protocol_limits(self, protocol_id, limits):
+        """
+        :param protocol_id: protocol the limits apply to
+        :param limits: ResourceLimits of the streams running protocol_id
+        """
+        self.protocol_overrides[protocol_id] = limits
+        if protocol_id in self.protocols:
+            self.protocols[protocol_id].limits = limits
+
+    def peer_scope(self, peer_id):
+        """
+        :param peer_id: peer to get the scope of
+        :return: ResourceScope of peer_id, created on first use
+        """
+        scope = self.peers.get(peer_id)
+        if scope is None:
+            scope = self.peers[peer_id] = \
+                ResourceScope("peer %s" % peer_id, self.peer_limits, [self.system])
+        return scope
+
+    def protocol_scope(self, protocol_id):
+        """
+        :param protocol_id: protocol to get the scope of
+        :return: ResourceScope of protocol_id, created on first use
+        """
+        scope = self.protocols.get(protocol_id)
+        if scope is None:
+            if len(self.protocols) >= self.max_protocols:
+                forget_idle_scopes(self.protocols)
+                self.max_protocols = max(2 * len(self.protocols), MIN_SCOPES_KEPT)
+            limits = self.protocol_overrides.get(protocol_id, self.protocol_limits)
+            scope = self.protocols[protocol_id] = \
+                ResourceScope("protocol %s" % protocol_id, limits, [self.system])
+        return scope
+
+    def open_connection(self, peer_id):
+        """
+        Check a connection out of the peer and the system
+        :param peer_id: peer the connection is to
+        :return: ResourceScope of the connection, to be done once it is closed
+        :raise ResourceLimitExceeded: peer or system has too many connections
+        """
+        if peer_id not in self.peers and len(self.peers) >= self.max_peers:
+            forget_idle_scopes(self.peers)
+            self.max_peers = max(2 * len(self.peers), MIN_SCOPES_KEPT)
+
+        scope = ResourceScope("connection to %s" % peer_id, self.connection_limits,
+                              [self.peer_scope(peer_id)])
+        scope.reserve("connections", 1)
+        return scope
+
+    def open_stream(self, connection_scope):
+        """
+        Check a stream out of its connection, its peer and the system
+        :param connection_scope: ResourceScope of the connection of the stream
+        :return: ResourceScope of the stream, to be done once it is closed
+        :raise ResourceLimitExceeded: a scope has too many streams
+        """
+        scope = ResourceScope("stream", ResourceLimits(), [connection_scope])
+        scope.reserve("streams", 1)
+        return scope
+
+    def set_stream_protocol(self, stream_scope, protocol_id):
+        """
+        Check a stream, and the bytes it buffers, out of its protocol as well
+        :param stream_scope: ResourceScope of the stream
+        :param protocol_id: protocol negotiated on the stream
+        :raise ResourceLimitExceeded: protocol has too many streams or bytes
+        """
+        stream_scope.add_parent(self.protocol_scope(protocol_id))
+
+
+class ResourceScope:
+    """
+    Usage and limits of one scope. Reserving a resource in a scope reserves
+    it in all of the scope's ancestors too, and only if it fits in all of them
+    """
+
+    def __init__(self, name, limits, parents=()):
+        """
+        :param name: name of the scope, for error messages
+        :param limits: ResourceLimits of the scope
+        :param parents: scopes the reservations of this scope count against
+        """
+        self.name = name
+        self.limits = limits
+        self.parents = list(parents)
+
+        # Usage of this scope and of the scopes below it
+        self.connections = 0
+        self.streams = 0
+        self.memory = 0
+
+        # Mapping from resource -> amount reserved by this scope itself,
+        # released from every ancestor once the scope is done
+        self.reserved = dict.fromkeys(RESOURCES, 0)
+        self.done = False
+
+        self.span = self.compute_span()
+
+    def compute_span(self):
+        """
+        :return: list of this scope followed by all its ancestors, each once
+        """
+        span = [self]
+        for parent in self.parents:
+            for scope in parent.compute_span():
+                if scope not in span:
+                    span.append(scope)
+        return span
+
+    def add_parent(self, parent):
+        """
+        Count the current and future reservations of this scope against
+        parent and its ancestors too
+        :param parent: ResourceScope to add
+        :raise ResourceLimitExceeded: current reservations do not fit in parent
+        """
+        new_scopes = [scope for scope in parent.compute_span() if scope not in self.span]
+        for resource in RESOURCES:
+            check_limits(new_scopes, resource, self.reserved[resource])
+        for resource in RESOURCES:
+            for scope in new_scopes:
+                setattr(scope, resource, getattr(scope, resource) + self.reserved[resource])
+        self.parents.append(parent)
+        self.span.extend(new_scopes)
+
+    def reserve(self, resource, amount):
+        """
+        :param resource: one of "connections", "streams" or "memory"
+        :param amount: amount of resource to reserve
+        :raise ResourceLimitExceeded: amount does not fit in this scope or an ancestor
+        """
+        if self.done:
+            raise ResourceLimitExceeded("%s is done" % self.name)
+        check_limits(self.span, resource, amount)
+        for scope in self.span:
+            setattr(scope, resource, getattr(scope, resource) + amount)
+        self.reserved[resource] += amount
+
+    def release(self, resource, amount):
+        """
+        :param resource: one of "connections", "streams" or "memory"
+        :param amount: amount of resource reserved by this scope to release
+        """
+        if self.done:
+            # Everything was released already
+            return
+        for scope in self.span:
+            setattr(scope, resource, getattr(scope, resource) - amount)
+        self.reserved[resource] -= amount
+
+    def reserve_memory(self, size):
+        """
+        :param size: number of bytes about to be buffered
+        :raise ResourceLimitExceeded: size does not fit in this scope or an ancestor
+        """
+        self.reserve("memory", size)
+
+    def release_memory(self, size):
+        """
+        :param size: number of bytes no longer buffered
+        """
+        self.release("memory", size)
+
+    def close(self):
+        """
+        Release everything this scope reserved, once what it accounts for is closed
+        """
+        for resource, amount in self.reserved.items():
+            if amount:
+                self.release(resource, amount)
+        self.done = True
+
+    def is_idle(self):
+        """
+        :return: true if nothing is reserved in this scope or below it
+        """
+        return not (self.connections or self.streams or self.memory)
+
+    def __repr__(self):
+        return "<ResourceScope %s: %d connections, %d streams, %d bytes>" \
+            % (self.name, self.connections, self.streams, self.memory)
+
+
+def forget_idle_scopes(scopes):
+    """
+    :param scopes: mapping from key -> ResourceScope to remove the idle scopes of
+    """
+    for key in [key for key, scope in scopes.items() if scope.is_idle()]:
+        del scopes[key]
+
+
+def check_limits(scopes, resource, amount):
+    """
+    :param scopes: scopes amount of resource is about to be reserved in
+    :param resource: one of "connections", "streams" or "memory"
+    :param amount: amount of resource
+    :raise ResourceLimitExceeded: amount does not fit in one of scopes
+    """
+    for scope in scopes:
+        limit = getattr(scope.limits, resource)
+        if limit is not None and getattr(scope, resource) + amount > limit:
+            raise ResourceLimitExceeded("%s limit of %d exceeded in %s"
+                                        % (resource, limit, scope.name))
+
+
+class ResourceLimitExceeded(Exception):
+    """Raised when a reservation does not fit within the limits of a scope"""
@@ -1,12 +1,31 @@
+from libp2p.protocol_muxer.multiselect_client import MultiselectClientError
+
 from .net_stream_interface import INetStream
 
 
 class NetStream(INetStream):
 
-    def __init__(self, muxed_stream):
+    def __init__(self, muxed_stream, metrics=None, negotiation=None):
+        """
+        :param muxed_stream: muxed stream the net stream runs on
+        :param metrics: optional Metrics counting the messages of the stream
+        under its peer and protocol
+        :param negotiation: optional LazyNegotiation of the protocol of the
+        stream, checked before the first read
+        """
         self.muxed_stream = muxed_stream
-        self.mplex_conn = muxed_stream.mplex_conn
+        self.muxed_conn = muxed_stream.muxed_conn
+        # Kept for code written when mplex was the only muxer
+        self.mplex_conn = self.muxed_conn
         self.protocol_id = None
+        self.negotiation = negotiation
+
+        # Traffic counters of the peer and of the protocol, or None
+        self.metrics = metrics
+        self.peer_traffic = None
+        self.protocol_traffic = None
+        if metrics is not None:
+            self.peer_traffic = metrics.peer_stats(self.muxed_conn.peer_id)
 
     def get_protocol(self):
         """
@@ -20,20 +39,80 @@ class NetStream(INetStream):
         :return: true if successful
         """
         self.protocol_id = protocol_id
+        if self.metrics is not None:
+            self.protocol_traffic = self.metrics.protocol_stats(protocol_id)
 
-    async def read(self):
+    async def read(self, n=None):
         """
         read from stream
-        :return: bytes of input until EOF
+        :param n: maximum number of bytes to read, or None to read the next message
+        :return: bytes of input, b"" at EOF
+        """
+        await self.finish_negotiation()
+        data = await self.muxed_stream.read(n)
+        self.count_in(data)
+        return data
+
+    async def readexactly(self, n):
+        """
+        read exactly n bytes from stream
+        :param n: number of bytes to read
+        :return: n bytes of input
+        """
+        await self.finish_negotiation()
+        data = await self.muxed_stream.readexactly(n)
+        self.count_in(data)
+        return data
+
+    async def readuntil(self, separator=b"\n"):
+        """
+        read from stream up to and including separator
+        :param separator: bytes ending the data to read
+        :return: bytes of input ending with separator
         """
-        return await self.muxed_stream.read()
+        await self.finish_negotiation()
+        data = await self.muxed_stream.readuntil(separator)
+        self.count_in(data)
+        return data
 
     async def write(self, data):
         """
         write to stream
         :return: number of bytes written
         """
-        return await self.muxed_stream.write(data)
+        length = await self.muxed_stream.write(data)
+        if self.peer_traffic is not None:
+            self.peer_traffic.messages_out += 1
+            if self.protocol_traffic is not None:
+                self.protocol_traffic.messages_out += 1
+                self.protocol_traffic.bytes_out += len(data)
+        return length
+
+    async def finish_negotiation(self):
+        """
+        check the responses to a lazy negotiation, the stream is reset if the
+        protocol was rejected
+        :raise MultiselectClientError: protocol negotiation failed
+        """
+        if self.negotiation is None:
+            return
+        try:
+            await self.negotiation.wait()
+        except MultiselectClientError:
+            await self.muxed_stream.reset()
+            raise
+        self.negotiation = None
+
+    def count_in(self, data):
+        """
+        count a message read, unless it is the EOF
+        :param data: bytes read
+        """
+        if self.peer_traffic is not None and data:
+            self.peer_traffic.messages_in += 1
+            if self.protocol_traffic is not None:
+                self.protocol_traffic.messages_in += 1
+                self.protocol_traffic.bytes_in += len(data)
 
     async def close(self):
         """
@@ -42,3 +121,31 @@ class NetStream(INetStream):
         """
         await self.muxed_stream.close()
         return True
+
+    def set_deadline(self, ttl):
+        """
+        :param ttl: seconds each following read and write may take, or None
+        :return: true if successful
+        """
+        return self.muxed_stream.set_deadline(ttl)
+
+    def set_read_deadline(self, ttl):
+        """
+        :param ttl: seconds each following read may take, or None
+        :return: true if successful
+        """
+        return self.muxed_stream.set_read_deadline(ttl)
+
+    def set_write_deadline(self, ttl):
+        """
+        :param ttl: seconds each following write may take, or None
+        :return: true if successful
+        """
+        return self.muxed_stream.set_write_deadline(ttl)
+
+    def set_priority(self, priority):
+        """
+        :param priority: positive weight of the stream's share of the connection
+        :return: true if successful
+        """
+        return self.muxed_stream.set_priority(priority)
@@ -17,9 +17,24 @@ class INetStream(ABC):
         """
 
     @abstractmethod
-    def read(self):
+    def read(self, n=None):
         """
         reads from the underlying muxed_stream
+        :param n: maximum number of bytes to read, or None to read the next message
+        :return: bytes of input
+        """
+
+    @abstractmethod
+    def readexactly(self, n):
+        """
+        reads exactly n bytes from the underlying muxed_stream
+        :return: bytes of input
+        """
+
+    @abstractmethod
+    def readuntil(self, separator=b"\n"):
+        """
+        reads from the underlying muxed_stream up to and including separator
         :return: bytes of input
         """
 
@@ -36,3 +51,31 @@ class INetStream(ABC):
         close the underlying muxed stream
         :return: true if successful
         """
+
+    @abstractmethod
+    def set_deadline(self, ttl):
+        """
+        :param ttl: seconds each following read and write may take, or None
+        :return: true if successful
+        """
+
+    @abstractmethod
+    def set_read_deadline(self, ttl):
+        """
+        :param ttl: seconds each following read may take, or None
+        :return: true if successful
+        """
+
+    @abstractmethod
+    def set_write_deadline(self, ttl):
+        """
+        :param ttl: seconds each following write may take, or None
+        :return: true if successful
+        """
+
+    @abstractmethod
+    def set_priority(self, priority):
+        """
+        :param priority: positive weight of the stream's share of the connection
+        :return: true if successful
+        """
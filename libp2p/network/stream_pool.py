@@ -0,0 +1,188 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Most idle streams kept per (peer, protocol)
+MAX_IDLE_PER_KEY = 4
+
+# Most idle streams kept in total
+MAX_IDLE_TOTAL = 256
+
+# Seconds after which an idle stream is closed instead of reused
+IDLE_TIMEOUT = 60
+
+
+class StreamPool:
+    """
+    Keeps idle streams whose protocol is already negotiated, so that
+    request/response protocols can reuse them instead of paying for opening
+    a stream and negotiating its protocol on every request. Streams are only
+    reused while healthy: open at both ends, on an open connection, with
+    nothing left unread and not idle for longer than idle_timeout.
+
+    Idle streams that went stale are closed by a sweep running every
+    idle_timeout seconds while any stream is idle.
+
+    Reusing a stream relies on the handler at the other end reading any
+    number of requests from it, until the stream is closed.
+    """
+
+    def __init__(self, network, max_idle_per_key=MAX_IDLE_PER_KEY,
+                 max_idle_total=MAX_IDLE_TOTAL, idle_timeout=IDLE_TIMEOUT):
+        """
+        :param network: network streams are opened on
+        :param max_idle_per_key: most idle streams kept per (peer, protocol)
+        :param max_idle_total: most idle streams kept in total
+        :param idle_timeout: seconds after which an idle stream is not reused
+        """
+        self.network = network
+        self.max_idle_per_key = max_idle_per_key
+        self.max_idle_total = max_idle_total
+        self.idle_timeout = idle_timeout
+
+        # Mapping from (peer_id, protocol id) -> deque of (stream, event loop
+        # time it was released), oldest first
+        self.idle_streams = {}
+        self.idle_count = 0
+        # Timer of the next sweep of stale idle streams, if one is scheduled
+        self.sweep_timer = None
+
+    async def get_stream(self, peer_id, protocol_ids):
+        """
+        Take an idle stream to peer_id on the first of protocol_ids that has
+        one, or open a new stream
+        :param peer_id: peer_id of destination
+        :param protocol_ids: protocol ids, in order of preference
+        :return: net stream, to be given back with release once done with
+        """
+        for protocol_id in protocol_ids:
+            stream = self.take_idle_stream(peer_id, protocol_id)
+            if stream is not None:
+                return stream
+        return await self.network.new_stream(peer_id, protocol_ids)
+
+    def take_idle_stream(self, peer_id, protocol_id):
+        """
+        :param peer_id: peer_id of destination
+        :param protocol_id: protocol the stream runs
+        :return: healthy idle stream, or None. Unhealthy idle streams met on
+        the way are closed
+        """
+        key = (peer_id, protocol_id)
+        idle = self.idle_streams.get(key)
+        now = asyncio.get_event_loop().time()
+        while idle:
+            # Most recently released first, the least likely to have gone stale
+            stream, released = idle.pop()
+            self.idle_count -= 1
+            if now - released <= self.idle_timeout and is_reusable(stream):
+                break
+            discard(stream)
+        else:
+            stream = None
+        if idle is not None and not idle:
+            del self.idle_streams[key]
+        return stream
+
+    def release(self, stream):
+        """
+        Give back a stream taken from the pool, once its response is read.
+        It is kept for reuse if healthy and there is room, and closed otherwise
+        :param stream: net stream to give back
+        """
+        key = (stream.muxed_conn.peer_id, stream.get_protocol())
+        idle = self.idle_streams.get(key)
+        if (not is_reusable(stream) or self.idle_count >= self.max_idle_total
+                or (idle is not None and len(idle) >= self.max_idle_per_key)):
+            discard(stream)
+            return
+
+        if idle is None:
+            idle = self.idle_streams[key] = deque()
+        idle.append((stream, asyncio.get_event_loop().time()))
+        self.idle_count += 1
+        self.schedule_sweep()
+
+    def schedule_sweep(self):
+        """
+        Sweep the idle streams in idle_timeout seconds, unless a sweep is
+        already scheduled
+        """
+        if self.sweep_timer is None:
+            self.sweep_timer = asyncio.get_event_loop().call_later(
+                self.idle_timeout, self.sweep)
+
+    def sweep(self, now=None):
+        """
+        Close every idle stream that is no longer reusable, and schedule the
+        next sweep as long as streams are left idle
+        :param now: event loop time, defaults to the current time
+        """
+        if now is None:
+            now = asyncio.get_event_loop().time()
+        for key, idle in list(self.idle_streams.items()):
+            kept = deque()
+            for stream, released in idle:
+                if now - released <= self.idle_timeout and is_reusable(stream):
+                    kept.append((stream, released))
+                else:
+                    discard(stream)
+            self.idle_count -= len(idle) - len(kept)
+            if kept:
+                self.idle_streams[key] = kept
+            else:
+                del self.idle_streams[key]
+
+        self.sweep_timer = None
+        if self.idle_count:
+            self.schedule_sweep()
+
+    @asynccontextmanager
+    async def stream(self, peer_id, protocol_ids):
+        """
+        Use a pooled stream within an async with block. The stream is given
+        back when the block ends, or reset if it raises
+        :param peer_id: peer_id of destination
+        :param protocol_ids: protocol ids, in order of preference
+        """
+        stream = await self.get_stream(peer_id, protocol_ids)
+        try:
+            yield stream
+        except BaseException:
+            await stream.muxed_stream.reset()
+            raise
+        self.release(stream)
+
+    def close(self):
+        """
+        Close every idle stream
+        """
+        for idle in self.idle_streams.values():
+            for stream, _ in idle:
+                discard(stream)
+        self.idle_streams.clear()
+        self.idle_count = 0
+        if self.sweep_timer is not None:
+            self.sweep_timer.cancel()
+            self.sweep_timer = None
+
+
+def is_reusable(stream):
+    """
+    :param stream: net stream
+    :return: true if stream is open at both ends on an open connection, with
+    nothing left unread
+    """
+    muxed_stream = stream.muxed_stream
+    return not (stream.muxed_conn.is_closed() or muxed_stream.local_closed
+                or muxed_stream.remote_closed or muxed_stream.buffer.size
+                or muxed_stream.buffer.exception is not None)
+
+
+def discard(stream):
+    """
+    Close a stream that is not kept, without waiting
+    :param stream: net stream
+    """
+    if not stream.muxed_conn.is_closed():
+        asyncio.ensure_future(stream.muxed_stream.reset())
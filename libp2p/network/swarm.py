@@ -1,33 +1,86 @@
 import asyncio
-
-from libp2p.protocol_muxer.multiselect_client import MultiselectClient
-from libp2p.protocol_muxer.multiselect import Multiselect
+import logging
+
+from libp2p.metrics.metrics import Metrics
+from libp2p.protocol_muxer.multiselect_client import MultiselectClient, \
+    MultiselectClientError, MultiselectProtocolNotSupported
+from libp2p.protocol_muxer.multiselect import Multiselect, MultiselectError
+from libp2p.protocol_muxer.multiselect_communicator import MultiselectCommunicatorError
+from libp2p.stream_muxer.muxed_stream_interface import MuxedStreamError
+from libp2p.transport.transport_registry import TransportNotFound, TransportRegistry
 from libp2p.peer.id import id_b58_decode
+from libp2p.peer.peerstore import PeerStoreError
 
+from .connection_manager import ConnectionManager
+from .dial_backoff import DialBackoff
+from .dialer import Dialer, DialBackoffError, DialError
 from .network_interface import INetwork
+from .notifee_dispatcher import NotifeeDispatcher
 from .notifee_interface import INotifee
+from .resource_manager import ResourceLimitExceeded, ResourceManager
 from .stream.net_stream import NetStream
+from .stream_pool import StreamPool
 from .connection.raw_connection import RawConnection
 
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
+# Seconds after a connection to a peer is added during which another
+# connection to the peer may come from a simultaneous dial
+SIMULTANEOUS_DIAL_WINDOW = 5
+
+
 class Swarm(INetwork):
-    # pylint: disable=too-many-instance-attributes,cell-var-from-loop,too-many-arguments
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
 
-    def __init__(self, peer_id, peerstore, upgrader, transport, router):
+    def __init__(self, peer_id, peerstore, upgrader, transport, router,
+                 concurrent_notify=False, metrics=None, resource_manager=None,
+                 connection_manager_options=None):
+        """
+        :param peer_id: peer id of this node
+        :param peerstore: peerstore holding the addresses of other peers
+        :param upgrader: transport upgrader securing and muxing connections
+        :param transport: transport used to dial and listen on tcp multiaddrs,
+        transports of other protocols are added with add_transport
+        :param router: optional peer router
+        :param concurrent_notify: true to notify notifees without waiting for them,
+        in the order of events per connection
+        :param metrics: Metrics counting the traffic of the streams, which should
+        be the one given to upgrader to also count the traffic of the connections
+        :param resource_manager: ResourceManager the protocols of streams are checked
+        out of, which should be the one given to upgrader to also check out the
+        connections and streams
+        :param connection_manager_options: optional keyword arguments of the
+        ConnectionManager, e.g. low_water, high_water and grace_period
+        """
         self.self_id = peer_id
         self.peerstore = peerstore
         self.upgrader = upgrader
         self.transport = transport
+        self.transports = TransportRegistry()
+        self.transports.add_transport("tcp", transport)
+        self.dialer = Dialer(self.transports)
+        # Peers that failed to be dialed recently
+        self.dial_backoff = DialBackoff()
         self.router = router
         self.connections = dict()
+        # Dials in progress, shared by every caller dialing the same peer
+        self.pending_dials = dict()
         self.listeners = dict()
         self.stream_handlers = dict()
+        self.connection_manager = ConnectionManager(self, **(connection_manager_options or {}))
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.resource_manager = \
+            resource_manager if resource_manager is not None else ResourceManager()
 
         # Protocol muxing
         self.multiselect = Multiselect()
         self.multiselect_client = MultiselectClient()
+        # Idle negotiated streams, reused by request/response protocols
+        self.stream_pool = StreamPool(self)
 
         # Create Notifee array
-        self.notifees = []
+        self.notifee_dispatcher = NotifeeDispatcher(self, concurrent_notify)
+        self.notifees = self.notifee_dispatcher.notifees
 
         # Create generic protocol handler
         self.generic_protocol_handler = create_generic_protocol_handler(self)
@@ -44,143 +97,376 @@ class Swarm(INetwork):
         self.multiselect.add_handler(protocol_id, stream_handler)
         return True
 
+    def set_stream_handler_match(self, protocol_id, match, stream_handler):
+        """
+        :param protocol_id: protocol name, listed in response to ls
+        :param match: function called with a protocol id proposed on a stream,
+        returning true if stream_handler handles it
+        :param stream_handler: a stream handler instance
+        :return: true if successful
+        """
+        self.multiselect.add_handler_match(protocol_id, match, stream_handler)
+        return True
+
+    def remove_stream_handler(self, protocol_id):
+        """
+        :param protocol_id: protocol name the stream handler was set with
+        :return: true if successful
+        """
+        self.multiselect.remove_handler(protocol_id)
+        return True
+
     async def dial_peer(self, peer_id):
         """
         dial_peer try to create a connection to peer_id
         :param peer_id: peer if we want to dial
         :raises SwarmException: raised when no address if found for peer_id
+        :raises DialError: raised when none of the addresses could be dialed
+        :raises DialBackoffError: raised when the peer failed to be dialed recently
         :return: muxed connection
         """
+        muxed_conn = self.connections.get(peer_id)
+        if muxed_conn is not None and not muxed_conn.is_closed():
+            # If muxed connection already exists for peer_id,
+            # set muxed connection equal to existing muxed connection
+            return muxed_conn
 
-        # Get peer info from peer store
-        addrs = self.peerstore.addrs(peer_id)
+        dial = self.pending_dials.get(peer_id)
+        if dial is None:
+            if self.dial_backoff.is_backing_off(peer_id):
+                raise DialBackoffError("dial to %s is backing off" % peer_id, [])
 
-        if not addrs:
-            raise SwarmException("No known addresses to peer")
+            # Get peer info from peer store
+            addrs = self.peerstore.addrs(peer_id)
 
-        if not self.router:
-            multiaddr = addrs[0]
-        else:
-            multiaddr = self.router.find_peer(peer_id)
+            if not addrs:
+                raise SwarmException("No known addresses to peer")
+
+            if self.router:
+                addrs = [self.router.find_peer(peer_id)]
 
-        if peer_id in self.connections:
-            # If muxed connection already exists for peer_id,
-            # set muxed connection equal to existing muxed connection
-            muxed_conn = self.connections[peer_id]
-        else:
             # Dial peer (connection to peer does not yet exist)
-            # Transport dials peer (gets back a raw conn)
-            raw_conn = await self.transport.dial(multiaddr, self.self_id)
+            dial = asyncio.ensure_future(self.dial_and_upgrade(peer_id, addrs))
+            self.pending_dials[peer_id] = dial
+
+            def remove_pending_dial(_):
+                if self.pending_dials.get(peer_id) is dial:
+                    del self.pending_dials[peer_id]
+            dial.add_done_callback(remove_pending_dial)
+
+        # Shielded so that a caller giving up does not cancel the dial for the others
+        return await asyncio.shield(dial)
 
-            # Per, https://discuss.libp2p.io/t/multistream-security/130, we first secure
-            # the conn and then mux the conn
+    async def dial_and_upgrade(self, peer_id, addrs):
+        """
+        dial the best of the addresses of peer_id and upgrade the connection
+        :param peer_id: peer we want to dial
+        :param addrs: addresses of the peer
+        :return: muxed connection kept for peer_id
+        """
+        # Dialer dials the best addresses of the peer (gets back a raw conn)
+        try:
+            raw_conn = await self.dialer.dial(addrs, self.self_id)
+        except DialBackoffError:
+            raise
+        except DialError:
+            self.dial_backoff.backoff(peer_id)
+            raise
+        self.dial_backoff.clear(peer_id)
+
+        # Per, https://discuss.libp2p.io/t/multistream-security/130, we first secure
+        # the conn and then mux the conn
+        try:
             secured_conn = await self.upgrader.upgrade_security(raw_conn, peer_id, True)
-            muxed_conn = self.upgrader.upgrade_connection(secured_conn, \
+            muxed_conn = await self.upgrader.upgrade_connection(secured_conn, \
                 self.generic_protocol_handler, peer_id)
+        except Exception:
+            # e.g. no common muxer, the raw conn would otherwise be left open
+            raw_conn.close()
+            raise
+
+        return await self.add_connection(peer_id, muxed_conn)
 
-            # Store muxed connection in connections
-            self.connections[peer_id] = muxed_conn
+    async def add_connection(self, peer_id, muxed_conn):
+        """
+        Store a new muxed connection to peer_id. If both peers dialed each other
+        at the same time, there is already an open connection, and only one of
+        the two is kept: the one dialed by the peer with the smaller peer id.
+        Both peers apply the same rule, so they keep the same connection. An
+        existing connection that cannot be part of a simultaneous dial, e.g. a
+        stale one to a peer that restarted, is replaced by the new one
+        :param peer_id: peer the connection is to
+        :param muxed_conn: new muxed connection
+        :return: muxed connection kept for peer_id
+        """
+        existing = self.connections.get(peer_id)
+        if existing is not None and not existing.is_closed():
+            if self.is_dialing(peer_id):
+                we_dial = self.self_id.get_raw_id() < peer_id.get_raw_id()
+                if muxed_conn.initiator != we_dial or existing.initiator == we_dial:
+                    muxed_conn.close()
+                    return existing
+
+            # Replace the existing connection with the one both peers keep
+            existing.close()
 
-            # Call notifiers since event occurred
-            for notifee in self.notifees:
-                await notifee.connected(self, muxed_conn)
+        # Store muxed connection in connections
+        self.connections[peer_id] = muxed_conn
+
+        # The reader of a muxed connection stops once it is closed, by either end
+        muxed_conn.reader_task.add_done_callback(
+            lambda _: asyncio.ensure_future(self.connection_closed(peer_id, muxed_conn)))
+
+        # Call notifiers since event occurred
+        await self.notifee_dispatcher.dispatch("connected", muxed_conn, muxed_conn)
+
+        self.connection_manager.connected(peer_id)
 
         return muxed_conn
 
+    def is_dialing(self, peer_id):
+        """
+        :param peer_id: peer a new connection is to
+        :return: true if we may be dialing peer_id at the same time as it
+        dials us: a dial to it is pending, or the current connection to it
+        was added moments ago, maybe by such a dial
+        """
+        if peer_id in self.pending_dials:
+            return True
+        connected_at = self.connection_manager.connected_at.get(peer_id)
+        return connected_at is not None and \
+            asyncio.get_event_loop().time() - connected_at < SIMULTANEOUS_DIAL_WINDOW
+
+    def close_peer(self, peer_id):
+        """
+        Close the connection to peer_id, if any
+        :param peer_id: peer to disconnect from
+        :return: true if a connection was closed
+        """
+        muxed_conn = self.connections.pop(peer_id, None)
+        if muxed_conn is None:
+            return False
+        self.connection_manager.disconnected(peer_id)
+        self.peerstore.clear_rejected_protocols(peer_id)
+        self.metrics.remove_peer(peer_id)
+        muxed_conn.close()
+        return True
+
+    def protect_peer(self, peer_id, tag):
+        """
+        Keep the connection manager from trimming the connection to peer_id
+        while it is protected by a tag
+        :param peer_id: peer to protect
+        :param tag: reason for protecting the peer, e.g. "gossipsub-mesh"
+        """
+        self.connection_manager.protect(peer_id, tag)
+
+    def unprotect_peer(self, peer_id, tag):
+        """
+        :param peer_id: peer protected
+        :param tag: tag passed to protect_peer
+        :return: true if the peer is still protected by other tags
+        """
+        return self.connection_manager.unprotect(peer_id, tag)
+
+    async def connection_closed(self, peer_id, muxed_conn):
+        """
+        Forget a muxed connection that has been closed and tell the notifees
+        :param peer_id: peer the connection was to
+        :param muxed_conn: muxed connection closed
+        """
+        if self.connections.get(peer_id) is muxed_conn:
+            del self.connections[peer_id]
+            self.connection_manager.disconnected(peer_id)
+            # The peer may support other protocols once reconnected
+            self.peerstore.clear_rejected_protocols(peer_id)
+            self.metrics.remove_peer(peer_id)
+        # Drop the idle streams that were on the connection right away
+        self.stream_pool.sweep()
+
+        # Call notifiers since event occurred
+        await self.notifee_dispatcher.dispatch("disconnected", muxed_conn, muxed_conn)
+
     async def new_stream(self, peer_id, protocol_ids):
         """
         :param peer_id: peer_id of destination
         :param protocol_id: protocol id
         :return: net stream instance
         """
-        # Get peer info from peer store
-        addrs = self.peerstore.addrs(peer_id)
-
-        if not addrs:
-            raise SwarmException("No known addresses to peer")
-
-        multiaddr = addrs[0]
-
         muxed_conn = await self.dial_peer(peer_id)
+        start = asyncio.get_event_loop().time()
+        protocol_ids = self.order_protocol_ids(peer_id, protocol_ids)
 
         # Use muxed conn to open stream, which returns
         # a muxed stream
         # TODO: Remove protocol id from being passed into muxed_conn
-        muxed_stream = await muxed_conn.open_stream(protocol_ids[0], multiaddr)
-
-        # Perform protocol muxing to determine protocol to use
-        selected_protocol = await self.multiselect_client.select_one_of(protocol_ids, muxed_stream)
+        muxed_stream = await muxed_conn.open_stream(protocol_ids[0], None)
+
+        # Perform protocol muxing to determine protocol to use. A single
+        # protocol can be negotiated lazily, its acknowledgement is then
+        # checked on the first read of the stream
+        negotiation = None
+        if self.multiselect_client.lazy and len(protocol_ids) == 1:
+            selected_protocol = protocol_ids[0]
+            negotiation = await self.multiselect_client.select_lazily(
+                selected_protocol, muxed_stream)
+            negotiation.add_error_callback(
+                lambda error: self.record_failed_negotiation(peer_id, protocol_ids, error))
+        else:
+            try:
+                selected_protocol = await self.multiselect_client.select_one_of(
+                    protocol_ids, muxed_stream)
+            except MultiselectClientError as error:
+                self.record_failed_negotiation(peer_id, protocol_ids, error)
+                # Let the other end stop negotiating as well
+                await muxed_stream.reset()
+                raise
+            # Protocols proposed before the selected one were rejected
+            rejected = protocol_ids[:protocol_ids.index(selected_protocol)]
+            if rejected:
+                self.peerstore.reject_protocols(peer_id, rejected)
+            self.peerstore.add_protocols(peer_id, [selected_protocol])
+        try:
+            self.set_stream_protocol(muxed_stream, selected_protocol)
+        except ResourceLimitExceeded:
+            await muxed_stream.reset()
+            raise
 
         # Create a net stream with the selected protocol
-        net_stream = NetStream(muxed_stream)
+        net_stream = NetStream(muxed_stream, self.metrics, negotiation)
         net_stream.set_protocol(selected_protocol)
+        self.metrics.record_stream_open(
+            selected_protocol, asyncio.get_event_loop().time() - start)
 
         # Call notifiers since event occurred
-        for notifee in self.notifees:
-            await notifee.opened_stream(self, net_stream)
+        await self.notifee_dispatcher.dispatch("opened_stream", muxed_conn, net_stream)
 
         return net_stream
 
+    def order_protocol_ids(self, peer_id, protocol_ids):
+        """
+        Move the protocols peer_id is known to support first and the ones it
+        rejected on its current connection last, so that a protocol it
+        supports is proposed before the others instead of after a round
+        trip for each of them. A supported protocol is proposed ahead of a
+        more preferred one whose support is unknown: it takes one round trip
+        for sure, the other may take two. Once identify has listed the
+        protocols of the peer, every protocol it supports is known, and the
+        order of preference holds among them
+        :param peer_id: peer_id of destination
+        :param protocol_ids: protocol ids, in order of preference
+        :return: protocol ids in the order to propose them
+        """
+        try:
+            supported = self.peerstore.get_protocols(peer_id)
+            rejected = self.peerstore.get_rejected_protocols(peer_id)
+        except PeerStoreError:
+            return protocol_ids
+        if not supported and not rejected:
+            return protocol_ids
+        return sorted(protocol_ids, key=lambda protocol_id: (
+            protocol_id in rejected, protocol_id not in supported))
+
+    def record_failed_negotiation(self, peer_id, protocol_ids, error):
+        """
+        Record that negotiating any of protocol_ids with peer_id failed. If
+        the peer rejected them they are proposed last from then on, else what
+        is known of its support of them no longer holds
+        :param peer_id: peer_id of destination
+        :param protocol_ids: protocol ids proposed
+        :param error: MultiselectClientError the negotiation failed with
+        """
+        if isinstance(error, MultiselectProtocolNotSupported):
+            self.peerstore.reject_protocols(peer_id, protocol_ids)
+            return
+        try:
+            supported = self.peerstore.get_protocols(peer_id)
+        except PeerStoreError:
+            return
+        self.peerstore.set_protocols(peer_id, [protocol_id for protocol_id in supported
+                                               if protocol_id not in protocol_ids])
+
+    def set_stream_protocol(self, muxed_stream, protocol_id):
+        """
+        Check a muxed stream out of the resource scope of its protocol
+        :param muxed_stream: muxed stream protocol_id was negotiated on
+        :param protocol_id: protocol of the stream
+        :raise ResourceLimitExceeded: protocol_id has too many streams or bytes
+        """
+        if muxed_stream.resource_scope is not None:
+            self.resource_manager.set_stream_protocol(muxed_stream.resource_scope, protocol_id)
+
     async def listen(self, *args):
         """
         :param *args: one or many multiaddrs to start listening on
         :return: true if at least one success
 
-        For each multiaddr in args
-            Check if a listener for multiaddr exists already
-            If listener already exists, continue
-            Otherwise:
-                Capture multiaddr in conn handler
-                Have conn handler delegate to stream handler
-                Call listener listen with the multiaddr
-                Map multiaddr to listener
+        Listens on every multiaddr in args concurrently, each with the
+        transport registered for its protocol. Multiaddrs already listened
+        on count as a success
         """
-        for multiaddr in args:
-            if str(multiaddr) in self.listeners:
-                return True
+        results = await asyncio.gather(*[self.listen_on(multiaddr) for multiaddr in args])
+        return any(results)
 
-            async def conn_handler(reader, writer):
-                # Read in first message (should be peer_id of initiator) and ack
-                peer_id = id_b58_decode((await reader.read(1024)).decode())
+    async def listen_on(self, multiaddr):
+        """
+        :param multiaddr: multiaddr to start listening on
+        :return: true if successful
+        """
+        if str(multiaddr) in self.listeners:
+            return True
 
-                writer.write("received peer id".encode())
-                await writer.drain()
+        async def conn_handler(reader, writer):
+            # Upgrade reader/write to a net_stream and pass \
+            # to appropriate stream handler (using multiaddr)
+            raw_conn = RawConnection(*host_and_port(multiaddr), reader, writer, False)
 
-                # Upgrade reader/write to a net_stream and pass \
-                # to appropriate stream handler (using multiaddr)
-                raw_conn = RawConnection(multiaddr.value_for_protocol('ip4'),
-                                         multiaddr.value_for_protocol('tcp'), reader, writer, False)
+            try:
+                # Read in first message (should be peer_id of initiator) and ack
+                peer_id = id_b58_decode((await raw_conn.read()).decode())
+                await raw_conn.write("received peer id".encode())
 
-                # Per, https://discuss.libp2p.io/t/multistream-security/130, we first secure
-                # the conn and then mux the conn
+                # Per, https://discuss.libp2p.io/t/multistream-security/130, we first
+                # secure the conn and then mux the conn
                 secured_conn = await self.upgrader.upgrade_security(raw_conn, peer_id, False)
-                muxed_conn = self.upgrader.upgrade_connection(secured_conn, \
+                muxed_conn = await self.upgrader.upgrade_connection(secured_conn, \
                     self.generic_protocol_handler, peer_id)
+            except ResourceLimitExceeded:
+                # Too many connections to the peer or in total, the muxer
+                # already closed the raw conn to refuse the connection
+                return
+            except Exception as error:  # pylint: disable=broad-except
+                # Nothing awaits this callback, so the error is logged instead
+                raw_conn.close()
+                log.warning("failed to upgrade inbound connection on %s: %s", multiaddr, error)
+                return
+
+            # Store muxed_conn with peer id
+            await self.add_connection(peer_id, muxed_conn)
+
+        try:
+            listener = self.transports.create_listener(multiaddr, conn_handler)
+            await listener.listen(multiaddr)
+        except (IOError, TransportNotFound) as error:
+            # Failed, the other multiaddrs are unaffected
+            log.warning("failed to listen on %s: %s", multiaddr, error)
+            return False
+
+        # Success
+        self.listeners[str(multiaddr)] = listener
 
-                # Store muxed_conn with peer id
-                self.connections[peer_id] = muxed_conn
-
-                # Call notifiers since event occurred
-                for notifee in self.notifees:
-                    await notifee.connected(self, muxed_conn)
-
-            try:
-                # Success
-                listener = self.transport.create_listener(conn_handler)
-                self.listeners[str(multiaddr)] = listener
-                await listener.listen(multiaddr)
-
-                # Call notifiers since event occurred
-                for notifee in self.notifees:
-                    await notifee.listen(self, multiaddr)
+        # Call notifiers since event occurred
+        await self.notifee_dispatcher.dispatch("listen", str(multiaddr), multiaddr)
 
-                return True
-            except IOError:
-                # Failed. Continue looping.
-                print("Failed to connect to: " + str(multiaddr))
+        return True
 
-        # No multiaddr succeeded
-        return False
+    def add_transport(self, protocol, transport):
+        """
+        Dial and listen on multiaddrs with protocol using transport
+        :param protocol: multiaddr protocol name handled by transport, e.g. tcp
+        :param transport: transport instance
+        """
+        self.transports.add_transport(protocol, transport)
 
     def notify(self, notifee):
         """
@@ -188,7 +474,7 @@ class Swarm(INetwork):
         :return: true if notifee registered successfully, false otherwise
         """
         if isinstance(notifee, INotifee):
-            self.notifees.append(notifee)
+            self.notifee_dispatcher.add_notifee(notifee)
             return True
         return False
 
@@ -206,19 +492,41 @@ def create_generic_protocol_handler(swarm):
 
     async def generic_protocol_handler(muxed_stream):
         # Perform protocol muxing to determine protocol to use
-        protocol, handler = await multiselect.negotiate(muxed_stream)
-
-        net_stream = NetStream(muxed_stream)
+        try:
+            protocol, handler = await multiselect.negotiate(muxed_stream)
+        except (MultiselectError, MultiselectCommunicatorError, MuxedStreamError):
+            # The other end broke off, reset or garbled the negotiation
+            await muxed_stream.reset()
+            return
+        try:
+            swarm.set_stream_protocol(muxed_stream, protocol)
+        except ResourceLimitExceeded:
+            # Too many streams of this protocol, refuse the stream
+            await muxed_stream.reset()
+            return
+
+        net_stream = NetStream(muxed_stream, swarm.metrics)
         net_stream.set_protocol(protocol)
 
         # Call notifiers since event occurred
-        for notifee in swarm.notifees:
-            await notifee.opened_stream(swarm, net_stream)
+        await swarm.notifee_dispatcher.dispatch(
+            "opened_stream", muxed_stream.muxed_conn, net_stream)
 
         # Give to stream handler
         asyncio.ensure_future(handler(net_stream))
 
     return generic_protocol_handler
 
+def host_and_port(multiaddr):
+    """
+    :param multiaddr: multiaddr listened on
+    :return: ip4 or ip6 address of multiaddr and its tcp port, None if it has none
+    """
+    names = [protocol.name for protocol in multiaddr.protocols()]
+    host = multiaddr.value_for_protocol("ip4" if "ip4" in names else "ip6")
+    port = multiaddr.value_for_protocol("tcp") if "tcp" in names else None
+    return host, port
+
+
 class SwarmException(Exception):
     pass
@@ -6,17 +6,33 @@ class PeerData(IPeerData):
     def __init__(self):
         self.metadata = {}
         self.protocols = []
+        self.rejected_protocols = []
         self.addrs = []
 
     def get_protocols(self):
         return self.protocols
 
     def add_protocols(self, protocols):
-        self.protocols.extend(protocols)
+        self.protocols.extend(protocol for protocol in protocols
+                              if protocol not in self.protocols)
+        self.rejected_protocols = [protocol for protocol in self.rejected_protocols
+                                   if protocol not in protocols]
 
     def set_protocols(self, protocols):
         self.protocols = protocols
 
+    def get_rejected_protocols(self):
+        return self.rejected_protocols
+
+    def reject_protocols(self, protocols):
+        self.rejected_protocols.extend(protocol for protocol in protocols
+                                       if protocol not in self.rejected_protocols)
+        self.protocols = [protocol for protocol in self.protocols
+                          if protocol not in protocols]
+
+    def clear_rejected_protocols(self):
+        self.rejected_protocols = []
+
     def add_addrs(self, addrs):
         self.addrs.extend(addrs)
 
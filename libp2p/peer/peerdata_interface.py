@@ -21,6 +21,24 @@ class IPeerData(ABC):
         :param protocols: protocols to add
         """
 
+    @abstractmethod
+    def get_rejected_protocols(self):
+        """
+        :return: protocols the peer rejected, which are not in get_protocols
+        """
+
+    @abstractmethod
+    def reject_protocols(self, protocols):
+        """
+        :param protocols: protocols the peer rejected, removed from get_protocols
+        """
+
+    @abstractmethod
+    def clear_rejected_protocols(self):
+        """
+        Forget the protocols the peer rejected
+        """
+
     @abstractmethod
     def add_addrs(self, addrs):
         """
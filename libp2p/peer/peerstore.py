@@ -42,6 +42,19 @@ class PeerStore(IPeerStore):
         peer = self.__create_or_get_peer(peer_id)
         peer.set_protocols(protocols)
 
+    def get_rejected_protocols(self, peer_id):
+        if peer_id in self.peer_map:
+            return self.peer_map[peer_id].get_rejected_protocols()
+        raise PeerStoreError("peer ID not found")
+
+    def reject_protocols(self, peer_id, protocols):
+        peer = self.__create_or_get_peer(peer_id)
+        peer.reject_protocols(protocols)
+
+    def clear_rejected_protocols(self, peer_id):
+        if peer_id in self.peer_map:
+            self.peer_map[peer_id].clear_rejected_protocols()
+
     def peers(self):
         return list(self.peer_map.keys())
 
@@ -41,6 +41,28 @@ class IPeerStore(IAddrBook, IPeerMetadata):
         :raise Exception: peer ID not found
         """
 
+    @abstractmethod
+    def get_rejected_protocols(self, peer_id):
+        """
+        :param peer_id: peer ID to get rejected protocols for
+        :return: protocols (as strings) the peer rejected
+        :raise Exception: peer ID not found exception
+        """
+
+    @abstractmethod
+    def reject_protocols(self, peer_id, protocols):
+        """
+        Record protocols the peer rejected, they are no longer among its protocols
+        :param peer_id: peer ID to reject protocols for
+        :param protocols: protocols rejected
+        """
+
+    @abstractmethod
+    def clear_rejected_protocols(self, peer_id):
+        """
+        :param peer_id: peer ID to forget the rejected protocols of
+        """
+
     @abstractmethod
     def peers(self):
         """
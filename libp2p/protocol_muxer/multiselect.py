@@ -1,20 +1,36 @@
 from .multiselect_muxer_interface import IMultiselectMuxer
-from .multiselect_communicator import MultiselectCommunicator
+from .multiselect_communicator import MultiselectCommunicator, encode_message
 
 
 MULTISELECT_PROTOCOL_ID = "/multistream/1.0.0"
 PROTOCOL_NOT_FOUND_MSG = "na"
+LS_COMMAND = "ls"
+
+# Most protocol ids whose matched handler is remembered
+MAX_MATCH_CACHE_SIZE = 1024
 
 
 class Multiselect(IMultiselectMuxer):
     """
     Multiselect module that is responsible for responding to
     a multiselect client and deciding on
-    a specific protocol and handler pair to use for communication
+    a specific protocol and handler pair to use for communication.
+
+    A protocol id is looked up in the handlers added with add_handler first,
+    then run through the match functions added with add_handler_match, in
+    the order they were added. Protocol ids matched that way are remembered,
+    so both kinds of lookup are a single dict lookup once warm.
     """
 
     def __init__(self):
+        # Mapping from protocol id -> handler, for exact matches
         self.handlers = {}
+        # List of (protocol, match function, handler), in order of priority
+        self.matchers = []
+        # Mapping from protocol id -> handler found by a matcher
+        self.match_cache = {}
+        # Encoded response to ls, built on first use
+        self.ls_response = None
 
     def add_handler(self, protocol, handler):
         """
@@ -23,6 +39,74 @@ class Multiselect(IMultiselectMuxer):
         :param handler: handler function
         """
         self.handlers[protocol] = handler
+        self.invalidate()
+
+    def add_handler_match(self, protocol, match, handler):
+        """
+        Store the handler for every protocol id match accepts, e.g. one
+        returned by prefix_matcher or semver_matcher
+        :param protocol: protocol name, listed in response to ls
+        :param match: function called with a protocol id, returning true if
+        handler handles it
+        :param handler: handler function
+        """
+        self.matchers.append((protocol, match, handler))
+        self.invalidate()
+
+    def remove_handler(self, protocol):
+        """
+        Remove the handler stored with the given protocol, by either
+        add_handler or add_handler_match
+        :param protocol: protocol name
+        """
+        self.handlers.pop(protocol, None)
+        self.matchers = [entry for entry in self.matchers if entry[0] != protocol]
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forget the matches and ls response computed for the previous handlers
+        """
+        self.match_cache.clear()
+        self.ls_response = None
+
+    def find_handler(self, protocol_id):
+        """
+        :param protocol_id: protocol id proposed by the counterparty
+        :return: handler of protocol_id
+        :raise MultiselectProtocolNotFound: no handler handles protocol_id
+        """
+        if protocol_id in self.handlers:
+            return self.handlers[protocol_id]
+        if protocol_id in self.match_cache:
+            return self.match_cache[protocol_id]
+
+        for _, match, handler in self.matchers:
+            if match(protocol_id):
+                if len(self.match_cache) >= MAX_MATCH_CACHE_SIZE:
+                    self.match_cache.clear()
+                self.match_cache[protocol_id] = handler
+                return handler
+        raise MultiselectProtocolNotFound(protocol_id)
+
+    def get_protocols(self):
+        """
+        :return: names of the protocols with a handler, exact matches first
+        """
+        protocols = list(self.handlers)
+        protocols.extend(protocol for protocol, _, _ in self.matchers
+                         if protocol not in self.handlers)
+        return protocols
+
+    def get_ls_response(self):
+        """
+        :return: encoded response to ls, one multistream message per protocol
+        name followed by a newline
+        """
+        if self.ls_response is None:
+            self.ls_response = b"".join(
+                encode_message(protocol) for protocol in self.get_protocols()) + b"\n"
+        return self.ls_response
 
     async def negotiate(self, stream):
         """
@@ -42,20 +126,27 @@ class Multiselect(IMultiselectMuxer):
             # Read message
             command = await communicator.read_stream_until_eof()
 
+            if not command:
+                raise MultiselectError("stream closed during negotiation")
+
             # Command is ls or a protocol
-            if command == "ls":
-                # TODO: handle ls command
-                pass
-            else:
-                protocol = command
-                if protocol in self.handlers:
-                    # Tell counterparty we have decided on a protocol
-                    await communicator.write(protocol)
-
-                    # Return the decided on protocol
-                    return protocol, self.handlers[protocol]
+            if command == LS_COMMAND:
+                await communicator.write_encoded(self.get_ls_response())
+                continue
+
+            protocol = command
+            try:
+                handler = self.find_handler(protocol)
+            except MultiselectProtocolNotFound:
                 # Tell counterparty this protocol was not found
                 await communicator.write(PROTOCOL_NOT_FOUND_MSG)
+                continue
+
+            # Tell counterparty we have decided on a protocol
+            await communicator.write(protocol)
+
+            # Return the decided on protocol
+            return protocol, handler
 
     async def handshake(self, communicator):
         """
@@ -91,5 +182,55 @@ def validate_handshake(handshake_contents):
     return handshake_contents == MULTISELECT_PROTOCOL_ID
 
 
+def prefix_matcher(prefix):
+    """
+    :param prefix: prefix of the protocol ids to match, e.g. /ipfs/
+    :return: match function accepting the protocol ids starting with prefix
+    """
+    def match(protocol_id):
+        return protocol_id.startswith(prefix)
+    return match
+
+
+def semver_matcher(base):
+    """
+    Match the versions of a protocol a handler of version base can speak,
+    as go-libp2p's MultistreamSemverMatcher does: those with the same major
+    version and a minor version no greater than that of base. A handler of
+    /meshsub/1.1.0 thus handles /meshsub/1.0.0 and /meshsub/1.1.0, but
+    neither /meshsub/1.2.0 nor /meshsub/2.0.0
+    :param base: protocol id ending with a version, e.g. /meshsub/1.1.0
+    :return: match function accepting the protocol ids of matching versions
+    :raise ValueError: base does not end with a version
+    """
+    name, version = split_version(base)
+    if version is None:
+        raise ValueError("protocol %s has no version" % base)
+
+    def match(protocol_id):
+        other_name, other_version = split_version(protocol_id)
+        return (other_name == name and other_version is not None
+                and other_version[0] == version[0] and other_version[1] <= version[1])
+    return match
+
+
+def split_version(protocol_id):
+    """
+    :param protocol_id: protocol id, e.g. /meshsub/1.1.0
+    :return: name and version of protocol_id as a (major, minor, patch)
+    tuple, e.g. ("/meshsub", (1, 1, 0)), version None if it has none
+    """
+    name, _, version_str = protocol_id.rpartition("/")
+    parts = version_str.split(".")
+    if len(parts) > 3 or not all(part.isdigit() for part in parts):
+        return protocol_id, None
+    version = tuple(int(part) for part in parts)
+    return name, version + (0,) * (3 - len(version))
+
+
 class MultiselectError(ValueError):
     """Raised when an error occurs in multiselect process"""
+
+
+class MultiselectProtocolNotFound(MultiselectError):
+    """Raised when no handler handles a protocol id"""
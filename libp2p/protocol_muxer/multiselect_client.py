@@ -1,19 +1,36 @@
+import asyncio
+
+from libp2p.utils import decode_uvarint
+
 from .multiselect_client_interface import IMultiselectClient
 from .multiselect_communicator import MultiselectCommunicator
 
 
 MULTISELECT_PROTOCOL_ID = "/multistream/1.0.0"
 PROTOCOL_NOT_FOUND_MSG = "na"
+LS_COMMAND = "ls"
 
 
 class MultiselectClient(IMultiselectClient):
     """
     Client for communicating with receiver's multiselect
-    module in order to select a protocol id to communicate over
+    module in order to select a protocol id to communicate over.
+
+    In pipelined mode the handshake and the first proposal are sent together,
+    which saves a round trip whenever the first protocol is supported. In lazy
+    mode, select_lazily does not wait for the responses at all: application
+    data can be written right away and the responses are checked on the first
+    read. Both only change what the client sends when, so they work with any
+    multiselect responder.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, pipelined=True, lazy=False):
+        """
+        :param pipelined: send the first proposal along with the handshake
+        :param lazy: negotiate single protocols with select_lazily where supported
+        """
+        self.pipelined = pipelined
+        self.lazy = lazy
 
     async def handshake(self, communicator):
         """
@@ -28,6 +45,14 @@ class MultiselectClient(IMultiselectClient):
         # Send our MULTISELECT_PROTOCOL_ID to counterparty
         await communicator.write(MULTISELECT_PROTOCOL_ID)
 
+        await self.read_handshake(communicator)
+
+    async def read_handshake(self, communicator):
+        """
+        Read the handshake of the counterparty
+        :param communicator: communicator to use to communicate with counterparty
+        :raise MultiselectClientError: multiselect protocol ID mismatch
+        """
         # Read in the protocol ID from other party
         handshake_contents = await communicator.read_stream_until_eof()
 
@@ -37,6 +62,21 @@ class MultiselectClient(IMultiselectClient):
 
         # Handshake succeeded if this point is reached
 
+    async def select_lazily(self, protocol, stream):
+        """
+        Send the handshake and the proposal of protocol without waiting for
+        the responses, so that application data can follow right away. The
+        responses are read and checked by LazyNegotiation.wait, which has to
+        be awaited before reading application data off stream
+        :param protocol: protocol to select
+        :param stream: stream to communicate with multiselect over
+        :return: LazyNegotiation of protocol on stream
+        """
+        communicator = MultiselectCommunicator(stream)
+        await communicator.write(MULTISELECT_PROTOCOL_ID)
+        await communicator.write(protocol)
+        return LazyNegotiation(self, communicator, protocol)
+
     async def select_protocol_or_fail(self, protocol, stream):
         """
         Send message to multiselect selecting protocol
@@ -64,13 +104,24 @@ class MultiselectClient(IMultiselectClient):
         :param protocol: protocol to select
         :param stream: stream to communicate with multiselect over
         :return: selected protocol
+        :raise MultiselectProtocolNotSupported: counterparty supports none of protocols
+        :raise MultiselectClientError: negotiation failed otherwise, e.g. the
+        stream ended
         """
 
         # Create a communicator to handle all communication across the stream
         communicator = MultiselectCommunicator(stream)
 
-        # Perform handshake to ensure multiselect protocol IDs match
-        await self.handshake(communicator)
+        if self.pipelined and protocols:
+            # Send the first proposal without waiting for the handshake
+            await communicator.write(MULTISELECT_PROTOCOL_ID)
+            try:
+                return await self.try_select(communicator, protocols[0], self.read_handshake)
+            except MultiselectProtocolNotSupported:
+                protocols = protocols[1:]
+        else:
+            # Perform handshake to ensure multiselect protocol IDs match
+            await self.handshake(communicator)
 
         # For each protocol, attempt to select that protocol
         # and return the first protocol selected
@@ -78,33 +129,138 @@ class MultiselectClient(IMultiselectClient):
             try:
                 selected_protocol = await self.try_select(communicator, protocol)
                 return selected_protocol
-            except MultiselectClientError:
+            except MultiselectProtocolNotSupported:
                 pass
 
         # No protocols were found, so return no protocols supported error
-        raise MultiselectClientError("protocols not supported")
+        raise MultiselectProtocolNotSupported("protocols not supported")
 
-    async def try_select(self, communicator, protocol):
+    async def list_protocols(self, stream):
+        """
+        Ask multiselect for the protocols it has handlers for. The stream
+        stays in negotiation, a protocol can be selected on it afterwards
+        with try_select
+        :param stream: stream to communicate with multiselect over
+        :return: protocol names listed by multiselect
+        """
+        communicator = MultiselectCommunicator(stream)
+        await self.handshake(communicator)
+        await communicator.write(LS_COMMAND)
+        return parse_ls_response(await communicator.read_encoded())
+
+    async def try_select(self, communicator, protocol, read_handshake=None):
         """
         Try to select the given protocol or raise exception if fails
         :param communicator: communicator to use to communicate with counterparty
         :param protocol: protocol to select
-        :raise Exception: error in protocol selection
+        :param read_handshake: coroutine function reading the handshake of the
+        counterparty once protocol is sent, if it is still to be read
+        :raise MultiselectProtocolNotSupported: counterparty does not support protocol
+        :raise MultiselectClientError: error in protocol selection
         :return: selected protocol
         """
 
         # Tell counterparty we want to use protocol
         await communicator.write(protocol)
+        if read_handshake is not None:
+            await read_handshake(communicator)
 
         # Get what counterparty says in response
         response = await communicator.read_stream_until_eof()
+        return check_response(protocol, response)
+
+
+class LazyNegotiation:
+    """
+    Negotiation of a protocol whose handshake and proposal are sent but
+    whose responses are not read yet
+    """
+
+    def __init__(self, client, communicator, protocol):
+        """
+        :param client: MultiselectClient that sent the proposal
+        :param communicator: communicator the proposal was sent with
+        :param protocol: protocol proposed
+        """
+        self.client = client
+        self.communicator = communicator
+        self.protocol = protocol
+        self.lock = asyncio.Lock()
+        self.done = False
+        self.error = None
+        self.error_callbacks = []
+
+    def add_error_callback(self, callback):
+        """
+        :param callback: function called with the MultiselectClientError the
+        negotiation fails with, if it does
+        """
+        self.error_callbacks.append(callback)
+
+    async def wait(self):
+        """
+        Read and check the responses to the handshake and the proposal, the
+        first time it is called
+        :raise MultiselectClientError: handshake failed or protocol was rejected
+        """
+        if self.done:
+            if self.error is not None:
+                raise self.error
+            return
+        async with self.lock:
+            if not self.done:
+                try:
+                    await self.client.read_handshake(self.communicator)
+                    response = await self.communicator.read_stream_until_eof()
+                    check_response(self.protocol, response)
+                except MultiselectClientError as error:
+                    self.error = error
+                    for callback in self.error_callbacks:
+                        callback(error)
+                finally:
+                    self.done = True
+        if self.error is not None:
+            raise self.error
+
+
+def parse_ls_response(response):
+    """
+    :param response: response to ls, one multistream message per protocol
+    :return: protocol names listed in response
+    :raise MultiselectClientError: response is malformed
+    """
+    protocols = []
+    index = 0
+    while index < len(response):
+        try:
+            length, index = decode_uvarint(response, index)
+        except ValueError as error:
+            raise MultiselectClientError("malformed ls response: %s" % error)
+        line = response[index:index + length]
+        if len(line) != length or line[-1:] != b"\n":
+            raise MultiselectClientError("malformed ls response")
+        try:
+            protocols.append(line[:-1].decode())
+        except UnicodeDecodeError:
+            raise MultiselectClientError("malformed ls response: protocol is not valid UTF-8")
+        index += length
+    return protocols
 
-        # Return protocol if response is equal to protocol or raise error
-        if response == protocol:
-            return protocol
-        if response == PROTOCOL_NOT_FOUND_MSG:
-            raise MultiselectClientError("protocol not supported")
-        raise MultiselectClientError("unrecognized response: " + response)
+
+def check_response(protocol, response):
+    """
+    :param protocol: protocol proposed
+    :param response: response of counterparty to the proposal
+    :return: protocol if counterparty selected it
+    :raise MultiselectProtocolNotSupported: counterparty does not support protocol
+    :raise MultiselectClientError: response is not recognized
+    """
+    # Return protocol if response is equal to protocol or raise error
+    if response == protocol:
+        return protocol
+    if response == PROTOCOL_NOT_FOUND_MSG:
+        raise MultiselectProtocolNotSupported("protocol not supported")
+    raise MultiselectClientError("unrecognized response: " + response)
 
 
 def validate_handshake(handshake_contents):
@@ -118,5 +274,10 @@ def validate_handshake(handshake_contents):
     # is added
     return handshake_contents == MULTISELECT_PROTOCOL_ID
 
+
 class MultiselectClientError(ValueError):
     """Raised when an error occurs in protocol selection process"""
+
+
+class MultiselectProtocolNotSupported(MultiselectClientError):
+    """Raised when the counterparty does not support a proposed protocol"""
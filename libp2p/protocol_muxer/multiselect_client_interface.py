@@ -27,3 +27,13 @@ class IMultiselectClient(ABC):
         :param stream: stream to communicate with multiselect over
         :return: selected protocol
         """
+
+    @abstractmethod
+    def select_lazily(self, protocol, stream):
+        """
+        Send message to multiselect selecting protocol without waiting
+        for multiselect to return it
+        :param protocol: protocol to select
+        :param stream: stream to communicate with multiselect over
+        :return: negotiation whose wait checks that protocol was selected
+        """
@@ -1,31 +1,123 @@
+import asyncio
+from functools import lru_cache
+
+from libp2p.utils import encode_uvarint, read_uvarint
+
 from .multiselect_communicator_interface import IMultiselectCommunicator
 
+# Largest multistream message accepted, as in go-multistream
+MAX_MESSAGE_SIZE = 64 * 1024
+
+# Most distinct messages kept encoded
+MAX_CACHED_MESSAGES = 4096
+
 
 class MultiselectCommunicator(IMultiselectCommunicator):
     """
     Communicator helper class that ensures both the client
     and multistream module will follow the same multistream protocol,
-    which is necessary for them to work
+    which is necessary for them to work.
+
+    Messages are framed as the multistream spec says: a varint length,
+    then the message followed by a newline. The encoded form of every
+    message sent is cached, so that the protocol ids sent over and over
+    are only ever encoded once.
     """
 
     def __init__(self, reader_writer):
         """
         MultistreamCommunicator expects a reader_writer object that has
         an async read and an async write function (this could be a stream,
-        raw connection, or other object implementing those functions)
+        raw connection, or other object implementing those functions).
+        A reader_writer whose frames_messages attribute is true, such as a
+        raw connection, frames each write as a message itself and reads back
+        one such message at a time. Any other reader_writer is read as a
+        stream of bytes, and needs an async readexactly function too
         """
         self.reader_writer = reader_writer
+        self.frames_messages = getattr(reader_writer, "frames_messages", False)
 
     async def write(self, msg_str):
         """
         Write message to reader_writer
         :param msg_str: message to write
         """
-        await self.reader_writer.write(msg_str.encode())
+        if self.frames_messages:
+            await self.reader_writer.write(encode_line(msg_str))
+        else:
+            await self.reader_writer.write(encode_message(msg_str))
+
+    async def write_encoded(self, msg):
+        """
+        Write message already encoded to bytes to reader_writer
+        :param msg: encoded message to write, ending with a newline
+        """
+        if self.frames_messages:
+            await self.reader_writer.write(msg)
+        else:
+            await self.reader_writer.write(encode_uvarint(len(msg)) + msg)
+
+    async def read_encoded(self):
+        """
+        Read a message from reader_writer
+        :return: bytes of the message without its newline, b"" at EOF
+        :raise MultiselectCommunicatorError: message is malformed, too large or cut short
+        """
+        if self.frames_messages:
+            msg = await self.reader_writer.read()
+        else:
+            try:
+                length = await read_uvarint(self.reader_writer)
+            except asyncio.IncompleteReadError:
+                raise MultiselectCommunicatorError("stream ended within a message")
+            except ValueError as error:
+                raise MultiselectCommunicatorError(str(error))
+            if length is None:
+                return b""
+            if length > MAX_MESSAGE_SIZE:
+                raise MultiselectCommunicatorError(
+                    "message of %d bytes exceeds maximum of %d bytes"
+                    % (length, MAX_MESSAGE_SIZE))
+            try:
+                msg = await self.reader_writer.readexactly(length)
+            except asyncio.IncompleteReadError:
+                raise MultiselectCommunicatorError("stream ended within a message")
+
+        if not msg:
+            return b""
+        if msg[-1:] != b"\n":
+            raise MultiselectCommunicatorError("message does not end with a newline")
+        return msg[:-1]
 
     async def read_stream_until_eof(self):
         """
         Reads message from reader_writer until EOF
+        :raise MultiselectCommunicatorError: message is malformed or not UTF-8
         """
-        read_str = (await self.reader_writer.read()).decode()
-        return read_str
+        try:
+            return (await self.read_encoded()).decode()
+        except UnicodeDecodeError:
+            raise MultiselectCommunicatorError("message is not valid UTF-8")
+
+
+@lru_cache(maxsize=MAX_CACHED_MESSAGES)
+def encode_line(msg_str):
+    """
+    :param msg_str: message
+    :return: message encoded, followed by a newline
+    """
+    return msg_str.encode() + b"\n"
+
+
+@lru_cache(maxsize=MAX_CACHED_MESSAGES)
+def encode_message(msg_str):
+    """
+    :param msg_str: message
+    :return: message encoded and framed, ready to be written as is
+    """
+    line = encode_line(msg_str)
+    return encode_uvarint(len(line)) + line
+
+
+class MultiselectCommunicatorError(ValueError):
+    """Raised when a malformed multistream message is read"""
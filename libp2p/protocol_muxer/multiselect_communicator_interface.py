@@ -15,6 +15,13 @@ class IMultiselectCommunicator(ABC):
         :param msg_str: message to write
         """
 
+    @abstractmethod
+    def write_encoded(self, msg):
+        """
+        Write message already encoded to bytes to stream
+        :param msg: encoded message to write
+        """
+
     @abstractmethod
     def read_stream_until_eof(self):
         """
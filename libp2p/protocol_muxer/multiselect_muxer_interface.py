@@ -16,6 +16,23 @@ class IMultiselectMuxer(ABC):
         :param handler: handler function
         """
 
+    @abstractmethod
+    def add_handler_match(self, protocol, match, handler):
+        """
+        Store the handler for every protocol id match accepts
+        :param protocol: protocol name
+        :param match: function called with a protocol id, returning true if
+        handler handles it
+        :param handler: handler function
+        """
+
+    @abstractmethod
+    def remove_handler(self, protocol):
+        """
+        Remove the handler stored with the given protocol
+        :param protocol: protocol name
+        """
+
     @abstractmethod
     def negotiate(self, stream):
         """
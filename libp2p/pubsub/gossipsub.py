@@ -2,10 +2,16 @@ import random
 import asyncio
 
 from ast import literal_eval
+
+from libp2p.peer.id import id_b58_decode
+
 from .pb import rpc_pb2
 from .pubsub_router_interface import IPubsubRouter
 from .mcache import MessageCache
 
+# Tag protecting the connections to the mesh peers of a topic, followed by the topic
+MESH_TAG_PREFIX = "gossipsub-mesh:"
+
 
 class GossipSub(IPubsubRouter):
     # pylint: disable=no-member
@@ -190,7 +196,7 @@ class GossipSub(IPubsubRouter):
             # Add them to mesh[topic], and notifies them with a
             # GRAFT(topic) control message.
             for peer in self.fanout[topic]:
-                self.mesh[topic].append(peer)
+                self.add_mesh_peer(topic, peer)
                 await self.emit_graft(topic, peer)
         else:
             # Otherwise, if there are less than D peers
@@ -200,7 +206,7 @@ class GossipSub(IPubsubRouter):
                 fanout_size = len(self.fanout[topic])
                 # then it still adds them as above (if there are any)
                 for peer in self.fanout[topic]:
-                    self.mesh[topic].append(peer)
+                    self.add_mesh_peer(topic, peer)
                     await self.emit_graft(topic, peer)
 
             if topic in self.peers_gossipsub:
@@ -216,7 +222,7 @@ class GossipSub(IPubsubRouter):
                 # And likewise adds them to mesh[topic] and notifies them with a
                 # GRAFT(topic) control message.
                 for peer in selected_peers:
-                    self.mesh[topic].append(peer)
+                    self.add_mesh_peer(topic, peer)
                     await self.emit_graft(topic, peer)
 
             # TODO: Do we remove all peers from fanout[topic]?
@@ -230,11 +236,45 @@ class GossipSub(IPubsubRouter):
         """
         # Notify the peers in mesh[topic] with a PRUNE(topic) message
         for peer in self.mesh[topic]:
+            self.unprotect_mesh_peer(topic, peer)
             await self.emit_prune(topic, peer)
 
         # Forget mesh[topic]
         self.mesh.pop(topic, None)
 
+    # Mesh helpers
+
+    def add_mesh_peer(self, topic, peer):
+        """
+        Add a peer to mesh[topic], protecting the connection to it from
+        being trimmed by the connection manager while it is in the mesh.
+        A peer already in the mesh, e.g. grafting again, is not added twice
+        :param topic: topic of the mesh
+        :param peer: id string of the peer
+        """
+        if peer in self.mesh[topic]:
+            return
+        self.mesh[topic].append(peer)
+        self.pubsub.host.get_network().protect_peer(
+            id_b58_decode(peer), MESH_TAG_PREFIX + topic)
+
+    def remove_mesh_peer(self, topic, peer):
+        """
+        Remove a peer from mesh[topic] and its protection for the topic
+        :param topic: topic of the mesh
+        :param peer: id string of the peer
+        """
+        self.mesh[topic].remove(peer)
+        self.unprotect_mesh_peer(topic, peer)
+
+    def unprotect_mesh_peer(self, topic, peer):
+        """
+        :param topic: topic of the mesh peer is no longer in
+        :param peer: id string of the peer
+        """
+        self.pubsub.host.get_network().unprotect_peer(
+            id_b58_decode(peer), MESH_TAG_PREFIX + topic)
+
     # Interface Helper Functions
     @staticmethod
     def get_peer_type(protocol_id):
@@ -284,7 +324,7 @@ class GossipSub(IPubsubRouter):
 
                 for peer in selected_peers:
                     # Add peer to mesh[topic]
-                    self.mesh[topic].append(peer)
+                    self.add_mesh_peer(topic, peer)
 
                     # Emit GRAFT(topic) control message to peer
                     await self.emit_graft(topic, peer)
@@ -295,7 +335,7 @@ class GossipSub(IPubsubRouter):
                                                              self.mesh[topic], [])
                 for peer in selected_peers:
                     # Remove peer from mesh[topic]
-                    self.mesh[topic].remove(peer)
+                    self.remove_mesh_peer(topic, peer)
 
                     # Emit PRUNE(topic) control message to peer
                     await self.emit_prune(topic, peer)
@@ -460,10 +500,9 @@ class GossipSub(IPubsubRouter):
         from_id_str = sender_peer_id
 
         # Add peer to mesh for topic
-        if topic in self.mesh:
-            self.mesh[topic].append(from_id_str)
-        else:
-            self.mesh[topic] = [from_id_str]
+        if topic not in self.mesh:
+            self.mesh[topic] = []
+        self.add_mesh_peer(topic, from_id_str)
 
     async def handle_prune(self, prune_msg, sender_peer_id):
         topic = prune_msg.topicID
@@ -472,7 +511,7 @@ class GossipSub(IPubsubRouter):
 
         # Remove peer from mesh for topic, if peer is in topic
         if topic in self.mesh and from_id_str in self.mesh[topic]:
-            self.mesh[topic].remove(from_id_str)
+            self.remove_mesh_peer(topic, from_id_str)
 
     # RPC emitters
 
@@ -1,11 +1,16 @@
 # pylint: disable=no-name-in-module
 import asyncio
+import logging
 
 from lru import LRU
 
+from libp2p.network.resource_manager import ResourceLimitExceeded
+
 from .pb import rpc_pb2
 from .pubsub_notifee import PubsubNotifee
 
+log = logging.getLogger(__name__)  # pylint: disable=invalid-name
+
 
 class Pubsub():
     # pylint: disable=too-many-instance-attributes, no-member
@@ -81,46 +86,73 @@ class Pubsub():
         """
 
         # TODO check on types here
-        peer_id = str(stream.mplex_conn.peer_id)
+        peer_id = str(stream.muxed_conn.peer_id)
+        scope = stream.muxed_stream.resource_scope
 
         while True:
             incoming = (await stream.read())
-            rpc_incoming = rpc_pb2.RPC()
-            rpc_incoming.ParseFromString(incoming)
-
-            should_publish = False
-
-            if rpc_incoming.publish:
-                # deal with RPC.publish
-                for message in rpc_incoming.publish:
-                    id_in_seen_msgs = (message.seqno, message.from_id)
-                    if id_in_seen_msgs not in self.seen_messages:
-                        should_publish = True
-                        self.seen_messages[id_in_seen_msgs] = 1
-
-                        await self.handle_talk(message)
-
-            if rpc_incoming.subscriptions:
-                # deal with RPC.subscriptions
-                # We don't need to relay the subscription to our
-                # peers because a given node only needs its peers
-                # to know that it is subscribed to the topic (doesn't
-                # need everyone to know)
-                for message in rpc_incoming.subscriptions:
-                    if message.subscribe:
-                        self.handle_subscription(peer_id, message)
-
-            if should_publish:
-                # relay message to peers with router
-                await self.router.publish(peer_id, incoming)
-
-            if rpc_incoming.control:
-                # Pass rpc to router so router could perform custom logic
-                await self.router.handle_rpc(rpc_incoming, peer_id)
+            if not incoming:
+                # Peer closed the stream
+                break
+
+            # The RPC stays in memory while it is handled and relayed, which
+            # must fit in the memory left to the stream, its peer and the host
+            if scope is None:
+                await self.handle_rpc(peer_id, incoming)
+            else:
+                try:
+                    scope.reserve_memory(len(incoming))
+                except ResourceLimitExceeded as error:
+                    log.warning("dropping RPC of %d bytes from %s: %s",
+                                len(incoming), peer_id, error)
+                    continue
+                try:
+                    await self.handle_rpc(peer_id, incoming)
+                finally:
+                    scope.release_memory(len(incoming))
 
             # Force context switch
             await asyncio.sleep(0)
 
+    async def handle_rpc(self, peer_id, incoming):
+        """
+        Handle an RPC read from a peer, relaying the messages not seen before
+        :param peer_id: id of the peer the RPC is from
+        :param incoming: serialized RPC
+        """
+        rpc_incoming = rpc_pb2.RPC()
+        rpc_incoming.ParseFromString(incoming)
+
+        should_publish = False
+
+        if rpc_incoming.publish:
+            # deal with RPC.publish
+            for message in rpc_incoming.publish:
+                id_in_seen_msgs = (message.seqno, message.from_id)
+                if id_in_seen_msgs not in self.seen_messages:
+                    should_publish = True
+                    self.seen_messages[id_in_seen_msgs] = 1
+
+                    await self.handle_talk(message)
+
+        if rpc_incoming.subscriptions:
+            # deal with RPC.subscriptions
+            # We don't need to relay the subscription to our
+            # peers because a given node only needs its peers
+            # to know that it is subscribed to the topic (doesn't
+            # need everyone to know)
+            for message in rpc_incoming.subscriptions:
+                if message.subscribe:
+                    self.handle_subscription(peer_id, message)
+
+        if should_publish:
+            # relay message to peers with router
+            await self.router.publish(peer_id, incoming)
+
+        if rpc_incoming.control:
+            # Pass rpc to router so router could perform custom logic
+            await self.router.handle_rpc(rpc_incoming, peer_id)
+
     async def stream_handler(self, stream):
         """
         Stream handler for pubsub. Gets invoked whenever a new stream is created
@@ -129,7 +161,7 @@ class Pubsub():
         """
         # Add peer
         # Map peer to stream
-        peer_id = stream.mplex_conn.peer_id
+        peer_id = stream.muxed_conn.peer_id
         self.peers[str(peer_id)] = stream
         self.router.add_peer(peer_id, stream.get_protocol())
 
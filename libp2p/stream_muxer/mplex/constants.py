@@ -4,3 +4,23 @@ HEADER_TAGS = {
     "CLOSE": 4,
     "RESET": 6
 }
+
+# Largest payload accepted in a single frame, same as go-mplex
+MAX_MESSAGE_SIZE = 1 << 20
+
+# Number of bytes requested from the raw connection per read
+READ_CHUNK_SIZE = 64 * 1024
+
+# Number of queued outbound bytes that triggers a flush before max_write_delay
+WRITE_BATCH_SIZE = 64 * 1024
+
+# Number of queued outbound bytes of a stream above which its writer waits
+# for them to be written
+WRITE_STREAM_HIGH_WATER = 64 * 1024
+
+# Bytes a stream of priority 1 may send each time the outbound scheduler
+# visits it. Streams with nothing larger queued are served in a single visit
+WRITE_QUANTUM = 16 * 1024
+
+# Number of received bytes buffered per stream before the stream is reset
+DEFAULT_STREAM_WINDOW_SIZE = 4 * MAX_MESSAGE_SIZE
@@ -0,0 +1,105 @@
+from .constants import MAX_MESSAGE_SIZE
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for mplex frames. Raw bytes read off the connection
+    in large chunks are fed in, and every complete frame found is returned
+    as a (stream_id, flag, message) tuple. Messages taking up at least half
+    of the chunk they were read in are memoryview slices of it, so large
+    payloads are not copied. Shorter messages are copied, as a slice keeps
+    the whole chunk alive for as long as the message is buffered. Partial
+    frames are kept until the rest of their bytes arrive.
+    """
+
+    def __init__(self, max_message_size=MAX_MESSAGE_SIZE):
+        """
+        :param max_message_size: largest payload accepted in a single frame
+        """
+        self.max_message_size = max_message_size
+
+        # Chunks holding the start of an incomplete frame, and how many bytes
+        # they must add up to before that frame can be decoded
+        self.pending = []
+        self.pending_size = 0
+        self.pending_needed = 0
+
+    def feed(self, data):
+        """
+        Decode all complete frames out of data and any incomplete frame left
+        over from previous calls
+        :param data: bytes read off the raw connection
+        :return: list of (stream_id, flag, message) tuples
+        :raise MplexFrameError: frame announces a payload that is too large
+        """
+        if self.pending:
+            self.pending.append(data)
+            self.pending_size += len(data)
+            if self.pending_size < self.pending_needed:
+                return []
+            data = b"".join(self.pending)
+            self.pending = []
+
+        view = memoryview(data)
+        frames = []
+        pos = 0
+        end = len(data)
+        needed = 0
+        while pos < end:
+            header, header_end = _decode_uvarint_partial(data, pos, end)
+            if header is None:
+                break
+            length, length_end = _decode_uvarint_partial(data, header_end, end)
+            if length is None:
+                break
+            if length > self.max_message_size:
+                raise MplexFrameError("frame of %d bytes exceeds maximum of %d bytes"
+                                      % (length, self.max_message_size))
+            message_end = length_end + length
+            if message_end > end:
+                needed = message_end - pos
+                break
+
+            if 2 * length >= end:
+                message = view[length_end:message_end]
+            else:
+                message = bytes(view[length_end:message_end])
+            frames.append((header >> 3, header & 0x07, message))
+            pos = message_end
+
+        if pos < end:
+            self.pending.append(data[pos:])
+            self.pending_size = end - pos
+            self.pending_needed = needed
+
+        return frames
+
+    def buffered_size(self):
+        """
+        :return: number of bytes of incomplete frames held in the buffer
+        """
+        return sum(len(chunk) for chunk in self.pending)
+
+
+def _decode_uvarint_partial(buf, pos, end):
+    """
+    Decode a varint starting at pos
+    :return: (value, index after the varint) or (None, pos) if buf ends first
+    """
+    shift = 0
+    result = 0
+    index = pos
+    while index < end:
+        i = buf[index]
+        index += 1
+        result |= (i & 0x7f) << shift
+        if not i & 0x80:
+            return result, index
+        shift += 7
+        if shift > 63:
+            raise MplexFrameError("varint exceeds 64 bits")
+    return None, pos
+
+
+class MplexFrameError(ValueError):
+    """Raised when a malformed frame is read off the connection"""
@@ -1,7 +1,13 @@
 import asyncio
+from collections import deque
 
-from .utils import encode_uvarint, decode_uvarint_from_stream, get_flag
-from .mplex_stream import MplexStream
+from libp2p.network.resource_manager import ResourceLimitExceeded
+
+from .constants import HEADER_TAGS, READ_CHUNK_SIZE, WRITE_BATCH_SIZE, WRITE_QUANTUM, \
+    WRITE_STREAM_HIGH_WATER, DEFAULT_STREAM_WINDOW_SIZE
+from .frame_decoder import FrameDecoder, MplexFrameError
+from .utils import encode_message, get_flag, get_tag
+from .mplex_stream import MplexStream, MplexStreamReset
 from ..muxed_connection_interface import IMuxedConn
 
 
@@ -11,13 +17,27 @@ class Mplex(IMuxedConn):
     reference: https://github.com/libp2p/go-mplex/blob/master/multiplex.go
     """
 
-    def __init__(self, secured_conn, generic_protocol_handler, peer_id):
+    def __init__(self, secured_conn, generic_protocol_handler, peer_id,
+                 stream_window_size=DEFAULT_STREAM_WINDOW_SIZE, max_write_delay=0,
+                 metrics=None, resource_manager=None):
+        # pylint: disable=too-many-arguments
         """
         create a new muxed connection
         :param conn: an instance of raw connection
         :param generic_protocol_handler: generic protocol handler
         for new muxed streams
         :param peer_id: peer_id of peer the connection is to
+        :param stream_window_size: maximum number of received bytes buffered
+        for a stream before the stream is reset
+        :param max_write_delay: longest time in seconds an outbound frame may
+        wait to be coalesced with later frames. With 0, frames queued in the
+        same event loop iteration are written together
+        :param metrics: optional Metrics counting the traffic of the connection
+        under peer_id
+        :param resource_manager: optional ResourceManager the connection, its
+        streams and their buffered bytes are checked out of
+        :raise ResourceLimitExceeded: no more connections to peer_id are
+        allowed, the secured connection is closed
         """
         super(Mplex, self).__init__(secured_conn, generic_protocol_handler, peer_id)
 
@@ -25,24 +45,97 @@ class Mplex(IMuxedConn):
         self.raw_conn = secured_conn.get_conn()
         self.initiator = self.raw_conn.initiator
 
+        self.resource_manager = resource_manager
+        self.resource_scope = None
+        if resource_manager is not None:
+            try:
+                self.resource_scope = resource_manager.open_connection(peer_id)
+            except ResourceLimitExceeded:
+                self.raw_conn.close()
+                raise
+
         # Store generic protocol handler
         self.generic_protocol_handler = generic_protocol_handler
 
         # Set peer_id
         self.peer_id = peer_id
 
-        # Mapping from stream ID -> buffer of messages for that stream
-        self.buffers = {}
+        # Mapping from stream ID -> stream, for streams that are not yet
+        # closed at both ends. Each stream buffers its own messages
+        self.streams = {}
+        self.stream_window_size = stream_window_size
 
         self.stream_queue = asyncio.Queue()
 
-        # Kick off reading
-        asyncio.ensure_future(self.handle_incoming())
+        # Decodes frames out of the chunks read off the raw connection
+        self.frame_decoder = FrameDecoder()
+
+        # Outbound frames waiting to be written, queued per stream. Each entry
+        # is [buffers, size, future resolved once written or None]. The writer
+        # serves the streams with frames queued, in active_streams, by deficit
+        # round-robin. Queues are kept for as long as their stream is open
+        self.write_queues = {}
+        # Mapping from stream ID -> bytes queued for the stream
+        self.write_queue_sizes = {}
+        self.write_deficits = {}
+        self.active_streams = deque()
+        self.write_queue_size = 0
+        # Futures of the batch being written
+        self.write_flushing = []
+        self.write_pending = asyncio.Event()
+        self.write_batch_full = asyncio.Event()
+        self.max_write_delay = max_write_delay
+
+        self.closed = False
+
+        # Event loop time of the last frame read or written, for finding idle connections
+        self.last_activity = asyncio.get_event_loop().time()
+
+        # Traffic counters of the peer, or None
+        self.traffic = metrics.peer_stats(peer_id) if metrics is not None else None
+
+        # Kick off reading and writing
+        self.reader_task = asyncio.ensure_future(self.handle_incoming())
+        self.writer_task = asyncio.ensure_future(self.handle_outgoing())
 
     def close(self):
         """
         close the stream muxer and underlying raw connection
         """
+        if self.closed:
+            return
+        self.closed = True
+        # Either task may be the one closing the muxer, after which it finishes
+        # on its own
+        current_task = asyncio.current_task()
+        for task in (self.reader_task, self.writer_task):
+            if task is not current_task:
+                task.cancel()
+
+        # Fail every write still waiting to be flushed
+        pending = list(self.write_flushing)
+        for queue in self.write_queues.values():
+            pending.extend(frame[2] for frame in queue)
+        for flushed in pending:
+            if flushed is not None and not flushed.done():
+                flushed.set_exception(ConnectionResetError("mplex connection closed"))
+        self.write_queues.clear()
+        self.write_queue_sizes.clear()
+        self.active_streams.clear()
+        self.write_flushing = []
+        self.write_queue_size = 0
+
+        # Wake up readers of every stream still open
+        for stream in self.streams.values():
+            stream.local_closed = True
+            stream.remote_closed = True
+            stream.buffer.set_exception(MplexStreamReset("mplex connection closed"))
+            if stream.resource_scope is not None:
+                stream.resource_scope.close()
+        self.streams.clear()
+        if self.resource_scope is not None:
+            self.resource_scope.close()
+
         self.raw_conn.close()
 
     def is_closed(self):
@@ -50,6 +143,7 @@ class Mplex(IMuxedConn):
         check connection is fully closed
         :return: true if successful
         """
+        return self.closed
 
     async def read_buffer(self, stream_id):
         """
@@ -57,14 +151,8 @@ class Mplex(IMuxedConn):
         :param stream_id: stream id of stream to read from
         :return: message read
         """
-        # TODO: propagate up timeout exception and catch
-        # TODO: pass down timeout from user and use that
-        if stream_id in self.buffers:
-            try:
-                data = await asyncio.wait_for(self.buffers[stream_id].get(), timeout=8)
-                return data
-            except asyncio.TimeoutError:
-                return None
+        if stream_id in self.streams:
+            return await self.streams[stream_id].read()
 
         # Stream not created yet
         return None
@@ -75,11 +163,18 @@ class Mplex(IMuxedConn):
         :param protocol_id: protocol_id of stream
         :param multi_addr: multi_addr that stream connects to
         :return: a new stream
+        :raise ResourceLimitExceeded: no more streams are allowed
         """
+        scope = self.open_stream_scope()
         stream_id = self.raw_conn.next_stream_id()
-        stream = MplexStream(stream_id, multi_addr, self)
-        self.buffers[stream_id] = asyncio.Queue()
-        await self.send_message(get_flag(self.initiator, "NEW_STREAM"), None, stream_id)
+        stream = MplexStream(stream_id, True, self, scope)
+        self.streams[stream_id] = stream
+        try:
+            await self.send_message(get_flag(self.initiator, "NEW_STREAM"), None, stream_id)
+        except Exception:
+            # e.g. the connection is closed, the stream never existed
+            self.remove_stream(stream_id)
+            raise
         return stream
 
     async def accept_stream(self):
@@ -87,82 +182,279 @@ class Mplex(IMuxedConn):
         accepts a muxed stream opened by the other end
         :return: the accepted stream
         """
-        stream_id = await self.stream_queue.get()
-        stream = MplexStream(stream_id, False, self)
+        stream_id, scope = await self.stream_queue.get()
+        stream = MplexStream(stream_id, False, self, scope)
+        self.streams[stream_id] = stream
         asyncio.ensure_future(self.generic_protocol_handler(stream))
+        return stream
+
+    def remove_stream(self, stream_id):
+        """
+        forget a stream that is closed at both ends or reset
+        :param stream_id: stream id of stream to remove
+        """
+        stream = self.streams.pop(stream_id, None)
+        if stream is not None and stream.resource_scope is not None:
+            stream.resource_scope.close()
+        # A queue still holding frames is dropped once they are written
+        if not self.write_queues.get(stream_id, True):
+            del self.write_queues[stream_id]
+            del self.write_queue_sizes[stream_id]
+            self.write_deficits.pop(stream_id, None)
+
+    def open_stream_scope(self):
+        """
+        :return: ResourceScope of a new stream, or None without resource manager
+        :raise ResourceLimitExceeded: no more streams are allowed
+        """
+        if self.resource_scope is None:
+            return None
+        return self.resource_manager.open_stream(self.resource_scope)
 
     async def send_message(self, flag, data, stream_id):
         """
-        sends a message over the connection
+        sends a message over the connection. data may be bytes, bytearray or
+        memoryview and is queued as is next to its header instead of being
+        copied into a new frame. Since bytearrays and memoryviews may be
+        modified once this returns, only their messages wait to be written
         :param header: header to use
         :param data: data to send in the message
         :param stream_id: stream the message is in
         :return: True if success
         """
-        # << by 3, then or with flag
-        header = (stream_id << 3) | flag
-        header = encode_uvarint(header)
+        return await self.write_frames(stream_id, encode_message(flag, data, stream_id),
+                                       wait_flushed=not isinstance(data, (bytes, type(None))))
+
+    def queue_frames(self, stream_id, frames, flushed=None):
+        """
+        queues frames to be written to the raw connection after the frames
+        already queued for the same stream, without waiting for them to be written
+        :param stream_id: stream the frames are in
+        :param frames: list of frames, each a tuple of byte arrays or memoryviews
+        :param flushed: optional future resolved once the last frame is written
+        :return: length queued
+        """
+        if self.closed:
+            raise ConnectionResetError("mplex connection closed")
 
-        if data is None:
-            data_length = encode_uvarint(0)
-            _bytes = header + data_length
-        else:
-            data_length = encode_uvarint(len(data))
-            _bytes = header + data_length + data
+        queue = self.write_queues.get(stream_id)
+        if queue is None:
+            queue = self.write_queues[stream_id] = deque()
+            self.write_queue_sizes[stream_id] = 0
+        if not queue:
+            self.active_streams.append(stream_id)
 
-        return await self.write_to_stream(_bytes)
+        length = 0
+        for frame in frames:
+            size = sum(map(len, frame))
+            queue.append([frame, size, None])
+            length += size
+        if flushed is not None:
+            queue[-1][2] = flushed
+        self.write_queue_sizes[stream_id] += length
+        self.write_queue_size += length
 
-    async def write_to_stream(self, _bytes):
+        if self.traffic is not None:
+            self.traffic.frames_out += len(frames)
+            self.traffic.bytes_out += length
+
+        self.write_pending.set()
+        if self.write_queue_size >= WRITE_BATCH_SIZE:
+            self.write_batch_full.set()
+
+        return length
+
+    async def write_frames(self, stream_id, frames, wait_flushed=False):
         """
-        writes a byte array to a raw connection
-        :param _bytes: byte array to write
+        queues frames to be written to the raw connection. Like a socket
+        write, this only waits once more than WRITE_STREAM_HIGH_WATER bytes
+        are queued for the stream, unless told to wait for the frames to be
+        written. The scheduler writes them in turn with the frames of other
+        streams, so a stream with a backlog holds back its own writer only
+        :param stream_id: stream the frames are in
+        :param frames: list of frames, each a tuple of byte arrays or memoryviews
+        :param wait_flushed: wait until the frames are written, for buffers
+        that must not be modified before then
         :return: length written
+        :raise ConnectionResetError: the connection is closed
         """
-        self.raw_conn.writer.write(_bytes)
-        await self.raw_conn.writer.drain()
-        return len(_bytes)
+        queued = self.write_queue_sizes.get(stream_id, 0)
+        if not wait_flushed and queued <= WRITE_STREAM_HIGH_WATER:
+            return self.queue_frames(stream_id, frames)
 
-    async def handle_incoming(self):
+        flushed = asyncio.get_event_loop().create_future()
+        length = self.queue_frames(stream_id, frames, flushed)
+        await flushed
+        return length
+
+    def next_batch(self):
         """
-        Read a message off of the raw connection and add it to the corresponding message buffer
+        Take the next batch of frames to write off the stream queues by
+        deficit round-robin. Each visit lets a stream send WRITE_QUANTUM bytes
+        times its priority, so a stream with a backlog of large frames cannot
+        hold back the small frames of other streams by more than a round
+        :return: buffers to write, futures to resolve once they are written
         """
-        # TODO Deal with other types of messages using flag (currently _)
+        buffers = []
+        flushed = []
+        size = 0
+        while self.active_streams and size < WRITE_BATCH_SIZE:
+            stream_id = self.active_streams[0]
+            queue = self.write_queues[stream_id]
+            stream = self.streams.get(stream_id)
+            priority = stream.priority if stream is not None else 1
+            deficit = self.write_deficits.get(stream_id, 0) + WRITE_QUANTUM * priority
+
+            taken = 0
+            while queue and queue[0][1] <= deficit:
+                frame, frame_size, frame_flushed = queue.popleft()
+                buffers.extend(frame)
+                if frame_flushed is not None:
+                    flushed.append(frame_flushed)
+                deficit -= frame_size
+                taken += frame_size
+            self.write_queue_sizes[stream_id] -= taken
+            size += taken
 
+            if queue:
+                # Keep the unused deficit for the next round
+                self.write_deficits[stream_id] = deficit
+                self.active_streams.rotate(-1)
+            else:
+                # Idle streams do not save up deficit
+                self.active_streams.popleft()
+                self.write_deficits.pop(stream_id, None)
+                if stream is None:
+                    del self.write_queues[stream_id]
+                    del self.write_queue_sizes[stream_id]
+
+        self.write_queue_size -= size
+        return buffers, flushed
+
+    async def handle_outgoing(self):
+        """
+        Write queued frames to the raw connection. Frames queued while a batch
+        is being collected or drained go out together in one writelines call,
+        so they share a single drain. Batches are filled fairly across streams
+        """
+        writer = self.raw_conn.writer
         while True:
-            stream_id, flag, message = await self.read_message()
+            await self.write_pending.wait()
 
-            if stream_id is not None and flag is not None and message is not None:
-                if stream_id not in self.buffers:
-                    self.buffers[stream_id] = asyncio.Queue()
-                    await self.stream_queue.put(stream_id)
+            if self.max_write_delay:
+                try:
+                    await asyncio.wait_for(self.write_batch_full.wait(), self.max_write_delay)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Let the other tasks running in this iteration queue their frames
+                await asyncio.sleep(0)
 
-                if flag is get_flag(True, "NEW_STREAM"):
-                    # new stream detected on connection
-                    await self.accept_stream()
+            buffers, self.write_flushing = self.next_batch()
+            self.last_activity = asyncio.get_event_loop().time()
+            if not self.active_streams:
+                self.write_pending.clear()
+            if self.write_queue_size < WRITE_BATCH_SIZE:
+                self.write_batch_full.clear()
 
-                if message:
-                    await self.buffers[stream_id].put(message)
+            try:
+                writer.writelines(buffers)
+                await writer.drain()
+            except ConnectionError as error:
+                for flushed in self.write_flushing:
+                    if not flushed.done():
+                        flushed.set_exception(error)
+                self.write_flushing = []
+                self.close()
+                return
+            for flushed in self.write_flushing:
+                if not flushed.done():
+                    flushed.set_result(None)
+            self.write_flushing = []
 
-            # Force context switch
-            await asyncio.sleep(0)
+    async def handle_incoming(self):
+        """
+        Read chunks off of the raw connection until the peer hangs up or the
+        muxer is closed, adding each decoded message to the corresponding
+        message buffer. The read blocks until data arrives, so an idle
+        connection costs nothing
+        """
+        reader = self.raw_conn.reader
+        traffic = self.traffic
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK_SIZE)
+                if not data:
+                    # Peer hung up
+                    break
+                self.last_activity = asyncio.get_event_loop().time()
+                if traffic is not None:
+                    traffic.bytes_in += len(data)
 
-    async def read_message(self):
+                for stream_id, flag, message in self.frame_decoder.feed(data):
+                    if traffic is not None:
+                        traffic.frames_in += 1
+                    await self.handle_message(stream_id, flag, message)
+        except (ConnectionError, MplexFrameError):
+            pass
+        finally:
+            self.close()
+
+    async def handle_message(self, stream_id, flag, message):
         """
-        Read a single message off of the raw connection
-        :return: stream_id, flag, message contents
+        Dispatch a single decoded message to its stream
+        :param stream_id: stream the message is in
+        :param flag: flag of the message
+        :param message: message contents
         """
+        tag = get_tag(flag)
 
-        # Timeout is set to a relatively small value to alleviate wait time to exit
-        #  loop in handle_incoming
-        timeout = 0.1
-        try:
-            header = await decode_uvarint_from_stream(self.raw_conn.reader, timeout)
-            length = await decode_uvarint_from_stream(self.raw_conn.reader, timeout)
-            message = await asyncio.wait_for(self.raw_conn.reader.read(length), timeout=timeout)
-        except asyncio.TimeoutError:
-            return None, None, None
+        if tag == HEADER_TAGS["NEW_STREAM"]:
+            if stream_id not in self.streams:
+                # new stream detected on connection
+                try:
+                    scope = self.open_stream_scope()
+                except ResourceLimitExceeded:
+                    # Refuse the stream instead of starting a handler for it
+                    self.queue_frames(
+                        stream_id, encode_message(get_flag(False, "RESET"), None, stream_id))
+                    return
+                await self.stream_queue.put((stream_id, scope))
+                await self.accept_stream()
+            return
 
-        flag = header & 0x07
-        stream_id = header >> 3
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            # Stream was already removed, or never opened
+            return
 
-        return stream_id, flag, message
+        if tag == HEADER_TAGS["MESSAGE"]:
+            if message and not stream.remote_closed and not stream.buffer.put(message):
+                # The reader of this stream is not keeping up with the sender. Mplex
+                # cannot ask the sender to slow down, and waiting for the reader
+                # would stall every other stream, so reset the stream instead. The
+                # same goes for a stream whose data exceeds its resource limits
+                self.reset_stream(stream, "stream receive window exceeded")
+                self.queue_frames(
+                    stream_id, encode_message(get_flag(stream.initiator, "RESET"), None, stream_id))
+
+        elif tag == HEADER_TAGS["CLOSE"]:
+            stream.remote_closed = True
+            stream.buffer.feed_eof()
+            if stream.local_closed:
+                self.remove_stream(stream_id)
+
+        elif tag == HEADER_TAGS["RESET"]:
+            self.reset_stream(stream, "stream reset by peer")
+
+    def reset_stream(self, stream, reason):
+        """
+        close both ends of a stream without telling the peer, make its
+        reader fail and forget it
+        :param stream: stream to reset
+        :param reason: message of the exception raised to the reader
+        """
+        stream.local_closed = True
+        stream.remote_closed = True
+        stream.buffer.set_exception(MplexStreamReset(reason))
+        self.remove_stream(stream.stream_id)
@@ -1,7 +1,8 @@
 import asyncio
 
 from .utils import get_flag
-from ..muxed_stream_interface import IMuxedStream
+from ..muxed_stream_interface import IMuxedStream, MuxedStreamError
+from ..stream_buffer import StreamBuffer
 
 
 class MplexStream(IMuxedStream):
@@ -10,36 +11,82 @@ class MplexStream(IMuxedStream):
     reference: https://github.com/libp2p/go-mplex/blob/master/stream.go
     """
 
-    def __init__(self, stream_id, initiator, mplex_conn):
+    def __init__(self, stream_id, initiator, mplex_conn, resource_scope=None):
         """
         create new MuxedStream in muxer
         :param stream_id: stream stream id
         :param initiator: boolean if this is an initiator
         :param mplex_conn: muxed connection of this muxed_stream
+        :param resource_scope: optional ResourceScope of the stream, closed
+        once the stream is removed
         """
         self.stream_id = stream_id
         self.initiator = initiator
         self.mplex_conn = mplex_conn
+        # Name shared by the streams of every muxer
+        self.muxed_conn = mplex_conn
         self.read_deadline = None
         self.write_deadline = None
         self.local_closed = False
         self.remote_closed = False
-        self.stream_lock = asyncio.Lock()
 
-    async def read(self):
+        # Share of the connection's outbound bandwidth relative to other streams
+        self.priority = 1
+
+        # Messages received on this stream
+        self.resource_scope = resource_scope
+        self.buffer = StreamBuffer(mplex_conn.stream_window_size, resource_scope)
+
+    async def read(self, n=None):
+        """
+        read data received on the stream, waiting at most read_deadline seconds
+        :param n: maximum number of bytes to read. If None, the next message
+        written by the remote end is read whole
+        :return: bytes of input, b"" once the remote end has closed the stream
+        :raise MplexStreamReset: the stream has been reset
+        :raise asyncio.TimeoutError: read deadline exceeded
+        """
+        if n is None:
+            data = await asyncio.wait_for(self.buffer.get(), self.read_deadline)
+            return bytes(data)
+        return await asyncio.wait_for(self.buffer.read(n), self.read_deadline)
+
+    async def readexactly(self, n):
         """
-        read messages associated with stream from buffer til end of file
-        :return: bytes of input
+        read exactly n bytes, joining as many messages as needed
+        :param n: number of bytes to read
+        :return: n bytes of input
+        :raise asyncio.IncompleteReadError: the remote end closed the stream first
+        :raise MplexStreamReset: the stream has been reset
+        :raise asyncio.TimeoutError: read deadline exceeded
         """
-        return await self.mplex_conn.read_buffer(self.stream_id)
+        return await asyncio.wait_for(self.buffer.readexactly(n), self.read_deadline)
+
+    async def readuntil(self, separator=b"\n"):
+        """
+        read data up to and including separator
+        :param separator: bytes ending the data to read
+        :return: bytes of input ending with separator
+        :raise asyncio.IncompleteReadError: the remote end closed the stream first
+        :raise asyncio.LimitOverrunError: separator not found within the stream window
+        :raise MplexStreamReset: the stream has been reset
+        :raise asyncio.TimeoutError: read deadline exceeded
+        """
+        return await asyncio.wait_for(self.buffer.readuntil(separator), self.read_deadline)
 
     async def write(self, data):
         """
-        write to stream
+        write to stream, waiting at most write_deadline seconds for the data
+        to be flushed
         :return: number of bytes written
+        :raise MplexStreamClosed: the stream has been closed for writing
+        :raise asyncio.TimeoutError: write deadline exceeded
         """
-        return await self.mplex_conn.send_message(
-            get_flag(self.initiator, "MESSAGE"), data, self.stream_id)
+        if self.local_closed:
+            raise MplexStreamClosed("cannot write to closed stream %d" % self.stream_id)
+        flag = get_flag(self.initiator, "MESSAGE")
+        return await asyncio.wait_for(
+            self.mplex_conn.send_message(flag, data, self.stream_id), self.write_deadline)
 
     async def close(self):
         """
@@ -47,20 +94,17 @@ class MplexStream(IMuxedStream):
         but allows writing in the other direction.
         :return: true if successful
         """
-        # TODO error handling with timeout
-        # TODO understand better how mutexes are used from go repo
-        await self.mplex_conn.send_message(get_flag(self.initiator, "CLOSE"), None, self.stream_id)
+        if self.local_closed:
+            return True
+        self.local_closed = True
 
-        remote_lock = ""
-        async with self.stream_lock:
-            if self.local_closed:
-                return True
-            self.local_closed = True
-            remote_lock = self.remote_closed
+        if not self.mplex_conn.is_closed():
+            await self.mplex_conn.send_message(
+                get_flag(self.initiator, "CLOSE"), None, self.stream_id)
 
-        if remote_lock:
-            async with self.mplex_conn.conn_lock:
-                self.mplex_conn.buffers.pop(self.stream_id)
+        # Stream state is only kept until both ends are closed
+        if self.remote_closed:
+            self.mplex_conn.remove_stream(self.stream_id)
 
         return True
 
@@ -70,28 +114,21 @@ class MplexStream(IMuxedStream):
         tells this remote side to hang up
         :return: true if successful
         """
-        # TODO understand better how mutexes are used here
-        # TODO understand the difference between close and reset
-        async with self.stream_lock:
-            if self.remote_closed and self.local_closed:
-                return True
+        if self.local_closed and self.remote_closed:
+            return True
 
-            if not self.remote_closed:
-                await self.mplex_conn.send_message(
-                    get_flag(self.initiator, "RESET"), None, self.stream_id)
+        self.mplex_conn.reset_stream(self, "stream %d was reset" % self.stream_id)
 
-            self.local_closed = True
-            self.remote_closed = True
-
-        async with self.mplex_conn.conn_lock:
-            self.mplex_conn.buffers.pop(self.stream_id, None)
+        if not self.mplex_conn.is_closed():
+            await self.mplex_conn.send_message(
+                get_flag(self.initiator, "RESET"), None, self.stream_id)
 
         return True
 
-    # TODO deadline not in use
     def set_deadline(self, ttl):
         """
         set deadline for muxed stream
+        :param ttl: seconds each following read and write may take, or None
         :return: True if successful
         """
         self.read_deadline = ttl
@@ -101,6 +138,7 @@ class MplexStream(IMuxedStream):
     def set_read_deadline(self, ttl):
         """
         set read deadline for muxed stream
+        :param ttl: seconds each following read may take, or None
         :return: True if successful
         """
         self.read_deadline = ttl
@@ -109,7 +147,35 @@ class MplexStream(IMuxedStream):
     def set_write_deadline(self, ttl):
         """
         set write deadline for muxed stream
+        :param ttl: seconds each following write may take, or None
         :return: True if successful
         """
         self.write_deadline = ttl
         return True
+
+    def set_priority(self, priority):
+        """
+        set the outbound priority of the stream. While several streams have
+        data queued, each gets a share of the connection proportional to its
+        priority. Streams start with priority 1
+        :param priority: positive weight, e.g. 4 to send control messages
+        ahead of bulk transfers
+        :return: True if successful
+        :raise ValueError: priority is not positive
+        """
+        if priority <= 0:
+            raise ValueError("stream priority must be positive, got %r" % priority)
+        self.priority = priority
+        return True
+
+
+class MplexStreamError(MuxedStreamError):
+    """Base class for errors raised by a mplex stream"""
+
+
+class MplexStreamReset(MplexStreamError):
+    """Raised when reading from a stream that has been reset"""
+
+
+class MplexStreamClosed(MplexStreamError):
+    """Raised when writing to a stream that has been closed"""
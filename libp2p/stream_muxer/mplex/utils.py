@@ -1,48 +1,7 @@
-import asyncio
-import struct
-from .constants import HEADER_TAGS
+from libp2p.utils import encode_uvarint
+from .constants import HEADER_TAGS, MAX_MESSAGE_SIZE
 
 
-def encode_uvarint(number):
-    """Pack `number` into varint bytes"""
-    buf = b''
-    while True:
-        towrite = number & 0x7f
-        number >>= 7
-        if number:
-            buf += bytes((towrite | 0x80, ))
-        else:
-            buf += bytes((towrite, ))
-            break
-    return buf
-
-
-def decode_uvarint(buff, index):
-    shift = 0
-    result = 0
-    while True:
-        i = buff[index]
-        result |= (i & 0x7f) << shift
-        shift += 7
-        if not i & 0x80:
-            break
-        index += 1
-
-    return result, index + 1
-
-async def decode_uvarint_from_stream(reader, timeout):
-    shift = 0
-    result = 0
-    while True:
-        byte = await asyncio.wait_for(reader.read(1), timeout=timeout)
-        i = struct.unpack('>H', b'\x00' + byte)[0]
-        result |= (i & 0x7f) << shift
-        shift += 7
-        if not i & 0x80:
-            break
-
-    return result
-
 def get_flag(initiator, action):
     """
     get header flag based on action for mplex
@@ -53,3 +12,35 @@ def get_flag(initiator, action):
         return HEADER_TAGS[action]
 
     return HEADER_TAGS[action] - 1
+
+def get_tag(flag):
+    """
+    get the action tag of a received header flag, whichever end of the
+    stream sent it
+    :param flag: int flag
+    :return: int tag, one of the values of HEADER_TAGS
+    """
+    # Flags sent by the stream receiver are one less than the tag
+    return flag + (flag & 1)
+
+def encode_message(flag, data, stream_id):
+    """
+    encode a message into frames without copying its payload. Payloads larger
+    than MAX_MESSAGE_SIZE are split into several frames
+    :param flag: header flag of the message
+    :param data: bytes, bytearray or memoryview payload, or None
+    :param stream_id: stream the message is in
+    :return: list of frames, each a tuple of buffers to write in order
+    """
+    # << by 3, then or with flag
+    header = encode_uvarint((stream_id << 3) | flag)
+
+    if not data:
+        return [(header + b"\x00",)]
+
+    data = memoryview(data).cast("B")
+    frames = []
+    for start in range(0, len(data), MAX_MESSAGE_SIZE):
+        chunk = data[start:start + MAX_MESSAGE_SIZE]
+        frames.append((header + encode_uvarint(len(chunk)), chunk))
+    return frames
@@ -4,9 +4,24 @@ from abc import ABC, abstractmethod
 class IMuxedStream(ABC):
 
     @abstractmethod
-    def read(self):
+    def read(self, n=None):
         """
         reads from the underlying muxed_conn
+        :param n: maximum number of bytes to read, or None to read the next message
+        :return: bytes of input
+        """
+
+    @abstractmethod
+    def readexactly(self, n):
+        """
+        reads exactly n bytes from the underlying muxed_conn
+        :return: bytes of input
+        """
+
+    @abstractmethod
+    def readuntil(self, separator=b"\n"):
+        """
+        reads from the underlying muxed_conn up to and including separator
         :return: bytes of input
         """
 
@@ -38,3 +53,29 @@ class IMuxedStream(ABC):
         set deadline for muxed stream
         :return: a new stream
         """
+
+    @abstractmethod
+    def set_read_deadline(self, ttl):
+        """
+        set read deadline for muxed stream
+        :return: True if successful
+        """
+
+    @abstractmethod
+    def set_write_deadline(self, ttl):
+        """
+        set write deadline for muxed stream
+        :return: True if successful
+        """
+
+    @abstractmethod
+    def set_priority(self, priority):
+        """
+        set the outbound priority of the stream relative to the other streams
+        of its connection, where the muxer supports it
+        :return: True if successful
+        """
+
+
+class MuxedStreamError(Exception):
+    """Base class for errors raised by a muxed stream, whichever the muxer"""
@@ -0,0 +1,68 @@
+from libp2p.protocol_muxer.multiselect_client import MultiselectClient
+from libp2p.protocol_muxer.multiselect import Multiselect
+
+
+class MuxerMultistream:
+    """
+    Negotiates which stream muxer to run over a secured connection, and
+    creates the muxed connection
+
+    Relevant go repo: https://github.com/libp2p/go-stream-muxer-multistream
+    """
+
+    def __init__(self, muxer_options=None):
+        """
+        :param muxer_options: options passed to every muxed connection created
+        """
+        # Map protocol to muxer class, in order of preference
+        self.transports = {}
+        self.muxer_options = muxer_options or {}
+
+        # Create multiselect
+        self.multiselect = Multiselect()
+
+        # Create multiselect client
+        self.multiselect_client = MultiselectClient()
+
+    def add_transport(self, protocol, transport):
+        """
+        Add a stream muxer. Muxers added first are preferred when we are the
+        initiator
+        :param protocol: protocol id of the muxer, e.g. /mplex/6.7.0
+        :param transport: muxer class, called with the secured connection,
+        generic protocol handler, peer id and muxer_options
+        """
+        self.transports[protocol] = transport
+
+        # Note: None is added as the handler for the given protocol since
+        # we only care about selecting the protocol, not any handler function
+        self.multiselect.add_handler(protocol, None)
+
+    async def select_transport(self, conn):
+        """
+        Select a muxer that both us and the node on the other end of conn
+        support and agree on. The initiator proposes muxers in order of
+        preference, the other end accepts the first one it supports
+        :param conn: raw conn to choose a muxer over
+        :return: selected protocol, muxer class
+        :raise MultiselectClientError: no common muxer, when initiator
+        :raise MultiselectError: negotiation failed, when not initiator
+        """
+        if conn.initiator:
+            protocol = \
+                await self.multiselect_client.select_one_of(list(self.transports.keys()), conn)
+        else:
+            protocol, _ = await self.multiselect.negotiate(conn)
+        return protocol, self.transports[protocol]
+
+    async def new_conn(self, conn, generic_protocol_handler, peer_id):
+        """
+        Negotiate a muxer and create a muxed connection over conn
+        :param conn: secured connection
+        :param generic_protocol_handler: generic protocol handler
+        for new muxed streams
+        :param peer_id: peer_id of peer the connection is to
+        :return: muxed connection
+        """
+        _, transport = await self.select_transport(conn.get_conn())
+        return transport(conn, generic_protocol_handler, peer_id, **self.muxer_options)
@@ -0,0 +1,203 @@
+import asyncio
+import collections
+
+from libp2p.network.resource_manager import ResourceLimitExceeded
+
+
+class StreamBuffer:
+    """
+    Bounded buffer of data received for a single muxed stream. The muxer's
+    read loop puts data in without ever waiting, and the stream's reader
+    takes it out. Once the buffer holds max_size bytes, further data is
+    refused so the muxer can deal with the stream instead of buffering
+    without limit. Data is also refused once it does not fit in the memory
+    of the resource scope of the stream.
+    """
+
+    def __init__(self, max_size, scope=None):
+        """
+        :param max_size: maximum number of bytes held in the buffer
+        :param scope: optional ResourceScope the buffered bytes are reserved in
+        """
+        self.max_size = max_size
+        self.scope = scope
+        self.size = 0
+        self.chunks = collections.deque()
+        self.exception = None
+        self.eof = False
+        self._waiter = None
+
+    def put(self, data):
+        """
+        Append data to the buffer and wake up a waiting reader
+        :param data: data received for the stream
+        :return: False if data does not fit in the buffer, True otherwise
+        """
+        if self.size + len(data) > self.max_size:
+            return False
+        if self.scope is not None:
+            try:
+                self.scope.reserve_memory(len(data))
+            except ResourceLimitExceeded:
+                return False
+
+        self.chunks.append(data)
+        self.size += len(data)
+        self._wakeup()
+        return True
+
+    def feed_eof(self):
+        """
+        Signal that no more data will be put in the buffer
+        """
+        self.eof = True
+        self._wakeup()
+
+    def set_exception(self, exception):
+        """
+        Make pending and future reads raise exception once the buffered
+        data has been read
+        :param exception: exception to raise
+        """
+        self.exception = exception
+        self._wakeup()
+
+    def available(self):
+        """
+        :return: number of bytes that can still be put in the buffer
+        """
+        return self.max_size - self.size
+
+    async def get(self):
+        """
+        Wait for and remove the oldest chunk of data in the buffer
+        :return: chunk of data, or b"" once the buffer is drained after EOF
+        """
+        if not await self._wait_for_data(1):
+            return b""
+
+        data = self.chunks.popleft()
+        self.size -= len(data)
+        if self.scope is not None:
+            self.scope.release_memory(len(data))
+        return data
+
+    async def read(self, n):
+        """
+        Wait for data and remove up to n bytes from the buffer, joining
+        consecutive chunks if needed
+        :param n: maximum number of bytes to read
+        :return: between 1 and n bytes, or b"" once the buffer is drained after EOF
+        """
+        if n == 0 or not await self._wait_for_data(1):
+            return b""
+        return self._take(min(n, self.size))
+
+    async def readexactly(self, n):
+        """
+        Wait for and remove exactly n bytes from the buffer
+        :param n: number of bytes to read
+        :return: n bytes
+        :raise asyncio.IncompleteReadError: EOF was reached before n bytes
+        :raise asyncio.LimitOverrunError: n is larger than the buffer can hold
+        """
+        if n > self.max_size:
+            raise asyncio.LimitOverrunError("read of %d bytes exceeds buffer size" % n, 0)
+        if not await self._wait_for_data(n):
+            partial = self._take(self.size)
+            raise asyncio.IncompleteReadError(partial, n)
+        return self._take(n)
+
+    async def readuntil(self, separator=b"\n"):
+        """
+        Wait for and remove data from the buffer up to and including separator
+        :param separator: bytes to look for
+        :return: data ending with separator
+        :raise asyncio.IncompleteReadError: EOF was reached before separator
+        :raise asyncio.LimitOverrunError: buffer is full and holds no separator
+        :raise ValueError: separator is empty
+        """
+        if not separator:
+            raise ValueError("separator should be at least one byte long")
+
+        # Each chunk is searched once, as it arrives. The last bytes searched
+        # are kept to find a separator starting in one chunk and ending in
+        # the next
+        overlap = len(separator) - 1
+        searched = 0
+        offset = 0
+        tail = b""
+        while True:
+            while searched < len(self.chunks):
+                chunk = bytes(self.chunks[searched])
+                index = (tail + chunk[:overlap]).find(separator)
+                if index != -1:
+                    return self._take(offset - len(tail) + index + len(separator))
+                index = chunk.find(separator)
+                if index != -1:
+                    return self._take(offset + index + len(separator))
+                if overlap:
+                    tail = (tail + chunk[-overlap:])[-overlap:]
+                offset += len(chunk)
+                searched += 1
+
+            if self.size >= self.max_size:
+                raise asyncio.LimitOverrunError(
+                    "separator not found in %d buffered bytes" % self.size, self.size)
+            if not await self._wait_for_data(self.size + 1):
+                raise asyncio.IncompleteReadError(self._take(self.size), None)
+
+    def _take(self, n):
+        """
+        Remove the first n bytes from the buffer. Chunks consumed whole are
+        joined into the result, and the rest of a chunk consumed in part is
+        kept as a slice of it
+        :param n: number of bytes to remove, at most self.size
+        :return: n bytes
+        """
+        if not n:
+            return b""
+        chunks = self.chunks
+        self.size -= n
+        if self.scope is not None:
+            self.scope.release_memory(n)
+
+        if len(chunks[0]) == n:
+            return bytes(chunks.popleft())
+
+        taken = []
+        while n:
+            chunk = chunks[0]
+            if len(chunk) <= n:
+                taken.append(chunks.popleft())
+                n -= len(chunk)
+            else:
+                chunk = memoryview(chunk)
+                taken.append(chunk[:n])
+                chunks[0] = chunk[n:]
+                n = 0
+        return b"".join(taken)
+
+    async def _wait_for_data(self, n):
+        """
+        Wait until the buffer holds at least n bytes or no more data can arrive
+        :param n: number of bytes to wait for
+        :return: True if n bytes are buffered, False if EOF was reached first
+        :raise Exception: exception set on the buffer, unless n bytes are buffered
+        """
+        while self.size < n:
+            if self.exception is not None:
+                raise self.exception
+            if self.eof:
+                return False
+            self._waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return True
+
+    def _wakeup(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
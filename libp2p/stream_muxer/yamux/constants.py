@@ -0,0 +1,40 @@
+# Frame layout, see https://github.com/hashicorp/yamux/blob/master/spec.md
+YAMUX_VERSION = 0
+HEADER_SIZE = 12
+HEADER_FORMAT = ">BBHII"
+
+FRAME_TYPES = {
+    "DATA": 0,
+    "WINDOW_UPDATE": 1,
+    "PING": 2,
+    "GO_AWAY": 3
+}
+
+FLAGS = {
+    "SYN": 1,
+    "ACK": 2,
+    "FIN": 4,
+    "RST": 8
+}
+
+GO_AWAY_CODES = {
+    "NORMAL": 0,
+    "PROTOCOL_ERROR": 1,
+    "INTERNAL_ERROR": 2
+}
+
+# Window every stream starts with, which can only be grown by window updates
+INITIAL_WINDOW_SIZE = 256 * 1024
+
+# Receive window advertised for every stream unless configured otherwise
+DEFAULT_STREAM_WINDOW_SIZE = INITIAL_WINDOW_SIZE
+
+# Largest payload sent in a single data frame, same as go-yamux
+MAX_MESSAGE_SIZE = 64 * 1024
+
+# Number of bytes requested from the raw connection per read
+READ_CHUNK_SIZE = 64 * 1024
+
+# Seconds between keepalive pings, and how long to wait for their answer
+KEEPALIVE_INTERVAL = 30
+PING_TIMEOUT = 10
@@ -0,0 +1,92 @@
+import struct
+
+from .constants import HEADER_FORMAT, HEADER_SIZE, FRAME_TYPES, YAMUX_VERSION
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for yamux frames. Raw bytes read off the connection
+    in large chunks are fed in, and every complete frame found is returned
+    as a (frame_type, flags, stream_id, length, payload) tuple. Payloads of
+    data frames taking up at least half of the chunk they were read in are
+    memoryview slices of it, so large payloads are not copied. Shorter
+    payloads are copied, as a slice keeps the whole chunk alive for as long
+    as the payload is buffered. The payload of other frames is None.
+    """
+
+    def __init__(self, max_data_length):
+        """
+        :param max_data_length: largest payload accepted in a single data frame
+        """
+        self.max_data_length = max_data_length
+        self.header = struct.Struct(HEADER_FORMAT)
+
+        # Chunks holding the start of an incomplete frame, and how many bytes
+        # they must add up to before that frame can be decoded
+        self.pending = []
+        self.pending_size = 0
+        self.pending_needed = 0
+
+    def feed(self, data):
+        """
+        Decode all complete frames out of data and any incomplete frame left
+        over from previous calls
+        :param data: bytes read off the raw connection
+        :return: list of (frame_type, flags, stream_id, length, payload) tuples
+        :raise YamuxFrameError: frame has an unknown version or is too large
+        """
+        if self.pending:
+            self.pending.append(data)
+            self.pending_size += len(data)
+            if self.pending_size < self.pending_needed:
+                return []
+            data = b"".join(self.pending)
+            self.pending = []
+
+        view = memoryview(data)
+        frames = []
+        pos = 0
+        end = len(data)
+        needed = HEADER_SIZE
+        while end - pos >= HEADER_SIZE:
+            version, frame_type, flags, stream_id, length = self.header.unpack_from(data, pos)
+            if version != YAMUX_VERSION:
+                raise YamuxFrameError("unsupported yamux version %d" % version)
+
+            if frame_type != FRAME_TYPES["DATA"]:
+                frames.append((frame_type, flags, stream_id, length, None))
+                pos += HEADER_SIZE
+                continue
+
+            if length > self.max_data_length:
+                raise YamuxFrameError("data frame of %d bytes exceeds maximum of %d bytes"
+                                      % (length, self.max_data_length))
+            payload_end = pos + HEADER_SIZE + length
+            if payload_end > end:
+                needed = HEADER_SIZE + length
+                break
+
+            if 2 * length >= end:
+                payload = view[pos + HEADER_SIZE:payload_end]
+            else:
+                payload = bytes(view[pos + HEADER_SIZE:payload_end])
+            frames.append((frame_type, flags, stream_id, length, payload))
+            pos = payload_end
+
+        if pos < end:
+            self.pending.append(data[pos:])
+            self.pending_size = end - pos
+            self.pending_needed = needed
+
+        return frames
+
+
+def encode_header(frame_type, flags, stream_id, length):
+    """
+    :return: encoded 12 byte frame header
+    """
+    return struct.pack(HEADER_FORMAT, YAMUX_VERSION, frame_type, flags, stream_id, length)
+
+
+class YamuxFrameError(ValueError):
+    """Raised when a malformed frame is read off the connection"""
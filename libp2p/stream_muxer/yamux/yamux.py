@@ -0,0 +1,377 @@
+import asyncio
+import itertools
+
+from libp2p.network.resource_manager import ResourceLimitExceeded
+
+from .constants import FRAME_TYPES, FLAGS, GO_AWAY_CODES, INITIAL_WINDOW_SIZE, \
+    DEFAULT_STREAM_WINDOW_SIZE, READ_CHUNK_SIZE, KEEPALIVE_INTERVAL, PING_TIMEOUT
+from .frame_decoder import FrameDecoder, YamuxFrameError, encode_header
+from .yamux_stream import YamuxStream, YamuxStreamReset
+from ..muxed_connection_interface import IMuxedConn
+
+
+class Yamux(IMuxedConn):
+    # pylint: disable=too-many-instance-attributes
+    """
+    reference: https://github.com/hashicorp/yamux/blob/master/session.go
+    """
+
+    def __init__(self, secured_conn, generic_protocol_handler, peer_id,
+                 stream_window_size=DEFAULT_STREAM_WINDOW_SIZE,
+                 keepalive_interval=KEEPALIVE_INTERVAL, metrics=None, resource_manager=None):
+        # pylint: disable=too-many-arguments
+        """
+        create a new muxed connection
+        :param conn: an instance of secured connection
+        :param generic_protocol_handler: generic protocol handler
+        for new muxed streams
+        :param peer_id: peer_id of peer the connection is to
+        :param stream_window_size: receive window advertised for each stream.
+        Yamux streams always start with a 256 KiB window, so smaller values
+        are raised to that
+        :param keepalive_interval: seconds between keepalive pings, or None
+        to disable them
+        :param metrics: optional Metrics counting the traffic of the connection
+        under peer_id
+        :param resource_manager: optional ResourceManager the connection, its
+        streams and their buffered bytes are checked out of
+        :raise ResourceLimitExceeded: no more connections to peer_id are
+        allowed, the secured connection is closed
+        """
+        super(Yamux, self).__init__(secured_conn, generic_protocol_handler, peer_id)
+
+        self.secured_conn = secured_conn
+        self.raw_conn = secured_conn.get_conn()
+        self.initiator = self.raw_conn.initiator
+
+        self.resource_manager = resource_manager
+        self.resource_scope = None
+        if resource_manager is not None:
+            try:
+                self.resource_scope = resource_manager.open_connection(peer_id)
+            except ResourceLimitExceeded:
+                self.raw_conn.close()
+                raise
+
+        # Store generic protocol handler
+        self.generic_protocol_handler = generic_protocol_handler
+
+        # Set peer_id
+        self.peer_id = peer_id
+
+        # Mapping from stream ID -> stream, for streams that are not yet
+        # closed at both ends. The initiator uses odd stream IDs
+        self.streams = {}
+        self.next_stream_id = 1 if self.initiator else 2
+        self.initial_window_size = INITIAL_WINDOW_SIZE
+        self.stream_window_size = max(stream_window_size, INITIAL_WINDOW_SIZE)
+
+        self.stream_queue = asyncio.Queue()
+
+        # Decodes frames out of the chunks read off the raw connection
+        self.frame_decoder = FrameDecoder(self.stream_window_size)
+
+        # Pings waiting for their answer, by opaque value
+        self.pings = {}
+        self.ping_ids = itertools.count(1)
+
+        self.closed = False
+        self.local_go_away = False
+        self.remote_go_away = False
+
+        # Event loop time of the last frame read or queued, for finding idle connections
+        self.last_activity = asyncio.get_event_loop().time()
+
+        # Traffic counters of the peer, or None
+        self.traffic = metrics.peer_stats(peer_id) if metrics is not None else None
+
+        # Kick off reading and keepalive pings
+        self.reader_task = asyncio.ensure_future(self.handle_incoming())
+        self.keepalive_task = None
+        if keepalive_interval:
+            self.keepalive_task = asyncio.ensure_future(self.keepalive(keepalive_interval))
+
+    def close(self, code=GO_AWAY_CODES["NORMAL"]):
+        """
+        tell the peer we are going away, then close the stream muxer and
+        underlying raw connection
+        :param code: GO_AWAY code sent to the peer
+        """
+        if self.closed:
+            return
+        if not self.local_go_away:
+            self.local_go_away = True
+            self.queue_frame(FRAME_TYPES["GO_AWAY"], 0, 0, code)
+        self.closed = True
+
+        # Either task may be the one closing the muxer, after which it finishes
+        # on its own
+        current_task = asyncio.current_task()
+        for task in (self.reader_task, self.keepalive_task):
+            if task is not None and task is not current_task:
+                task.cancel()
+
+        for ping in self.pings.values():
+            if not ping.done():
+                ping.set_exception(ConnectionResetError("yamux connection closed"))
+        self.pings.clear()
+
+        # Wake up readers and writers of every stream still open
+        for stream in list(self.streams.values()):
+            self.reset_stream(stream, "yamux connection closed")
+
+        if self.resource_scope is not None:
+            self.resource_scope.close()
+
+        self.raw_conn.close()
+
+    def is_closed(self):
+        """
+        check connection is fully closed
+        :return: true if successful
+        """
+        return self.closed
+
+    async def open_stream(self, protocol_id, multi_addr):
+        """
+        creates a new muxed_stream
+        :param protocol_id: protocol_id of stream
+        :param multi_addr: multi_addr that stream connects to
+        :return: a new stream
+        :raise YamuxError: either end is going away
+        :raise ResourceLimitExceeded: no more streams are allowed
+        """
+        if self.closed or self.local_go_away or self.remote_go_away:
+            raise YamuxError("yamux connection is going away")
+
+        scope = self.open_stream_scope()
+        stream_id = self.next_stream_id
+        self.next_stream_id += 2
+        stream = YamuxStream(stream_id, True, self, scope)
+        self.streams[stream_id] = stream
+
+        # The SYN also advertises any window beyond the initial one
+        try:
+            await self.write_frame(FRAME_TYPES["WINDOW_UPDATE"], FLAGS["SYN"], stream_id,
+                                   self.stream_window_size - INITIAL_WINDOW_SIZE)
+        except Exception:
+            # e.g. the connection is closed, the stream never existed
+            self.remove_stream(stream_id)
+            raise
+        return stream
+
+    async def accept_stream(self):
+        """
+        accepts a muxed stream opened by the other end
+        :return: the accepted stream
+        """
+        stream_id = await self.stream_queue.get()
+        stream = self.streams.get(stream_id)
+        if stream is None or self.closed:
+            # Reset before it could be accepted
+            return None
+        self.queue_frame(FRAME_TYPES["WINDOW_UPDATE"], FLAGS["ACK"], stream_id,
+                         self.stream_window_size - INITIAL_WINDOW_SIZE)
+        asyncio.ensure_future(self.generic_protocol_handler(stream))
+        return stream
+
+    def remove_stream(self, stream_id):
+        """
+        forget a stream that is closed at both ends or reset
+        :param stream_id: stream id of stream to remove
+        """
+        stream = self.streams.pop(stream_id, None)
+        if stream is not None and stream.resource_scope is not None:
+            stream.resource_scope.close()
+
+    def open_stream_scope(self):
+        """
+        :return: ResourceScope of a new stream, or None without resource manager
+        :raise ResourceLimitExceeded: no more streams are allowed
+        """
+        if self.resource_scope is None:
+            return None
+        return self.resource_manager.open_stream(self.resource_scope)
+
+    def reset_stream(self, stream, reason):
+        """
+        close both ends of a stream without telling the peer, make its
+        reader and writer fail and forget it
+        :param stream: stream to reset
+        :param reason: message of the exception raised to the reader
+        """
+        stream.local_closed = True
+        stream.remote_closed = True
+        stream.buffer.set_exception(YamuxStreamReset(reason))
+        stream.send_window_updated.set()
+        self.remove_stream(stream.stream_id)
+
+    async def ping(self, timeout=PING_TIMEOUT):
+        """
+        measure the round trip time to the peer
+        :param timeout: seconds to wait for the answer
+        :return: round trip time in seconds
+        :raise asyncio.TimeoutError: no answer within timeout
+        """
+        opaque = next(self.ping_ids) & 0xffffffff
+        answer = asyncio.get_event_loop().create_future()
+        self.pings[opaque] = answer
+
+        start = asyncio.get_event_loop().time()
+        try:
+            self.queue_frame(FRAME_TYPES["PING"], FLAGS["SYN"], 0, opaque)
+            await asyncio.wait_for(answer, timeout)
+        finally:
+            self.pings.pop(opaque, None)
+        return asyncio.get_event_loop().time() - start
+
+    async def keepalive(self, interval):
+        """
+        Ping the peer every interval seconds and close the connection if it
+        stops answering
+        :param interval: seconds between pings
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.ping(min(interval, PING_TIMEOUT))
+            except (asyncio.TimeoutError, ConnectionError):
+                self.close(GO_AWAY_CODES["INTERNAL_ERROR"])
+                return
+
+    def queue_frame(self, frame_type, flags, stream_id, length, payload=None):
+        """
+        write a frame to the raw connection without waiting for it to drain
+        :param frame_type: one of FRAME_TYPES
+        :param flags: bitwise or of FLAGS
+        :param stream_id: stream the frame is in, 0 for the session
+        :param length: payload length of data frames, value carried otherwise
+        :param payload: payload of data frames
+        """
+        if self.closed:
+            raise ConnectionResetError("yamux connection closed")
+        self.last_activity = asyncio.get_event_loop().time()
+
+        header = encode_header(frame_type, flags, stream_id, length)
+        if self.traffic is not None:
+            self.traffic.frames_out += 1
+            self.traffic.bytes_out += len(header) + (len(payload) if payload is not None else 0)
+        if payload is None:
+            self.raw_conn.writer.write(header)
+        else:
+            self.raw_conn.writer.writelines((header, payload))
+
+    async def write_frame(self, frame_type, flags, stream_id, length, payload=None):
+        """
+        write a frame to the raw connection and wait for it to drain
+        :param frame_type: one of FRAME_TYPES
+        :param flags: bitwise or of FLAGS
+        :param stream_id: stream the frame is in, 0 for the session
+        :param length: payload length of data frames, value carried otherwise
+        :param payload: payload of data frames
+        """
+        self.queue_frame(frame_type, flags, stream_id, length, payload)
+        try:
+            await self.raw_conn.writer.drain()
+        except ConnectionError:
+            self.close(GO_AWAY_CODES["INTERNAL_ERROR"])
+            raise
+
+    async def handle_incoming(self):
+        """
+        Read chunks off of the raw connection until the peer hangs up or the
+        muxer is closed, handling each decoded frame
+        """
+        reader = self.raw_conn.reader
+        traffic = self.traffic
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK_SIZE)
+                if not data:
+                    # Peer hung up
+                    break
+                self.last_activity = asyncio.get_event_loop().time()
+                if traffic is not None:
+                    traffic.bytes_in += len(data)
+
+                for frame in self.frame_decoder.feed(data):
+                    if traffic is not None:
+                        traffic.frames_in += 1
+                    self.handle_frame(*frame)
+        except YamuxFrameError:
+            self.close(GO_AWAY_CODES["PROTOCOL_ERROR"])
+        except ConnectionError:
+            pass
+        finally:
+            self.close()
+
+    def handle_frame(self, frame_type, flags, stream_id, length, payload):
+        # pylint: disable=too-many-arguments,too-many-branches
+        """
+        Dispatch a single decoded frame
+        :param frame_type: one of FRAME_TYPES
+        :param flags: bitwise or of FLAGS
+        :param stream_id: stream the frame is in, 0 for the session
+        :param length: payload length of data frames, value carried otherwise
+        :param payload: payload of data frames
+        """
+        if frame_type == FRAME_TYPES["PING"]:
+            if flags & FLAGS["SYN"]:
+                self.queue_frame(FRAME_TYPES["PING"], FLAGS["ACK"], 0, length)
+            elif length in self.pings and not self.pings[length].done():
+                self.pings[length].set_result(None)
+            return
+
+        if frame_type == FRAME_TYPES["GO_AWAY"]:
+            # Streams already open keep working, no new ones are accepted
+            self.remote_go_away = True
+            return
+
+        if flags & FLAGS["SYN"]:
+            if stream_id in self.streams or self.local_go_away:
+                self.queue_frame(FRAME_TYPES["WINDOW_UPDATE"], FLAGS["RST"], stream_id, 0)
+                return
+            try:
+                scope = self.open_stream_scope()
+            except ResourceLimitExceeded:
+                # Refuse the stream instead of starting a handler for it
+                self.queue_frame(FRAME_TYPES["WINDOW_UPDATE"], FLAGS["RST"], stream_id, 0)
+                return
+            # new stream detected on connection. It is registered right away
+            # so the rest of this frame and the ones following it reach it
+            self.streams[stream_id] = YamuxStream(stream_id, False, self, scope)
+            self.stream_queue.put_nowait(stream_id)
+            asyncio.ensure_future(self.accept_stream())
+
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            # Stream was already removed, or never opened
+            return
+
+        if frame_type == FRAME_TYPES["WINDOW_UPDATE"]:
+            stream.send_window += length
+            stream.send_window_updated.set()
+        elif frame_type == FRAME_TYPES["DATA"] and payload:
+            if length > stream.recv_window:
+                # Peer ignored the window we gave it
+                self.close(GO_AWAY_CODES["PROTOCOL_ERROR"])
+                return
+            if not stream.buffer.put(payload):
+                # Data within the window that exceeds the resource limits of the stream
+                self.reset_stream(stream, "stream resource limit exceeded")
+                self.queue_frame(FRAME_TYPES["WINDOW_UPDATE"], FLAGS["RST"], stream_id, 0)
+                return
+            stream.recv_window -= length
+
+        if flags & FLAGS["FIN"]:
+            stream.remote_closed = True
+            stream.buffer.feed_eof()
+            if stream.local_closed:
+                self.remove_stream(stream_id)
+
+        if flags & FLAGS["RST"]:
+            self.reset_stream(stream, "stream reset by peer")
+
+
+class YamuxError(Exception):
+    """Raised when a yamux connection cannot be used"""
@@ -0,0 +1,214 @@
+import asyncio
+
+from .constants import FRAME_TYPES, FLAGS, MAX_MESSAGE_SIZE
+from ..muxed_stream_interface import IMuxedStream, MuxedStreamError
+from ..stream_buffer import StreamBuffer
+
+
+class YamuxStream(IMuxedStream):
+    # pylint: disable=too-many-instance-attributes
+    """
+    reference: https://github.com/hashicorp/yamux/blob/master/stream.go
+    """
+
+    def __init__(self, stream_id, initiator, yamux_conn, resource_scope=None):
+        """
+        create new MuxedStream in muxer
+        :param stream_id: stream stream id
+        :param initiator: boolean if this is an initiator
+        :param yamux_conn: muxed connection of this muxed_stream
+        :param resource_scope: optional ResourceScope of the stream, closed
+        once the stream is removed
+        """
+        self.stream_id = stream_id
+        self.initiator = initiator
+        self.muxed_conn = yamux_conn
+        self.read_deadline = None
+        self.write_deadline = None
+        self.local_closed = False
+        self.remote_closed = False
+
+        # Bytes the peer may still send us, bounded by the data we buffer
+        self.window_size = yamux_conn.stream_window_size
+        self.recv_window = self.window_size
+        self.resource_scope = resource_scope
+        self.buffer = StreamBuffer(self.window_size, resource_scope)
+
+        # Bytes we may still send, grown by the peer's window updates
+        self.send_window = yamux_conn.initial_window_size
+        self.send_window_updated = asyncio.Event()
+
+    async def read(self, n=None):
+        """
+        read data received on the stream, waiting at most read_deadline seconds
+        :param n: maximum number of bytes to read. If None, the next chunk of
+        data received is read whole
+        :return: bytes of input, b"" once the remote end has closed the stream
+        :raise YamuxStreamReset: the stream has been reset
+        :raise asyncio.TimeoutError: read deadline exceeded
+        """
+        if n is None:
+            data = bytes(await asyncio.wait_for(self.buffer.get(), self.read_deadline))
+        else:
+            data = await asyncio.wait_for(self.buffer.read(n), self.read_deadline)
+        self.update_recv_window()
+        return data
+
+    async def readexactly(self, n):
+        """
+        read exactly n bytes
+        :param n: number of bytes to read
+        :return: n bytes of input
+        :raise asyncio.IncompleteReadError: the remote end closed the stream first
+        :raise YamuxStreamReset: the stream has been reset
+        :raise asyncio.TimeoutError: read deadline exceeded
+        """
+        data = await asyncio.wait_for(self.buffer.readexactly(n), self.read_deadline)
+        self.update_recv_window()
+        return data
+
+    async def readuntil(self, separator=b"\n"):
+        """
+        read data up to and including separator
+        :param separator: bytes ending the data to read
+        :return: bytes of input ending with separator
+        :raise asyncio.IncompleteReadError: the remote end closed the stream first
+        :raise asyncio.LimitOverrunError: separator not found within the stream window
+        :raise YamuxStreamReset: the stream has been reset
+        :raise asyncio.TimeoutError: read deadline exceeded
+        """
+        data = await asyncio.wait_for(self.buffer.readuntil(separator), self.read_deadline)
+        self.update_recv_window()
+        return data
+
+    def update_recv_window(self):
+        """
+        Give the peer back the window consumed by reads, once at least half of
+        the window can be handed back at once
+        """
+        delta = self.window_size - self.buffer.size - self.recv_window
+        if delta < self.window_size // 2 or self.remote_closed:
+            return
+        self.recv_window += delta
+        self.muxed_conn.queue_frame(FRAME_TYPES["WINDOW_UPDATE"], 0, self.stream_id, delta)
+
+    async def write(self, data):
+        """
+        write to stream, waiting for the peer to grant window as needed and at
+        most write_deadline seconds overall
+        :return: number of bytes written
+        :raise YamuxStreamClosed: the stream has been closed for writing
+        :raise asyncio.TimeoutError: write deadline exceeded
+        """
+        return await asyncio.wait_for(self.write_data(data), self.write_deadline)
+
+    async def write_data(self, data):
+        """
+        split data into frames that fit the send window and write them
+        :return: number of bytes written
+        """
+        view = memoryview(data).cast("B")
+        offset = 0
+        while offset < len(view):
+            while self.send_window == 0 and not self.local_closed:
+                self.send_window_updated.clear()
+                await self.send_window_updated.wait()
+            if self.local_closed:
+                raise YamuxStreamClosed("cannot write to closed stream %d" % self.stream_id)
+
+            chunk = view[offset:offset + min(self.send_window, MAX_MESSAGE_SIZE)]
+            self.send_window -= len(chunk)
+            offset += len(chunk)
+            await self.muxed_conn.write_frame(
+                FRAME_TYPES["DATA"], 0, self.stream_id, len(chunk), chunk)
+        return offset
+
+    async def close(self):
+        """
+        Closing a stream closes it for writing and closes the remote end for reading
+        but allows writing in the other direction.
+        :return: true if successful
+        """
+        if self.local_closed:
+            return True
+        self.local_closed = True
+        self.send_window_updated.set()
+
+        if not self.muxed_conn.is_closed():
+            await self.muxed_conn.write_frame(
+                FRAME_TYPES["WINDOW_UPDATE"], FLAGS["FIN"], self.stream_id, 0)
+
+        # Stream state is only kept until both ends are closed
+        if self.remote_closed:
+            self.muxed_conn.remove_stream(self.stream_id)
+
+        return True
+
+    async def reset(self):
+        """
+        closes both ends of the stream
+        tells this remote side to hang up
+        :return: true if successful
+        """
+        if self.local_closed and self.remote_closed:
+            return True
+
+        self.muxed_conn.reset_stream(self, "stream %d was reset" % self.stream_id)
+
+        if not self.muxed_conn.is_closed():
+            await self.muxed_conn.write_frame(
+                FRAME_TYPES["WINDOW_UPDATE"], FLAGS["RST"], self.stream_id, 0)
+
+        return True
+
+    def set_deadline(self, ttl):
+        """
+        set deadline for muxed stream
+        :param ttl: seconds each following read and write may take, or None
+        :return: True if successful
+        """
+        self.read_deadline = ttl
+        self.write_deadline = ttl
+        return True
+
+    def set_read_deadline(self, ttl):
+        """
+        set read deadline for muxed stream
+        :param ttl: seconds each following read may take, or None
+        :return: True if successful
+        """
+        self.read_deadline = ttl
+        return True
+
+    def set_write_deadline(self, ttl):
+        """
+        set write deadline for muxed stream
+        :param ttl: seconds each following write may take, or None
+        :return: True if successful
+        """
+        self.write_deadline = ttl
+        return True
+
+    def set_priority(self, priority):
+        """
+        yamux writes the frames of every stream in order, so the priority of
+        a stream has no effect
+        :param priority: positive weight
+        :return: True if successful
+        :raise ValueError: priority is not positive
+        """
+        if priority <= 0:
+            raise ValueError("stream priority must be positive, got %r" % priority)
+        return True
+
+
+class YamuxStreamError(MuxedStreamError):
+    """Base class for errors raised by a yamux stream"""
+
+
+class YamuxStreamReset(YamuxStreamError):
+    """Raised when reading from a stream that has been reset"""
+
+
+class YamuxStreamClosed(YamuxStreamError):
+    """Raised when writing to a stream that has been closed"""
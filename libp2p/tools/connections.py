@@ -0,0 +1,45 @@
+import asyncio
+
+from libp2p.network.connection.raw_connection import RawConnection
+from libp2p.security.insecure_security import InsecureConn
+from libp2p.stream_muxer.mplex.mplex import Mplex
+
+
+async def create_raw_conn_pair():
+    """
+    Connect two raw connections to each other over loopback TCP
+    :return: (initiator raw connection, receiver raw connection)
+    """
+    accepted = asyncio.Future()
+
+    async def handler(reader, writer):
+        accepted.set_result((reader, writer))
+
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    conn_a = RawConnection("127.0.0.1", port, reader, writer, True)
+    reader, writer = await accepted
+    conn_b = RawConnection("127.0.0.1", port, reader, writer, False)
+
+    server.close()
+    return conn_a, conn_b
+
+
+async def create_muxer_pair(muxer_class=Mplex, handler_b=None, handler_a=None, **kwargs):
+    """
+    Create two muxed connections talking to each other over loopback TCP
+    :param muxer_class: stream muxer to use on both ends
+    :param handler_b: generic protocol handler for streams accepted by the receiver
+    :param handler_a: generic protocol handler for streams accepted by the initiator
+    :param kwargs: options passed to both muxer constructors
+    :return: (initiator muxed conn, receiver muxed conn)
+    """
+    async def ignore(_stream):
+        pass
+
+    conn_a, conn_b = await create_raw_conn_pair()
+    muxer_a = muxer_class(InsecureConn(conn_a, "insecure"), handler_a or ignore, "b", **kwargs)
+    muxer_b = muxer_class(InsecureConn(conn_b, "insecure"), handler_b or ignore, "a", **kwargs)
+    return muxer_a, muxer_b
@@ -0,0 +1,389 @@
+import asyncio
+from collections import deque
+import ipaddress
+
+import multiaddr
+
+from libp2p.network.connection.raw_connection import RawConnection
+from libp2p.peer.id import id_b58_encode
+
+from ..listener_interface import IListener
+from ..transport_interface import ITransport
+
+# Multiaddr protocol of memory addresses. multiaddr cannot encode a memory
+# protocol, so memory addresses are IPv6 addresses of the discard prefix
+# 100::/64, which is never routed, as in go-libp2p's mocknet
+MEMORY_PROTOCOL = "ip6"
+MEMORY_PREFIX = ipaddress.IPv6Network("100::/64")
+
+# Bytes buffered at the receiving end of a pipe before writers have to wait
+HIGH_WATER = 64 * 1024
+
+
+class MemoryTransport(ITransport):
+    """
+    Transport connecting hosts of the same process through in-memory pipes
+    instead of sockets. Listening on /ip6/100:: takes the next free memory
+    address, e.g. /ip6/100::1, like listening on tcp port 0 does.
+
+    Connections dialed can be shaped with a one-way latency and a bandwidth
+    in each direction, to simulate networks of many hosts in one process.
+    It is not installed by default, add it to a swarm with
+    swarm.add_transport(MEMORY_PROTOCOL, MemoryTransport())
+    """
+
+    def __init__(self, network=None, latency=0, bandwidth=None):
+        """
+        :param network: MemoryNetwork the transport listens and dials on,
+        the one shared by the whole process by default
+        :param latency: seconds data written takes to reach the other end
+        of connections dialed
+        :param bandwidth: bytes per second each direction of connections
+        dialed carries, None for unlimited
+        """
+        self.network = network or DEFAULT_NETWORK
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    class Listener(IListener):
+
+        def __init__(self, network, handler_function=None):
+            self.network = network
+            self.multiaddrs = []
+            self.handler = handler_function
+
+        async def listen(self, multiaddr):
+            """
+            put listener in listening mode and wait for incoming connections
+            :param multiaddr: memory multiaddr to listen on, /ip6/100:: for any
+            :return: return True if successful
+            :raise OSError: multiaddr is in use or not a memory address
+            """
+            self.multiaddrs.append(self.network.bind(multiaddr.decapsulate('/p2p'), self))
+            return True
+
+        def accept(self, reader, writer):
+            """
+            handle a new connection, as a server socket does
+            :param reader: reading end of the connection
+            :param writer: writing end of the connection
+            """
+            asyncio.ensure_future(self.handler(reader, writer))
+
+        def get_addrs(self):
+            """
+            retrieve list of addresses the listener is listening on
+            :return: return list of addrs
+            """
+            return self.multiaddrs
+
+        def close(self, options=None):
+            """
+            close the listener such that no more connections
+            can be open on this transport instance
+            :param options: optional object potential with timeout
+            a timeout value in ms that fires and destroy all connections
+            :return: return True if successful
+            """
+            if not self.multiaddrs:
+                return False
+            for addr in self.multiaddrs:
+                self.network.unbind(addr)
+            self.multiaddrs = []
+            return True
+
+    def can_dial(self, multiaddr):
+        """
+        :param multiaddr: multiaddr of peer
+        :return: true for memory multiaddrs
+        """
+        return memory_address(multiaddr) is not None
+
+    async def dial(self, multiaddr, self_id, options=None):
+        """
+        dial a transport to peer listening on multiaddr
+        :param multiaddr: multiaddr of peer
+        :param self_id: peer_id of the dialer (to send to receiver)
+        :param options: optional object
+        :return: raw connection
+        :raise ConnectionRefusedError: nothing listens on multiaddr
+        """
+        reader, writer = self.network.connect(multiaddr, self.latency, self.bandwidth)
+        raw_conn = RawConnection(str(memory_address(multiaddr)), None, reader, writer, True)
+
+        # First: send our peer ID so receiver knows it
+        await raw_conn.write(id_b58_encode(self_id).encode())
+
+        # Await ack for peer id
+        expected_ack_str = "received peer id"
+        ack = (await raw_conn.read()).decode()
+
+        if ack != expected_ack_str:
+            raise Exception("Receiver did not receive peer id")
+
+        return raw_conn
+
+    def create_listener(self, handler_function, options=None):
+        """
+        create listener on transport
+        :param options: optional object with properties the listener must have
+        :param handler_function: a function called with the reader and writer
+        of every new connection, as by asyncio.start_server
+        :return: a listener object that implements listener_interface.py
+        """
+        return self.Listener(self.network, handler_function)
+
+
+class MemoryNetwork:
+    """
+    Memory addresses listened on, and the listeners behind them
+    """
+
+    def __init__(self):
+        # Mapping from IPv6Address -> listener
+        self.listeners = {}
+        self.next_address = MEMORY_PREFIX.network_address + 1
+
+    def bind(self, multiaddr, listener):
+        """
+        :param multiaddr: memory multiaddr to listen on, /ip6/100:: for any
+        :param listener: listener to give the connections to multiaddr to
+        :return: multiaddr listened on
+        :raise OSError: multiaddr is in use or not a memory address
+        """
+        address = memory_address(multiaddr)
+        if address is None:
+            raise OSError("not a memory address: %s" % multiaddr)
+        if address == MEMORY_PREFIX.network_address:
+            while self.next_address in self.listeners:
+                self.next_address += 1
+            address = self.next_address
+            self.next_address += 1
+        if address in self.listeners:
+            raise OSError("memory address in use: %s" % address)
+
+        self.listeners[address] = listener
+        return multiaddr_from_address(address)
+
+    def unbind(self, multiaddr):
+        """
+        :param multiaddr: memory multiaddr no longer listened on
+        """
+        self.listeners.pop(memory_address(multiaddr), None)
+
+    def connect(self, multiaddr, latency=0, bandwidth=None):
+        """
+        Connect to the listener of multiaddr
+        :param multiaddr: memory multiaddr to connect to
+        :param latency: seconds data takes to reach the other end
+        :param bandwidth: bytes per second carried each way, None for unlimited
+        :return: reader and writer of the dialing end
+        :raise ConnectionRefusedError: nothing listens on multiaddr
+        """
+        listener = self.listeners.get(memory_address(multiaddr))
+        if listener is None:
+            raise ConnectionRefusedError("nothing listens on %s" % multiaddr)
+
+        (dialer_reader, dialer_writer), (listener_reader, listener_writer) = \
+            create_pipe(latency, bandwidth)
+        listener.accept(listener_reader, listener_writer)
+        return dialer_reader, dialer_writer
+
+
+def create_pipe(latency=0, bandwidth=None):
+    """
+    Create the two ends of an in-memory connection
+    :param latency: seconds data takes to reach the other end
+    :param bandwidth: bytes per second carried each way, None for unlimited
+    :return: (reader, writer) of one end, (reader, writer) of the other end
+    """
+    reader_a = asyncio.StreamReader(limit=HIGH_WATER)
+    reader_b = asyncio.StreamReader(limit=HIGH_WATER)
+    writer_a = MemoryWriter(reader_b, reader_a, latency, bandwidth)
+    writer_b = MemoryWriter(reader_a, reader_b, latency, bandwidth)
+    writer_a.peer = writer_b
+    writer_b.peer = writer_a
+    return (reader_a, writer_a), (reader_b, writer_b)
+
+
+class MemoryWriter:
+    """
+    Writing end of one direction of an in-memory connection, with the part
+    of the asyncio.StreamWriter interface connections use. Without latency
+    or bandwidth limit, data written is handed to the reader at the other end
+    right away. Otherwise it is queued and handed over once it would have
+    crossed the link.
+
+    The writer also stands in for the transport of the reader it writes to:
+    the reader pauses and resumes it as its buffer fills up and drains, and
+    drain waits while it is paused, which is how sockets push back on writers
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, reader, own_reader, latency=0, bandwidth=None):
+        """
+        :param reader: StreamReader of the other end, data written goes to
+        :param own_reader: StreamReader of this end, which gets EOF on close
+        :param latency: seconds data takes to reach the other end
+        :param bandwidth: bytes per second carried, None for unlimited
+        """
+        self.reader = reader
+        self.own_reader = own_reader
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.peer = None
+
+        # No more data is written once closed, and none is delivered once
+        # aborted by the other end closing
+        self.closed = False
+        self.aborted = False
+
+        # Set by the reader while its buffer is full
+        self.paused = False
+        # Data, or None for EOF, not delivered yet, as (loop time it is due, data)
+        self.pending = deque()
+        self.pending_size = 0
+        # Loop time the link is done sending the data written so far
+        self.link_free_at = 0
+        self.timer = None
+        self.waiter = None
+
+        reader.set_transport(self)
+
+    def write(self, data):
+        """
+        :param data: bytes to send to the other end
+        """
+        if self.closed:
+            return
+        if not self.latency and self.bandwidth is None and not self.pending:
+            self.reader.feed_data(data)
+        else:
+            self.enqueue(bytes(data))
+
+    def writelines(self, data):
+        """
+        :param data: iterable of bytes to send to the other end
+        """
+        for chunk in data:
+            self.write(chunk)
+
+    async def drain(self):
+        """
+        Wait until the other end is ready to take more data
+        :raise ConnectionResetError: the other end closed the connection
+        """
+        while self.paused or self.pending_size > HIGH_WATER:
+            if self.aborted:
+                break
+            self.waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        if self.aborted:
+            raise ConnectionResetError("connection closed by the other end")
+
+    def close(self):
+        """
+        Close the connection. The other end reads EOF once the data written
+        before has been delivered, and its writes are dropped from now on
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.pending:
+            self.enqueue(None)
+        else:
+            self.reader.feed_eof()
+        self.own_reader.feed_eof()
+        self.peer.abort()
+
+    def abort(self):
+        """
+        Drop everything not delivered yet, as the other end closed
+        """
+        self.closed = True
+        self.aborted = True
+        self.pending.clear()
+        self.pending_size = 0
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.wakeup()
+
+    def enqueue(self, data):
+        """
+        Queue data for delivery once it would have crossed the link
+        :param data: bytes to deliver, or None to deliver EOF
+        """
+        loop = asyncio.get_event_loop()
+        size = len(data) if data is not None else 0
+        start = max(loop.time(), self.link_free_at)
+        self.link_free_at = start + size / self.bandwidth if self.bandwidth else start
+        self.pending.append((self.link_free_at + self.latency, data))
+        self.pending_size += size
+        if self.timer is None:
+            self.timer = loop.call_at(self.pending[0][0], self.deliver)
+
+    def deliver(self):
+        """
+        Hand the data that is due over to the reader at the other end
+        """
+        self.timer = None
+        loop = asyncio.get_event_loop()
+        # The timer may fire within clock resolution before the first is due
+        due = max(loop.time(), self.pending[0][0])
+        while self.pending and self.pending[0][0] <= due:
+            _, data = self.pending.popleft()
+            if data is None:
+                self.reader.feed_eof()
+            else:
+                self.pending_size -= len(data)
+                self.reader.feed_data(data)
+        if self.pending:
+            self.timer = loop.call_at(self.pending[0][0], self.deliver)
+        self.wakeup()
+
+    def pause_reading(self):
+        """
+        Called by the reader once its buffer is full
+        """
+        self.paused = True
+
+    def resume_reading(self):
+        """
+        Called by the reader once its buffer has room again
+        """
+        self.paused = False
+        self.wakeup()
+
+    def wakeup(self):
+        waiter = self.waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+
+def memory_address(multiaddr):
+    """
+    :param multiaddr: multiaddr
+    :return: IPv6Address of multiaddr if it is a memory multiaddr, else None
+    """
+    if MEMORY_PROTOCOL not in [protocol.name for protocol in multiaddr.protocols()]:
+        return None
+    address = ipaddress.IPv6Address(multiaddr.value_for_protocol(MEMORY_PROTOCOL))
+    if address not in MEMORY_PREFIX:
+        return None
+    return address
+
+
+def multiaddr_from_address(address):
+    """
+    :param address: IPv6Address in MEMORY_PREFIX
+    :return: memory multiaddr of address
+    """
+    return multiaddr.Multiaddr("/%s/%s" % (MEMORY_PROTOCOL, address))
+
+
+# Network of the memory transports that are not given one
+DEFAULT_NETWORK = MemoryNetwork()
@@ -1,4 +1,5 @@
 import asyncio
+import socket
 
 import multiaddr
 
@@ -31,11 +32,10 @@ class TCP(ITransport):
             _multiaddr = _multiaddr.decapsulate('/p2p')
 
             coroutine = asyncio.start_server(self.handler,
-                                             _multiaddr.value_for_protocol('ip4'),
+                                             _ip_of(_multiaddr),
                                              _multiaddr.value_for_protocol('tcp'))
             self.server = await coroutine
-            socket = self.server.sockets[0]
-            self.multiaddrs.append(_multiaddr_from_socket(socket))
+            self.multiaddrs.append(_multiaddr_from_socket(self.server.sockets[0]))
 
             return True
 
@@ -64,6 +64,14 @@ class TCP(ITransport):
             self.server = None
             return True
 
+    def can_dial(self, multiaddr):
+        """
+        :param multiaddr: multiaddr of peer
+        :return: true for ip4 or ip6 tcp multiaddrs
+        """
+        names = [protocol.name for protocol in multiaddr.protocols()]
+        return ("ip4" in names or "ip6" in names) and "tcp" in names
+
     async def dial(self, multiaddr, self_id, options=None):
         """
         dial a transport to peer listening on multiaddr
@@ -72,23 +80,23 @@ class TCP(ITransport):
         :param options: optional object
         :return: True if successful
         """
-        host = multiaddr.value_for_protocol('ip4')
+        host = _ip_of(multiaddr)
         port = int(multiaddr.value_for_protocol('tcp'))
 
         reader, writer = await asyncio.open_connection(host, port)
+        raw_conn = RawConnection(host, port, reader, writer, True)
 
         # First: send our peer ID so receiver knows it
-        writer.write(id_b58_encode(self_id).encode())
-        await writer.drain()
+        await raw_conn.write(id_b58_encode(self_id).encode())
 
         # Await ack for peer id
         expected_ack_str = "received peer id"
-        ack = (await reader.read(len(expected_ack_str))).decode()
+        ack = (await raw_conn.read()).decode()
 
         if ack != expected_ack_str:
             raise Exception("Receiver did not receive peer id")
 
-        return RawConnection(host, port, reader, writer, True)
+        return raw_conn
 
     def create_listener(self, handler_function, options=None):
         """
@@ -101,5 +109,16 @@ class TCP(ITransport):
         return self.Listener(handler_function)
 
 
-def _multiaddr_from_socket(socket):
-    return multiaddr.Multiaddr("/ip4/%s/tcp/%s" % socket.getsockname())
+def _ip_of(_multiaddr):
+    """
+    :param _multiaddr: ip4 or ip6 multiaddr
+    :return: ip address of _multiaddr
+    """
+    names = [protocol.name for protocol in _multiaddr.protocols()]
+    return _multiaddr.value_for_protocol('ip4' if 'ip4' in names else 'ip6')
+
+
+def _multiaddr_from_socket(sock):
+    ip_protocol = 'ip6' if sock.family == socket.AF_INET6 else 'ip4'
+    host, port = sock.getsockname()[:2]
+    return multiaddr.Multiaddr("/%s/%s/tcp/%s" % (ip_protocol, host, port))
@@ -13,6 +13,13 @@ class ITransport(ABC):
         :return: list of multiaddrs
         """
 
+    @abstractmethod
+    def can_dial(self, multiaddr):
+        """
+        :param multiaddr: multiaddr of peer
+        :return: true if the transport can dial multiaddr
+        """
+
     @abstractmethod
     def create_listener(self, handler_function, options=None):
         """
@@ -0,0 +1,67 @@
+class TransportRegistry:
+    """
+    Transports of a host by multiaddr protocol, e.g. tcp. Dialing or listening
+    on a multiaddr goes through the transport of the last of its protocols
+    that has one, so one host can use several transports at once, and a
+    transport over ip6 such as the memory transport does not capture
+    /ip6/.../tcp multiaddrs
+    """
+
+    def __init__(self):
+        # Mapping from multiaddr protocol name -> transport
+        self.transports = {}
+
+    def add_transport(self, protocol, transport):
+        """
+        :param protocol: multiaddr protocol name handled by transport, e.g. tcp
+        :param transport: transport to dial and listen on multiaddrs with protocol
+        """
+        self.transports[protocol] = transport
+
+    def get_transport(self, multiaddr):
+        """
+        :param multiaddr: multiaddr to dial or listen on
+        :return: transport for multiaddr
+        :raise TransportNotFound: no transport handles the protocols of multiaddr
+        """
+        for protocol in reversed(multiaddr.protocols()):
+            transport = self.transports.get(protocol.name)
+            if transport is not None:
+                return transport
+        raise TransportNotFound("no transport for %s" % multiaddr)
+
+    def can_dial(self, multiaddr):
+        """
+        :param multiaddr: multiaddr of peer
+        :return: true if a transport can dial multiaddr
+        """
+        try:
+            return self.get_transport(multiaddr).can_dial(multiaddr)
+        except TransportNotFound:
+            return False
+
+    async def dial(self, multiaddr, self_id, options=None):
+        """
+        dial a peer listening on multiaddr with the transport for multiaddr
+        :param multiaddr: multiaddr of peer
+        :param self_id: peer_id of the dialer (to send to receiver)
+        :param options: optional object
+        :return: raw connection
+        :raise TransportNotFound: no transport handles the protocols of multiaddr
+        """
+        return await self.get_transport(multiaddr).dial(multiaddr, self_id, options)
+
+    def create_listener(self, multiaddr, handler_function, options=None):
+        """
+        create a listener for multiaddr with the transport for multiaddr
+        :param multiaddr: multiaddr the listener is to listen on
+        :param handler_function: a function called for every new connection
+        :param options: optional object with properties the listener must have
+        :return: a listener object that implements listener_interface.py
+        :raise TransportNotFound: no transport handles the protocols of multiaddr
+        """
+        return self.get_transport(multiaddr).create_listener(handler_function, options)
+
+
+class TransportNotFound(Exception):
+    """Raised when no transport handles the protocols of a multiaddr"""
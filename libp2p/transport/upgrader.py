@@ -1,18 +1,41 @@
-from libp2p.stream_muxer.mplex.mplex import Mplex
+from libp2p.stream_muxer.muxer_multistream import MuxerMultistream
 from libp2p.security.security_multistream import SecurityMultistream
 
 
 class TransportUpgrader:
     # pylint: disable=no-self-use
 
-    def __init__(self, secOpt, muxerOpt):
+    def __init__(self, secOpt, muxerOpt, stream_window_size=None, metrics=None,
+                 resource_manager=None):
+        """
+        :param secOpt: mapping from security protocol id to secure transport
+        :param muxerOpt: mapping from stream muxer protocol id to muxer class,
+        in order of preference
+        :param stream_window_size: optional maximum number of received bytes
+        buffered per muxed stream
+        :param metrics: optional Metrics counting the traffic of every muxed
+        connection
+        :param resource_manager: optional ResourceManager every muxed connection
+        and stream is checked out of
+        """
         # Store security option
         self.security_multistream = SecurityMultistream()
         for key in secOpt:
             self.security_multistream.add_transport(key, secOpt[key])
 
+        # Options passed to every muxed connection
+        muxer_options = {}
+        if stream_window_size is not None:
+            muxer_options["stream_window_size"] = stream_window_size
+        if metrics is not None:
+            muxer_options["metrics"] = metrics
+        if resource_manager is not None:
+            muxer_options["resource_manager"] = resource_manager
+
         # Store muxer option
-        self.muxer = muxerOpt
+        self.muxer_multistream = MuxerMultistream(muxer_options)
+        for key in muxerOpt:
+            self.muxer_multistream.add_transport(key, muxerOpt[key])
 
     def upgrade_listener(self, transport, listeners):
         """
@@ -28,11 +51,9 @@ class TransportUpgrader:
 
         return await self.security_multistream.secure_inbound(raw_conn)
 
-    def upgrade_connection(self, conn, generic_protocol_handler, peer_id):
+    async def upgrade_connection(self, conn, generic_protocol_handler, peer_id):
         """
-        Upgrade raw connection to muxed connection
+        Upgrade secured connection to muxed connection, using the stream muxer
+        negotiated with the other end
         """
-
-        # For PoC, no security, default to mplex
-        # TODO do exchange to determine multiplexer
-        return Mplex(conn, generic_protocol_handler, peer_id)
+        return await self.muxer_multistream.new_conn(conn, generic_protocol_handler, peer_id)
@@ -0,0 +1,57 @@
+def encode_uvarint(number):
+    """Pack `number` into varint bytes"""
+    if number < 0x80:
+        return bytes((number,))
+    buf = bytearray()
+    while number >= 0x80:
+        buf.append((number & 0x7f) | 0x80)
+        number >>= 7
+    buf.append(number)
+    return bytes(buf)
+
+
+async def read_uvarint(reader):
+    """
+    Read a varint off an asyncio.StreamReader
+    :param reader: reader to read from
+    :return: decoded number, or None if EOF was reached before its first byte
+    :raise asyncio.IncompleteReadError: EOF was reached within the varint
+    :raise ValueError: varint is longer than 64 bits
+    """
+    first = await reader.read(1)
+    if not first:
+        return None
+
+    result = first[0] & 0x7f
+    byte = first[0]
+    shift = 7
+    while byte & 0x80:
+        if shift >= 64:
+            raise ValueError("varint is longer than 64 bits")
+        byte = (await reader.readexactly(1))[0]
+        result |= (byte & 0x7f) << shift
+        shift += 7
+    return result
+
+
+def decode_uvarint(data, index=0):
+    """
+    Decode a varint from bytes
+    :param data: bytes holding the varint
+    :param index: index of the first byte of the varint in data
+    :return: decoded number, index of the first byte after the varint
+    :raise ValueError: data ends within the varint, or it is longer than 64 bits
+    """
+    result = 0
+    shift = 0
+    while True:
+        if index >= len(data):
+            raise ValueError("data ends within a varint")
+        if shift >= 64:
+            raise ValueError("varint is longer than 64 bits")
+        byte = data[index]
+        index += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, index
@@ -35,9 +35,13 @@ async def connect_write(host_a, host_b):
     async def stream_handler(stream):
         while True:
             try:
-                received.append((await stream.read()).decode())
-            except Exception:  # exception is raised when other side close the stream ?
+                read = await stream.read()
+            except Exception:  # exception is raised when the stream is reset
                 break
+            if not read:
+                # other side closed the stream
+                break
+            received.append(read.decode())
     host_a.set_stream_handler(PROTOCOL_ID, stream_handler)
 
     # Start a stream with the destination.
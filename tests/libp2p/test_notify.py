@@ -9,6 +9,7 @@ TODO: Add tests for closed_stream disconnected, listen_close when those
 features are implemented in swarm
 """
 
+import asyncio
 import pytest
 import multiaddr
 
@@ -373,3 +374,46 @@ async def test_invalid_notifee():
 
     # Success, terminate pending tasks.
     await cleanup()
+
+
+class SlowNotifee(MyNotifee):
+
+    def __init__(self, events, val_to_append_to_event, release):
+        super().__init__(events, val_to_append_to_event)
+        self.release = release
+
+    async def connected(self, network, conn):
+        await self.release.wait()
+        await super().connected(network, conn)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_notify_does_not_wait_for_notifees():
+    node_a = BasicHost(initialize_default_swarm(transport_opt=["/ip4/127.0.0.1/tcp/0"],
+                                                concurrent_notify=True))
+    node_b = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"])
+    await node_b.get_network().listen(multiaddr.Multiaddr("/ip4/127.0.0.1/tcp/0"))
+    node_b.set_stream_handler("/echo/1.0.0", echo_stream_handler)
+    node_a.get_peerstore().add_addrs(node_b.get_id(), node_b.get_addrs(), 10)
+
+    release = asyncio.Event()
+    slow_events = []
+    fast_events = []
+    assert node_a.get_network().notify(SlowNotifee(slow_events, "slow", release))
+    assert node_a.get_network().notify(MyNotifee(fast_events, "fast"))
+
+    # The slow notifee holds up neither the stream nor the other notifee
+    stream = await asyncio.wait_for(node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"]), 5)
+    await stream.write(b"hello")
+    assert await asyncio.wait_for(stream.read(), 5) == b"ack:hello"
+    await asyncio.sleep(0.1)
+    assert fast_events == [["connectedfast", stream.muxed_conn], ["opened_streamfast", stream]]
+    assert slow_events == []
+
+    # Events of a connection reach the slow notifee in order
+    release.set()
+    await asyncio.wait_for(node_a.get_network().notifee_dispatcher.flush(), 5)
+    assert slow_events == [["connectedslow", stream.muxed_conn], ["opened_streamslow", stream]]
+
+    # Success, terminate pending tasks.
+    await cleanup()
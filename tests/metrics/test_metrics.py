@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+
+from libp2p.metrics.metrics import OTHER_PROTOCOL, LatencyHistogram, Metrics, TrafficStats
+from libp2p.metrics.prometheus import serve_metrics
+from tests.utils import cleanup, echo_stream_handler, perform_two_host_set_up_custom_handler
+
+
+@pytest.mark.asyncio
+async def test_traffic_is_counted_per_peer_and_protocol():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+
+    stream = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    for _ in range(3):
+        await stream.write(b"hello")
+        assert await asyncio.wait_for(stream.read(), 1) == b"ack:hello"
+
+    metrics = node_a.get_metrics()
+    peer = metrics.peers[node_b.get_id()]
+    assert peer.messages_out == 3
+    assert peer.messages_in == 3
+    # Frames include stream opening and protocol negotiation
+    assert peer.frames_out > 3
+    assert peer.bytes_out > 3 * len(b"hello")
+    assert peer.bytes_in > 3 * len(b"ack:hello")
+
+    protocol = metrics.protocols["/echo/1.0.0"]
+    assert protocol.bytes_out == 3 * len(b"hello")
+    assert protocol.bytes_in == 3 * len(b"ack:hello")
+    assert metrics.stream_open_latency["/echo/1.0.0"].count == 1
+
+    # The other end counts the same messages the other way round
+    other = node_b.get_metrics().protocols["/echo/1.0.0"]
+    assert other.bytes_in == 3 * len(b"hello")
+    assert other.messages_out == 3
+
+    snapshot = metrics.snapshot()
+    assert snapshot["peers"][node_b.get_id().pretty()]["messages_out"] == 3
+    assert snapshot["protocols"]["/echo/1.0.0"]["rate_out"] > 0
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_rates_cover_the_rate_window():
+    stats = TrafficStats(rate_window=10)
+    start = stats.samples[0][0]
+
+    stats.bytes_in = 100
+    for second in range(1, 11):
+        stats.sample(start + second)
+    assert stats.rates(start + 10) == (10, 0)
+
+    # Traffic older than the window no longer counts
+    stats.bytes_in = 300
+    stats.bytes_out = 50
+    for second in range(11, 31):
+        stats.sample(start + second)
+        if second == 20:
+            assert stats.rates(start + 20) == (20, 5)
+    assert stats.rates(start + 30) == (0, 0)
+    # One sample a second over the window, and the base of the rates
+    assert len(stats.samples) == 11
+
+
+@pytest.mark.asyncio
+async def test_rates_do_not_depend_on_how_often_they_are_read():
+    metrics = Metrics(rate_window=10)
+    stats = metrics.protocol_stats("/echo/1.0.0")
+    assert metrics.sample_timer is not None
+    start = stats.samples[0][0]
+
+    # 1000 bytes a second for 20 seconds, then 100 bytes a second, read
+    # only once at the end
+    for second in range(1, 31):
+        stats.bytes_in += 1000 if second <= 20 else 100
+        metrics.sample(start + second)
+    assert stats.rates(start + 30) == (100, 0)
+
+    metrics.sample_timer.cancel()
+
+
+@pytest.mark.asyncio
+async def test_stats_maps_are_bounded():
+    metrics = Metrics(max_protocols=2)
+    for protocol_id in ["/a", "/b", "/c", "/d"]:
+        metrics.protocol_stats(protocol_id).bytes_in += 1
+        metrics.record_stream_open(protocol_id, 0.01)
+
+    assert sorted(metrics.protocols) == ["/a", "/b", OTHER_PROTOCOL]
+    assert metrics.protocols[OTHER_PROTOCOL].bytes_in == 2
+    assert sorted(metrics.stream_open_latency) == ["/a", "/b", OTHER_PROTOCOL]
+
+    metrics.peer_stats("peer")
+    metrics.remove_peer("peer")
+    assert not metrics.peers
+
+
+@pytest.mark.asyncio
+async def test_peer_stats_are_dropped_on_disconnect():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+
+    stream = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"hello")
+    assert await asyncio.wait_for(stream.read(), 1) == b"ack:hello"
+    assert node_b.get_id() in node_a.get_metrics().peers
+
+    node_a.get_network().close_peer(node_b.get_id())
+    assert node_b.get_id() not in node_a.get_metrics().peers
+    # The protocol stats outlive the connection
+    assert "/echo/1.0.0" in node_a.get_metrics().protocols
+
+    await cleanup()
+
+
+def test_latency_histogram_buckets():
+    histogram = LatencyHistogram(buckets=(0.01, 0.1))
+    for latency in (0.005, 0.01, 0.05, 3):
+        histogram.observe(latency)
+
+    assert histogram.cumulative_counts() == [(0.01, 2), (0.1, 3), (float("inf"), 4)]
+    assert histogram.count == 4
+
+
+@pytest.mark.asyncio
+async def test_prometheus_endpoint():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+    stream = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"hello")
+    await asyncio.wait_for(stream.read(), 1)
+
+    server = await serve_metrics(node_a.get_metrics())
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    response = (await asyncio.wait_for(reader.read(), 1)).decode()
+    writer.close()
+    server.close()
+
+    assert response.startswith("HTTP/1.1 200 OK")
+    assert 'libp2p_bytes_out_total{protocol="/echo/1.0.0"} 5\n' in response
+    assert 'libp2p_messages_out_total{peer="%s"} 1\n' % node_b.get_id().pretty() in response
+    assert 'libp2p_stream_open_seconds_count{protocol="/echo/1.0.0"} 1\n' in response
+
+    await cleanup()
@@ -1,6 +1,10 @@
 import asyncio
 import pytest
 
+from libp2p.network.connection.raw_connection import MAX_MESSAGE_SIZE, RawConnectionError
+from libp2p.utils import encode_uvarint
+from libp2p.tools.connections import create_raw_conn_pair
+
 
 async def handle_echo(reader, writer):
     data = await reader.read(100)
@@ -24,3 +28,30 @@ async def test_simple_echo():
     response = (await reader.read()).decode()
 
     assert response == (test_message)
+
+
+@pytest.mark.asyncio
+async def test_raw_connection_messages_keep_their_bytes():
+    conn_a, conn_b = await create_raw_conn_pair()
+    messages = [b"with\nnewline\n", bytes(range(256)), b"x" * 300]
+
+    for message in messages:
+        await conn_a.write(message)
+    for message in messages:
+        assert await conn_b.read() == message
+
+    conn_a.close()
+    assert await conn_b.read() == b""
+    conn_b.close()
+
+
+@pytest.mark.asyncio
+async def test_raw_connection_rejects_oversized_message():
+    conn_a, conn_b = await create_raw_conn_pair()
+
+    conn_a.writer.write(encode_uvarint(MAX_MESSAGE_SIZE + 1))
+    with pytest.raises(RawConnectionError):
+        await conn_b.read()
+
+    conn_a.close()
+    conn_b.close()
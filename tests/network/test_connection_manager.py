@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+
+from libp2p import new_node
+from libp2p.network.connection_manager import ConnectionManager
+from libp2p.network.notifee_interface import INotifee
+from libp2p.peer.peerinfo import info_from_p2p_addr
+from tests.utils import cleanup, set_up_nodes_by_transport_opt
+
+
+class FakeConn:
+
+    def __init__(self, num_streams=0, last_activity=0):
+        self.streams = dict.fromkeys(range(num_streams))
+        self.last_activity = last_activity
+
+
+class FakeSwarm:
+
+    def __init__(self, connections):
+        self.connections = connections
+        self.closed = []
+
+    def close_peer(self, peer_id):
+        del self.connections[peer_id]
+        self.closed.append(peer_id)
+
+
+@pytest.mark.asyncio
+async def test_trim_closes_least_valuable_connections():
+    swarm = FakeSwarm({
+        "idle": FakeConn(0, last_activity=1),
+        "recent": FakeConn(0, last_activity=2),
+        "busy": FakeConn(3),
+        "tagged": FakeConn(0),
+        "protected": FakeConn(0),
+    })
+    manager = ConnectionManager(swarm, low_water=2, high_water=4, grace_period=0)
+    manager.tag_peer("tagged", "app", 10)
+    manager.protect("protected", "gossipsub-mesh")
+
+    assert manager.trim_open_conns() == ["idle", "recent", "busy"]
+    assert set(swarm.connections) == {"tagged", "protected"}
+
+
+@pytest.mark.asyncio
+async def test_grace_period_and_protection():
+    swarm = FakeSwarm({})
+    manager = ConnectionManager(swarm, low_water=0, high_water=1, grace_period=60)
+    swarm.connections["old"] = FakeConn()
+    manager.connected("old")
+    manager.connected_at["old"] -= 120
+    swarm.connections["new"] = FakeConn()
+    manager.connected("new")
+
+    # Crossing the high watermark trims, but spares the connection in its grace period
+    assert swarm.closed == ["old"]
+    assert set(swarm.connections) == {"new"}
+
+    manager.protect("new", "a")
+    manager.protect("new", "b")
+    assert manager.unprotect("new", "a")
+    assert not manager.unprotect("new", "b")
+    assert not manager.is_protected("new")
+
+
+@pytest.mark.asyncio
+async def test_connections_spared_by_grace_period_are_trimmed_later():
+    swarm = FakeSwarm({})
+    manager = ConnectionManager(swarm, low_water=1, high_water=1, grace_period=0.05,
+                                trim_interval=0.1)
+    for peer_id in ["a", "b"]:
+        swarm.connections[peer_id] = FakeConn()
+        manager.connected(peer_id)
+
+    # Both connections are in their grace period
+    assert not swarm.closed
+    assert manager.trim_timer is not None
+
+    await asyncio.sleep(0.15)
+    assert len(swarm.connections) == 1
+    assert manager.trim_timer is None
+
+
+class DisconnectNotifee(INotifee):
+
+    def __init__(self):
+        self.disconnected_conns = []
+
+    async def opened_stream(self, network, stream):
+        pass
+
+    async def closed_stream(self, network, stream):
+        pass
+
+    async def connected(self, network, conn):
+        pass
+
+    async def disconnected(self, network, conn):
+        self.disconnected_conns.append(conn)
+
+    async def listen(self, network, multiaddr):
+        pass
+
+    async def listen_close(self, network, multiaddr):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_swarm_trims_to_low_water_and_notifies():
+    node = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"], conn_manager_opt={
+        "low_water": 1, "high_water": 2, "grace_period": 0})
+    transport_opt_list = [["/ip4/127.0.0.1/tcp/0"]] * 3
+    peers = await set_up_nodes_by_transport_opt(transport_opt_list)
+    swarm = node.get_network()
+    notifee = DisconnectNotifee()
+    swarm.notify(notifee)
+    swarm.connection_manager.protect(peers[0].get_id(), "important")
+
+    for peer in peers:
+        await node.connect(info_from_p2p_addr(peer.get_addrs()[0]))
+    await asyncio.sleep(0.1)
+
+    assert list(swarm.connections) == [peers[0].get_id()]
+    assert len(notifee.disconnected_conns) == 2
+    assert all(conn.is_closed() for conn in notifee.disconnected_conns)
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_swarm_forgets_connection_closed_by_peer():
+    transport_opt_list = [["/ip4/127.0.0.1/tcp/0"]] * 2
+    (node_a, node_b) = await set_up_nodes_by_transport_opt(transport_opt_list)
+    notifee = DisconnectNotifee()
+    node_a.get_network().notify(notifee)
+
+    await node_a.connect(info_from_p2p_addr(node_b.get_addrs()[0]))
+    await asyncio.sleep(0.1)
+    node_b.get_network().close_peer(node_a.get_id())
+    await asyncio.sleep(0.1)
+
+    assert not node_a.get_network().connections
+    assert not node_b.get_network().connections
+    assert len(notifee.disconnected_conns) == 1
+
+    await cleanup()
@@ -0,0 +1,178 @@
+import asyncio
+import pytest
+
+from libp2p.network.resource_manager import MIN_SCOPES_KEPT, ResourceLimitExceeded, \
+    ResourceLimits, ResourceManager
+from libp2p.peer.peerinfo import info_from_p2p_addr
+from libp2p.security.insecure_security import InsecureConn
+from libp2p.stream_muxer.mplex.mplex import Mplex
+from libp2p.stream_muxer.mplex.mplex_stream import MplexStreamReset
+from libp2p.tools.connections import create_raw_conn_pair
+from tests.utils import cleanup, echo_stream_handler, perform_two_host_set_up_custom_handler
+
+
+def test_reservations_count_against_every_ancestor():
+    manager = ResourceManager(peer_limits=ResourceLimits(connections=1, streams=3),
+                              connection_limits=ResourceLimits(streams=2))
+
+    conn = manager.open_connection("peer")
+    with pytest.raises(ResourceLimitExceeded):
+        manager.open_connection("peer")
+    other_conn = manager.open_connection("other peer")
+
+    streams = [manager.open_stream(conn) for _ in range(2)]
+    with pytest.raises(ResourceLimitExceeded):
+        manager.open_stream(conn)
+    assert manager.peers["peer"].streams == 2
+    assert manager.system.streams == 2
+    assert manager.system.connections == 2
+
+    streams[0].reserve_memory(100)
+    manager.set_stream_protocol(streams[0], "/echo/1.0.0")
+    assert manager.protocols["/echo/1.0.0"].streams == 1
+    assert manager.protocols["/echo/1.0.0"].memory == 100
+    # The system is reached through both the peer and the protocol, and counted once
+    assert manager.system.memory == 100
+
+    streams[0].close()
+    assert manager.protocols["/echo/1.0.0"].is_idle()
+    assert manager.system.streams == 1
+    conn.close()
+    other_conn.close()
+    streams[1].close()
+    assert manager.system.is_idle()
+
+
+def test_protocol_limits():
+    manager = ResourceManager()
+    manager.set_protocol_limits("/echo/1.0.0", ResourceLimits(streams=1))
+    conn = manager.open_connection("peer")
+
+    manager.set_stream_protocol(manager.open_stream(conn), "/echo/1.0.0")
+    stream = manager.open_stream(conn)
+    with pytest.raises(ResourceLimitExceeded):
+        manager.set_stream_protocol(stream, "/echo/1.0.0")
+    manager.set_stream_protocol(stream, "/other/1.0.0")
+
+
+def test_idle_scopes_are_forgotten():
+    manager = ResourceManager()
+    conn = manager.open_connection("peer")
+    busy = manager.open_stream(conn)
+    manager.set_stream_protocol(busy, "/busy/1.0.0")
+
+    for i in range(10 * MIN_SCOPES_KEPT):
+        stream = manager.open_stream(conn)
+        manager.set_stream_protocol(stream, "/idle/%d" % i)
+        stream.close()
+        manager.open_connection("idle peer %d" % i).close()
+
+    assert len(manager.protocols) <= 2 * MIN_SCOPES_KEPT
+    assert len(manager.peers) <= 2 * MIN_SCOPES_KEPT
+    assert manager.protocols["/busy/1.0.0"].streams == 1
+    assert manager.peers["peer"].connections == 1
+
+
+async def create_limited_mplex_pair(resource_manager, handler_b):
+    async def ignore(_stream):
+        pass
+
+    conn_a, conn_b = await create_raw_conn_pair()
+    mplex_a = Mplex(InsecureConn(conn_a, "insecure"), ignore, "b")
+    mplex_b = Mplex(InsecureConn(conn_b, "insecure"), handler_b, "a",
+                    resource_manager=resource_manager)
+    return mplex_a, mplex_b
+
+
+@pytest.mark.asyncio
+async def test_streams_beyond_the_limit_are_reset():
+    accepted = asyncio.Queue()
+    manager = ResourceManager(connection_limits=ResourceLimits(streams=2))
+    mplex_a, mplex_b = await create_limited_mplex_pair(manager, accepted.put)
+
+    streams = [await mplex_a.open_stream("/echo/1.0.0", None) for _ in range(3)]
+
+    # No handler is started for the stream beyond the limit
+    for _ in range(2):
+        await asyncio.wait_for(accepted.get(), 1)
+    with pytest.raises(MplexStreamReset):
+        await asyncio.wait_for(streams[2].read(), 1)
+    assert accepted.empty()
+    assert len(mplex_b.streams) == 2
+
+    # Closing a stream makes room for another
+    await streams[0].reset()
+    await asyncio.sleep(0.1)
+    assert manager.system.streams == 1
+    await mplex_a.open_stream("/echo/1.0.0", None)
+    await asyncio.wait_for(accepted.get(), 1)
+
+    mplex_a.close()
+    mplex_b.close()
+    await asyncio.sleep(0.1)
+    assert manager.system.is_idle()
+
+
+@pytest.mark.asyncio
+async def test_buffered_bytes_are_limited():
+    accepted = asyncio.Queue()
+    manager = ResourceManager(connection_limits=ResourceLimits(memory=10))
+    mplex_a, mplex_b = await create_limited_mplex_pair(manager, accepted.put)
+    stream_a = await mplex_a.open_stream("/echo/1.0.0", None)
+    stream_b = await asyncio.wait_for(accepted.get(), 1)
+
+    await stream_a.write(b"x" * 8)
+    await asyncio.sleep(0.1)
+    assert manager.system.memory == 8
+
+    # Reading releases the bytes
+    assert await stream_b.read() == b"x" * 8
+    assert manager.system.memory == 0
+
+    await stream_a.write(b"y" * 8)
+    await stream_a.write(b"z" * 8)
+    await asyncio.sleep(0.1)
+    assert await stream_b.read() == b"y" * 8
+    with pytest.raises(MplexStreamReset):
+        await stream_b.read()
+    assert manager.system.memory == 0
+    assert manager.system.streams == 0
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_swarm_checks_streams_out_of_their_protocol():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+    manager_b = node_b.get_network().resource_manager
+    manager_b.set_protocol_limits("/echo/1.0.0", ResourceLimits(streams=1))
+
+    stream = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"hello")
+    assert await asyncio.wait_for(stream.read(), 1) == b"ack:hello"
+    assert manager_b.protocols["/echo/1.0.0"].streams == 1
+
+    # node_b refuses a second echo stream once it is negotiated
+    second = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    with pytest.raises(MplexStreamReset):
+        await asyncio.wait_for(second.read(), 1)
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_swarm_refuses_connections_beyond_the_limit(caplog):
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+    node_b.get_network().resource_manager.system.limits = ResourceLimits(connections=0)
+
+    # node_a connects, then node_b refuses the connection once it is muxed
+    await node_a.connect(info_from_p2p_addr(node_b.get_addrs()[0]))
+    await asyncio.sleep(0.1)
+
+    assert node_b.get_id() not in node_a.get_network().connections
+    assert node_a.get_id() not in node_b.get_network().connections
+    # Refusing the connection is not an error of the listener
+    assert not [record for record in caplog.records if record.levelname == "WARNING"]
+
+    await cleanup()
@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+
+from libp2p.network.stream_pool import StreamPool
+from tests.utils import cleanup, echo_stream_handler, perform_two_host_set_up_custom_handler
+
+
+async def request(stream, message):
+    await stream.write(message)
+    return await asyncio.wait_for(stream.read(), 1)
+
+
+@pytest.mark.asyncio
+async def test_released_stream_is_reused():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+    pool = StreamPool(node_a.get_network())
+
+    async with pool.stream(node_b.get_id(), ["/echo/1.0.0"]) as stream:
+        assert await request(stream, b"one") == b"ack:one"
+    async with pool.stream(node_b.get_id(), ["/echo/1.0.0"]) as reused:
+        assert reused is stream
+        assert await request(reused, b"two") == b"ack:two"
+
+        # Streams in use are not handed out twice
+        other = await pool.get_stream(node_b.get_id(), ["/echo/1.0.0"])
+        assert other is not stream
+        assert await request(other, b"three") == b"ack:three"
+        pool.release(other)
+
+    assert pool.idle_count == 2
+    pool.close()
+    assert not pool.idle_streams
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_streams_are_not_reused():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+    pool = StreamPool(node_a.get_network(), max_idle_per_key=1, idle_timeout=0.1)
+
+    # A response left unread
+    stream = await pool.get_stream(node_b.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"unread")
+    await asyncio.sleep(0.1)
+    pool.release(stream)
+    assert pool.idle_count == 0
+
+    # Over the per key limit
+    streams = [await pool.get_stream(node_b.get_id(), ["/echo/1.0.0"]) for _ in range(2)]
+    for stream in streams:
+        pool.release(stream)
+    assert pool.idle_count == 1
+
+    # Idle for too long
+    await asyncio.sleep(0.2)
+    assert await pool.get_stream(node_b.get_id(), ["/echo/1.0.0"]) not in streams
+    assert pool.idle_count == 0
+
+    # Failed while in use
+    with pytest.raises(asyncio.TimeoutError):
+        async with pool.stream(node_b.get_id(), ["/echo/1.0.0"]) as stream:
+            await asyncio.wait_for(stream.read(), 0.05)
+    assert pool.idle_count == 0
+    assert stream.muxed_stream.local_closed
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_stale_streams_are_swept_without_being_taken():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+    pool = StreamPool(node_a.get_network(), idle_timeout=0.1)
+
+    stream = await pool.get_stream(node_b.get_id(), ["/echo/1.0.0"])
+    pool.release(stream)
+    assert pool.idle_count == 1
+
+    # Nobody asks for a stream to node_b again
+    await asyncio.sleep(0.3)
+    assert pool.idle_count == 0
+    assert not pool.idle_streams
+    assert pool.sweep_timer is None
+    assert stream.muxed_stream.local_closed
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_host_stream_pool():
+    node_a, node_b = await perform_two_host_set_up_custom_handler(echo_stream_handler)
+    pool = node_a.get_stream_pool()
+
+    async with pool.stream(node_b.get_id(), ["/echo/1.0.0"]) as stream:
+        assert await request(stream, b"one") == b"ack:one"
+    async with pool.stream(node_b.get_id(), ["/echo/1.0.0"]) as reused:
+        assert reused is stream
+        assert await request(reused, b"two") == b"ack:two"
+    assert pool.idle_count == 1
+
+    # Idle streams go away with their connection
+    node_a.get_network().close_peer(node_b.get_id())
+    await asyncio.sleep(0.1)
+    assert pool.idle_count == 0
+
+    await cleanup()
@@ -0,0 +1,485 @@
+import asyncio
+import multiaddr
+import pytest
+
+from libp2p.network.dial_backoff import DialBackoff
+from libp2p.network.dialer import AddrStats, Dialer, DialBackoffError, DialError
+from libp2p.network.swarm import SIMULTANEOUS_DIAL_WINDOW
+from libp2p.protocol_muxer.multiselect_client import MultiselectClient, MultiselectClientError
+from libp2p.protocol_muxer.multiselect_communicator import MultiselectCommunicator
+from libp2p.transport.transport_registry import TransportNotFound, TransportRegistry
+from tests.utils import cleanup, set_up_nodes_by_transport_opt
+
+
+async def set_up_two_nodes():
+    transport_opt_list = [["/ip4/127.0.0.1/tcp/0"], ["/ip4/127.0.0.1/tcp/0"]]
+    (node_a, node_b) = await set_up_nodes_by_transport_opt(transport_opt_list)
+    node_a.get_peerstore().add_addrs(node_b.get_id(), node_b.get_addrs(), 10)
+    node_b.get_peerstore().add_addrs(node_a.get_id(), node_a.get_addrs(), 10)
+    return node_a, node_b
+
+
+def count_dials(swarm):
+    dials = []
+    dial = swarm.transport.dial
+
+    async def counting_dial(addr, self_id, options=None):
+        dials.append(addr)
+        return await dial(addr, self_id, options)
+
+    swarm.transport.dial = counting_dial
+    return dials
+
+
+@pytest.mark.asyncio
+async def test_concurrent_dials_share_one_connection():
+    node_a, node_b = await set_up_two_nodes()
+    swarm_a = node_a.get_network()
+    dials = count_dials(swarm_a)
+
+    conns = await asyncio.gather(*[swarm_a.dial_peer(node_b.get_id()) for _ in range(10)])
+
+    assert len(dials) == 1
+    assert all(conn is conns[0] for conn in conns)
+    assert not swarm_a.pending_dials
+    assert await swarm_a.dial_peer(node_b.get_id()) is conns[0]
+    assert len(dials) == 1
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_failed_dial_is_not_cached():
+    node_a, node_b = await set_up_two_nodes()
+    swarm_a = node_a.get_network()
+    dial = swarm_a.transport.dial
+
+    async def failing_dial(addr, self_id, options=None):
+        # pylint: disable=unused-argument
+        raise ConnectionRefusedError()
+
+    swarm_a.transport.dial = failing_dial
+    results = await asyncio.gather(*[swarm_a.dial_peer(node_b.get_id()) for _ in range(3)],
+                                   return_exceptions=True)
+    assert all(isinstance(result, DialError) for result in results)
+    assert not swarm_a.pending_dials
+
+    # The failure is remembered by the backoff, not by a cached dial
+    swarm_a.transport.dial = dial
+    with pytest.raises(DialBackoffError):
+        await swarm_a.dial_peer(node_b.get_id())
+    swarm_a.dial_backoff.clear(node_b.get_id())
+    swarm_a.dialer.addr_backoff.entries.clear()
+    assert not (await swarm_a.dial_peer(node_b.get_id())).is_closed()
+    assert swarm_a.dial_backoff.get(node_b.get_id()) is None
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_simultaneous_dials_keep_the_same_connection():
+    node_a, node_b = await set_up_two_nodes()
+    swarm_a = node_a.get_network()
+    swarm_b = node_b.get_network()
+
+    await asyncio.gather(swarm_a.dial_peer(node_b.get_id()),
+                         swarm_b.dial_peer(node_a.get_id()))
+    await asyncio.sleep(0.2)
+
+    conn_a = swarm_a.connections[node_b.get_id()]
+    conn_b = swarm_b.connections[node_a.get_id()]
+    assert not conn_a.is_closed()
+    assert not conn_b.is_closed()
+    # Both ends of the same connection: one dialed, the other accepted
+    assert conn_a.initiator != conn_b.initiator
+    assert conn_a.raw_conn.writer.get_extra_info("sockname") == \
+        conn_b.raw_conn.writer.get_extra_info("peername")
+
+    async def echo(stream):
+        await stream.write(await stream.read())
+
+    node_b.set_stream_handler("/echo/1.0.0", echo)
+    stream = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"hello")
+    assert await asyncio.wait_for(stream.read(), 1) == b"hello"
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_inbound_connection_replaces_stale_one():
+    node_a, node_b = await set_up_two_nodes()
+    swarm_a = node_a.get_network()
+    swarm_b = node_b.get_network()
+
+    stale = await swarm_a.dial_peer(node_b.get_id())
+    await asyncio.sleep(0.1)
+    stale_b = swarm_b.connections[node_a.get_id()]
+    swarm_b.connection_manager.connected_at[node_a.get_id()] -= SIMULTANEOUS_DIAL_WINDOW
+
+    # node_a restarts, forgetting its connection without node_b noticing,
+    # and dials in again while node_b dials nothing
+    del swarm_a.connections[node_b.get_id()]
+    fresh = await swarm_a.dial_peer(node_b.get_id())
+    await asyncio.sleep(0.1)
+
+    assert fresh is not stale
+    assert not fresh.is_closed()
+    assert stale_b.is_closed()
+    fresh_b = swarm_b.connections[node_a.get_id()]
+    assert fresh_b.raw_conn.writer.get_extra_info("peername") == \
+        fresh.raw_conn.writer.get_extra_info("sockname")
+
+    await cleanup()
+
+
+class FakeTransport:
+    """
+    Transport whose dials take a preset time per address, and fail for
+    addresses without a preset time
+    """
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.dialed = []
+        self.cancelled = []
+        self.closed = []
+
+    def can_dial(self, addr):
+        return "tcp" in [protocol.name for protocol in addr.protocols()]
+
+    async def dial(self, addr, self_id, options=None):
+        # pylint: disable=unused-argument
+        self.dialed.append(str(addr))
+        if str(addr) not in self.delays:
+            raise ConnectionRefusedError()
+        try:
+            await asyncio.sleep(self.delays[str(addr)])
+        except asyncio.CancelledError:
+            self.cancelled.append(str(addr))
+            raise
+        return FakeConn(str(addr), self.closed)
+
+
+class FakeConn:
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, addr, closed):
+        self.addr = addr
+        self.closed = closed
+
+    def close(self):
+        self.closed.append(self.addr)
+
+
+LOOPBACK = "/ip4/127.0.0.1/tcp/1"
+PRIVATE = "/ip4/192.168.1.1/tcp/1"
+PUBLIC = "/ip4/8.8.8.8/tcp/1"
+
+
+def addrs(*addr_strs):
+    return [multiaddr.Multiaddr(addr_str) for addr_str in addr_strs]
+
+
+def test_rank_addrs_by_class_and_history():
+    dialer = Dialer(FakeTransport({}))
+
+    ranked = dialer.rank_addrs(addrs(PUBLIC, "/ip4/8.8.8.8/udp/1", PRIVATE, LOOPBACK))
+    assert [str(addr) for addr in ranked] == \
+        [LOOPBACK, PRIVATE, PUBLIC, "/ip4/8.8.8.8/udp/1"]
+
+    dialer.addr_stats[LOOPBACK] = AddrStats()
+    dialer.addr_stats[LOOPBACK].record_failure()
+    dialer.addr_stats[PUBLIC] = AddrStats()
+    dialer.addr_stats[PUBLIC].record_success(0.01)
+    dialer.addr_stats[PRIVATE] = AddrStats()
+    dialer.addr_stats[PRIVATE].record_success(0.02)
+    ranked = dialer.rank_addrs(addrs(PUBLIC, PRIVATE, LOOPBACK))
+    assert [str(addr) for addr in ranked] == [PRIVATE, PUBLIC, LOOPBACK]
+
+
+@pytest.mark.asyncio
+async def test_addr_stats_are_bounded():
+    transport = FakeTransport({LOOPBACK: 0, PRIVATE: 0, PUBLIC: 0})
+    dialer = Dialer(transport, max_addr_stats=2)
+
+    for addr in addrs(LOOPBACK, PRIVATE, PUBLIC):
+        await dialer.dial([addr], "self")
+
+    # The address dialed longest ago is forgotten
+    assert sorted(dialer.addr_stats.keys()) == sorted([PRIVATE, PUBLIC])
+
+
+@pytest.mark.asyncio
+async def test_dial_falls_back_after_stagger_delay():
+    transport = FakeTransport({LOOPBACK: 10, PRIVATE: 0.01})
+    dialer = Dialer(transport, stagger_delay=0.05)
+
+    conn = await asyncio.wait_for(dialer.dial(addrs(PRIVATE, LOOPBACK), "self"), 1)
+
+    # The loopback address is dialed first, and cancelled once the
+    # private address connects
+    assert conn.addr == PRIVATE
+    assert transport.dialed == [LOOPBACK, PRIVATE]
+    await asyncio.sleep(0)
+    assert transport.cancelled == [LOOPBACK]
+
+
+@pytest.mark.asyncio
+async def test_losing_dial_is_not_counted_as_failed():
+    transport = FakeTransport({LOOPBACK: 10, PRIVATE: 0.01})
+    dialer = Dialer(transport, stagger_delay=0.05)
+
+    await asyncio.wait_for(dialer.dial(addrs(PRIVATE, LOOPBACK), "self"), 1)
+    await asyncio.sleep(0)
+
+    assert transport.cancelled == [LOOPBACK]
+    assert dialer.addr_stats[LOOPBACK].failures == 0
+    assert not dialer.addr_stats[LOOPBACK].last_failed
+    assert dialer.addr_backoff.get(LOOPBACK) is None
+
+
+@pytest.mark.asyncio
+async def test_cancelled_dial_does_not_back_off():
+    transport = FakeTransport({LOOPBACK: 10, PRIVATE: 10})
+    dialer = Dialer(transport, stagger_delay=0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(dialer.dial(addrs(PRIVATE, LOOPBACK), "self"), 0.05)
+    await asyncio.sleep(0)
+
+    assert sorted(transport.cancelled) == sorted([LOOPBACK, PRIVATE])
+    assert not dialer.addr_backoff.is_backing_off(LOOPBACK)
+    assert not dialer.addr_backoff.is_backing_off(PRIVATE)
+
+
+@pytest.mark.asyncio
+async def test_failed_dial_starts_next_without_delay():
+    transport = FakeTransport({PUBLIC: 0.01})
+    dialer = Dialer(transport, stagger_delay=10)
+
+    conn = await asyncio.wait_for(dialer.dial(addrs(PUBLIC, LOOPBACK), "self"), 1)
+
+    assert conn.addr == PUBLIC
+    assert dialer.addr_stats[LOOPBACK].last_failed
+    assert dialer.addr_stats[PUBLIC].successes == 1
+
+
+@pytest.mark.asyncio
+async def test_dial_timeout():
+    transport = FakeTransport({LOOPBACK: 10})
+    dialer = Dialer(transport, stagger_delay=0.01, dial_timeout=0.05)
+
+    with pytest.raises(DialError) as error:
+        await asyncio.wait_for(dialer.dial(addrs(LOOPBACK, PRIVATE), "self"), 1)
+
+    assert [str(addr) for addr, _ in error.value.errors] == [PRIVATE, LOOPBACK]
+    assert isinstance(error.value.errors[1][1], asyncio.TimeoutError)
+
+
+@pytest.mark.asyncio
+async def test_backoff_doubles_until_cleared():
+    backoff = DialBackoff(base=1, maximum=3, jitter=0, ttl=10)
+
+    assert [backoff.backoff("peer") for _ in range(4)] == [1, 2, 3, 3]
+    assert backoff.is_backing_off("peer")
+    assert backoff.get("peer").tries == 4
+
+    backoff.clear("peer")
+    assert not backoff.is_backing_off("peer")
+    assert backoff.backoff("peer") == 1
+
+    # Entries are forgotten once older than the TTL
+    now = asyncio.get_event_loop().time()
+    assert backoff.get("peer", now + 11) is None
+    assert "peer" not in backoff.entries
+
+
+@pytest.mark.asyncio
+async def test_dialer_skips_addresses_backing_off():
+    transport = FakeTransport({PRIVATE: 0.01})
+    dialer = Dialer(transport, stagger_delay=10)
+
+    conn = await asyncio.wait_for(dialer.dial(addrs(PRIVATE, LOOPBACK), "self"), 1)
+    assert conn.addr == PRIVATE
+    assert dialer.addr_backoff.is_backing_off(LOOPBACK)
+    assert dialer.addr_backoff.get(PRIVATE) is None
+
+    # The failed loopback address is not dialed again
+    transport.dialed.clear()
+    await asyncio.wait_for(dialer.dial(addrs(PRIVATE, LOOPBACK), "self"), 1)
+    assert transport.dialed == [PRIVATE]
+
+    with pytest.raises(DialBackoffError):
+        await dialer.dial(addrs(LOOPBACK), "self")
+    assert not transport.dialed[1:]
+
+
+@pytest.mark.asyncio
+async def test_listen_binds_every_multiaddr():
+    _, node_b = await set_up_two_nodes()
+    swarm_b = node_b.get_network()
+
+    udp_addr = multiaddr.Multiaddr("/ip4/127.0.0.1/udp/1")
+    assert await swarm_b.listen(multiaddr.Multiaddr("/ip4/127.0.0.2/tcp/0"),
+                                multiaddr.Multiaddr("/ip4/127.0.0.3/tcp/0"), udp_addr)
+
+    # The multiaddr without transport fails alone
+    assert str(udp_addr) not in swarm_b.listeners
+    listen_addrs = [str(addr) for addr in node_b.get_addrs()]
+    assert len(listen_addrs) == 3
+    assert any("/ip4/127.0.0.2/tcp/" in addr for addr in listen_addrs)
+    assert any("/ip4/127.0.0.3/tcp/" in addr for addr in listen_addrs)
+
+    await cleanup()
+
+
+def test_transport_registry_picks_transport_by_protocol():
+    registry = TransportRegistry()
+    tcp = FakeTransport({})
+    udp = FakeTransport({})
+    registry.add_transport("tcp", tcp)
+    registry.add_transport("udp", udp)
+
+    assert registry.get_transport(addrs(PUBLIC)[0]) is tcp
+    assert registry.get_transport(addrs("/ip4/8.8.8.8/udp/1")[0]) is udp
+    with pytest.raises(TransportNotFound):
+        registry.get_transport(addrs("/ip4/8.8.8.8/sctp/1")[0])
+    assert registry.can_dial(addrs(PUBLIC)[0])
+    assert not registry.can_dial(addrs("/ip4/8.8.8.8/sctp/1")[0])
+
+
+@pytest.mark.asyncio
+async def test_hosts_connect_over_ip6():
+    transport_opt_list = [["/ip6/::1/tcp/0"], ["/ip6/::1/tcp/0"]]
+    (node_a, node_b) = await set_up_nodes_by_transport_opt(transport_opt_list)
+    node_a.get_peerstore().add_addrs(node_b.get_id(), node_b.get_addrs(), 10)
+    assert all("/ip6/::1/tcp/" in str(addr) for addr in node_b.get_addrs())
+
+    async def echo(stream):
+        await stream.write(await stream.read())
+
+    node_b.set_stream_handler("/echo/1.0.0", echo)
+    stream = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"hello")
+    assert await asyncio.wait_for(stream.read(), 1) == b"hello"
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_new_stream_proposes_rejected_protocols_last():
+    node_a, node_b = await set_up_two_nodes()
+    swarm_a = node_a.get_network()
+    peerstore = node_a.get_peerstore()
+
+    async def handler(stream):
+        await stream.close()
+
+    node_b.set_stream_handler("/floodsub/1.0.0", handler)
+    client = swarm_a.multiselect_client
+    try_select = client.try_select
+    proposals = []
+
+    async def recording_try_select(communicator, protocol, read_handshake=None):
+        proposals.append(protocol)
+        return await try_select(communicator, protocol, read_handshake)
+
+    client.try_select = recording_try_select
+    protocol_ids = ["/meshsub/1.0.0", "/floodsub/1.0.0"]
+
+    stream = await node_a.new_stream(node_b.get_id(), protocol_ids)
+    assert stream.get_protocol() == "/floodsub/1.0.0"
+    assert proposals == protocol_ids
+    assert peerstore.get_protocols(node_b.get_id()) == ["/floodsub/1.0.0"]
+    assert peerstore.get_rejected_protocols(node_b.get_id()) == ["/meshsub/1.0.0"]
+
+    # The protocol known to be supported is proposed first, in one round trip
+    proposals.clear()
+    stream = await node_a.new_stream(node_b.get_id(), protocol_ids)
+    assert stream.get_protocol() == "/floodsub/1.0.0"
+    assert proposals == ["/floodsub/1.0.0"]
+
+    # A protocol no longer supported is rejected again, and forgotten
+    node_b.remove_stream_handler("/floodsub/1.0.0")
+    node_b.set_stream_handler("/meshsub/1.0.0", handler)
+    proposals.clear()
+    stream = await node_a.new_stream(node_b.get_id(), protocol_ids)
+    assert stream.get_protocol() == "/meshsub/1.0.0"
+    assert proposals == ["/floodsub/1.0.0", "/meshsub/1.0.0"]
+    assert peerstore.get_protocols(node_b.get_id()) == ["/meshsub/1.0.0"]
+    assert peerstore.get_rejected_protocols(node_b.get_id()) == ["/floodsub/1.0.0"]
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_broken_negotiation_rejects_no_protocols():
+    node_a, node_b = await set_up_two_nodes()
+    peerstore = node_a.get_peerstore()
+
+    async def reject_once_then_hang_up(stream):
+        communicator = MultiselectCommunicator(stream)
+        await communicator.read_stream_until_eof()
+        await communicator.read_stream_until_eof()
+        await communicator.write("/multistream/1.0.0")
+        await communicator.write("na")
+        await stream.close()
+        # Never answer the next proposal
+        await asyncio.Event().wait()
+
+    node_b.get_network().multiselect.negotiate = reject_once_then_hang_up
+
+    with pytest.raises(MultiselectClientError):
+        await node_a.new_stream(node_b.get_id(), ["/meshsub/1.0.0", "/floodsub/1.0.0"])
+    # The stream ended, which says nothing of the protocols it was proposing
+    assert peerstore.get_rejected_protocols(node_b.get_id()) == []
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_order_protocol_ids_promotes_supported_protocols():
+    node_a, node_b = await set_up_two_nodes()
+    swarm_a = node_a.get_network()
+    peerstore = node_a.get_peerstore()
+    peer_id = node_b.get_id()
+    protocol_ids = ["/a/1.0.0", "/b/1.0.0", "/c/1.0.0"]
+
+    assert swarm_a.order_protocol_ids(peer_id, protocol_ids) == protocol_ids
+
+    # Protocols learned to be supported, e.g. by identify, are proposed
+    # first, even ahead of more preferred ones whose support is unknown
+    peerstore.add_protocols(peer_id, ["/c/1.0.0"])
+    assert swarm_a.order_protocol_ids(peer_id, protocol_ids) == \
+        ["/c/1.0.0", "/a/1.0.0", "/b/1.0.0"]
+
+    # Among supported protocols the order of preference holds
+    peerstore.add_protocols(peer_id, ["/b/1.0.0"])
+    assert swarm_a.order_protocol_ids(peer_id, protocol_ids) == \
+        ["/b/1.0.0", "/c/1.0.0", "/a/1.0.0"]
+
+    peerstore.reject_protocols(peer_id, ["/a/1.0.0", "/b/1.0.0"])
+    assert swarm_a.order_protocol_ids(peer_id, protocol_ids) == \
+        ["/c/1.0.0", "/a/1.0.0", "/b/1.0.0"]
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_failed_lazy_negotiation_drops_supported_protocol():
+    node_a, node_b = await set_up_two_nodes()
+    swarm_a = node_a.get_network()
+    swarm_a.multiselect_client = MultiselectClient(lazy=True)
+    peerstore = node_a.get_peerstore()
+    peer_id = node_b.get_id()
+    peerstore.add_protocols(peer_id, ["/echo/1.0.0"])
+
+    # The peer no longer supports the protocol, which shows on the first read
+    stream = await node_a.new_stream(peer_id, ["/echo/1.0.0"])
+    with pytest.raises(MultiselectClientError):
+        await stream.read()
+    assert peerstore.get_protocols(peer_id) == []
+    assert peerstore.get_rejected_protocols(peer_id) == ["/echo/1.0.0"]
+
+    await cleanup()
@@ -56,3 +56,20 @@ def test_peers():
     store.add_addr("peer3", "/foo", 10)
 
     assert set(store.peers()) == set(["peer1", "peer2", "peer3"])
+
+
+def test_reject_protocols():
+    store = PeerStore()
+    store.add_protocols("peer1", ["p1", "p2"])
+    store.reject_protocols("peer1", ["p2", "p3"])
+
+    assert store.get_protocols("peer1") == ["p1"]
+    assert store.get_rejected_protocols("peer1") == ["p2", "p3"]
+
+    # Accepting a protocol again takes it out of the rejected protocols
+    store.add_protocols("peer1", ["p3", "p1"])
+    assert store.get_protocols("peer1") == ["p1", "p3"]
+    assert store.get_rejected_protocols("peer1") == ["p2"]
+
+    store.clear_rejected_protocols("peer1")
+    assert store.get_rejected_protocols("peer1") == []
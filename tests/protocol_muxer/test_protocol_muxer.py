@@ -1,7 +1,14 @@
+import asyncio
+
 import pytest
 
 from tests.utils import cleanup, set_up_nodes_by_transport_opt
-from libp2p.protocol_muxer.multiselect_client import MultiselectClientError
+from libp2p.protocol_muxer.multiselect import Multiselect, MultiselectProtocolNotFound, \
+    prefix_matcher, semver_matcher
+from libp2p.protocol_muxer.multiselect_client import MultiselectClient, MultiselectClientError, \
+    parse_ls_response
+from libp2p.protocol_muxer.multiselect_communicator import MultiselectCommunicator, \
+    MultiselectCommunicatorError, encode_message
 
 # TODO: Add tests for multiple streams being opened on different
 # protocols through the same connection
@@ -13,9 +20,12 @@ from libp2p.protocol_muxer.multiselect_client import MultiselectClientError
 
 
 async def perform_simple_test(expected_selected_protocol,
-                              protocols_for_client, protocols_with_handlers):
+                              protocols_for_client, protocols_with_handlers,
+                              multiselect_client=None):
     transport_opt_list = [["/ip4/127.0.0.1/tcp/0"], ["/ip4/127.0.0.1/tcp/0"]]
     (node_a, node_b) = await set_up_nodes_by_transport_opt(transport_opt_list)
+    if multiselect_client is not None:
+        node_a.get_network().multiselect_client = multiselect_client
 
     async def stream_handler(stream):
         while True:
@@ -93,3 +103,220 @@ async def test_multiple_protocol_fails():
 
     # Cleanup not reached on error
     await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_unpipelined_second_is_valid_succeeds():
+    protocols_for_client = ["/rock/1.0.0", "/foo/1.0.0"]
+    protocols_for_listener = ["/foo/1.0.0", "/echo/1.0.0"]
+    await perform_simple_test("/foo/1.0.0", protocols_for_client, protocols_for_listener,
+                              MultiselectClient(pipelined=False))
+
+
+@pytest.mark.asyncio
+async def test_lazy_single_protocol_succeeds():
+    await perform_simple_test("/echo/1.0.0", ["/echo/1.0.0"], ["/echo/1.0.0"],
+                              MultiselectClient(lazy=True))
+
+
+@pytest.mark.asyncio
+async def test_lazy_single_protocol_fails_on_read():
+    with pytest.raises(MultiselectClientError):
+        await perform_simple_test("", ["/echo/1.0.0"], ["/potato/1.0.0"],
+                                  MultiselectClient(lazy=True))
+
+    # Cleanup not reached on error
+    await cleanup()
+
+
+class RecordingPipe:
+    """
+    One end of an in-memory pipe of messages, recording what it does. Like
+    a raw connection, it keeps the messages written apart
+    """
+
+    frames_messages = True
+
+    def __init__(self, incoming, outgoing, log):
+        self.incoming = incoming
+        self.outgoing = outgoing
+        self.log = log
+
+    async def write(self, data):
+        self.log.append(("write", data.decode().rstrip("\n")))
+        await self.outgoing.put(data)
+
+    async def read(self):
+        data = await self.incoming.get()
+        self.log.append(("read", data.decode().rstrip("\n")))
+        return data
+
+
+def make_pipes():
+    log = []
+    to_responder, to_client = asyncio.Queue(), asyncio.Queue()
+    return (RecordingPipe(to_client, to_responder, log),
+            RecordingPipe(to_responder, to_client, []), log)
+
+
+@pytest.mark.asyncio
+async def test_pipelined_sends_proposal_with_handshake():
+    client_end, responder_end, log = make_pipes()
+    multiselect = Multiselect()
+    multiselect.add_handler("/echo/1.0.0", None)
+
+    selected, (protocol, _) = await asyncio.gather(
+        MultiselectClient().select_one_of(["/echo/1.0.0"], client_end),
+        multiselect.negotiate(responder_end))
+
+    assert selected == protocol == "/echo/1.0.0"
+    # Both messages are sent before anything is read, one round trip in all
+    assert log == [("write", "/multistream/1.0.0"), ("write", "/echo/1.0.0"),
+                   ("read", "/multistream/1.0.0"), ("read", "/echo/1.0.0")]
+
+
+@pytest.mark.asyncio
+async def test_pipelined_falls_back_to_other_protocols():
+    client_end, responder_end, _ = make_pipes()
+    multiselect = Multiselect()
+    multiselect.add_handler("/foo/1.0.0", None)
+
+    selected, (protocol, _) = await asyncio.gather(
+        MultiselectClient().select_one_of(["/rock/1.0.0", "/foo/1.0.0"], client_end),
+        multiselect.negotiate(responder_end))
+
+    assert selected == protocol == "/foo/1.0.0"
+
+
+@pytest.mark.asyncio
+async def test_lazy_writes_data_before_acknowledgement():
+    client_end, responder_end, log = make_pipes()
+    multiselect = Multiselect()
+    multiselect.add_handler("/echo/1.0.0", None)
+
+    negotiation = await MultiselectClient().select_lazily("/echo/1.0.0", client_end)
+    await client_end.write(b"hello")
+    assert all(op == "write" for op, _ in log)
+
+    protocol, _ = await multiselect.negotiate(responder_end)
+    assert protocol == "/echo/1.0.0"
+    assert await responder_end.read() == b"hello"
+
+    await negotiation.wait()
+    # Waiting again does not read anything more
+    await negotiation.wait()
+    assert [op for op, _ in log].count("read") == 2
+
+
+def test_find_handler_by_exact_prefix_and_semver_match():
+    multiselect = Multiselect()
+    multiselect.add_handler("/echo/1.0.0", "echo")
+    multiselect.add_handler_match("/meshsub/1.1.0", semver_matcher("/meshsub/1.1.0"), "meshsub")
+    multiselect.add_handler_match("/ipfs/", prefix_matcher("/ipfs/"), "ipfs")
+    multiselect.add_handler_match("/echo/", prefix_matcher("/echo/"), "echo prefix")
+
+    assert multiselect.find_handler("/echo/1.0.0") == "echo"
+    assert multiselect.find_handler("/echo/2.0.0") == "echo prefix"
+    assert multiselect.find_handler("/meshsub/1.0.0") == "meshsub"
+    assert multiselect.find_handler("/meshsub/1.1") == "meshsub"
+    assert multiselect.find_handler("/ipfs/kad/1.0.0") == "ipfs"
+    for protocol_id in ["/meshsub/1.2.0", "/meshsub/2.0.0", "/meshsub/beta", "/potato"]:
+        with pytest.raises(MultiselectProtocolNotFound):
+            multiselect.find_handler(protocol_id)
+
+    # Matches are cached, until the handlers change
+    assert multiselect.match_cache["/ipfs/kad/1.0.0"] == "ipfs"
+    multiselect.remove_handler("/ipfs/")
+    assert not multiselect.match_cache
+    with pytest.raises(MultiselectProtocolNotFound):
+        multiselect.find_handler("/ipfs/kad/1.0.0")
+
+
+@pytest.mark.asyncio
+async def test_semver_matched_handler_succeeds():
+    transport_opt_list = [["/ip4/127.0.0.1/tcp/0"], ["/ip4/127.0.0.1/tcp/0"]]
+    (node_a, node_b) = await set_up_nodes_by_transport_opt(transport_opt_list)
+    node_a.get_peerstore().add_addrs(node_b.get_id(), node_b.get_addrs(), 10)
+
+    async def stream_handler(stream):
+        await stream.write(stream.get_protocol().encode())
+
+    node_b.set_stream_handler_match("/meshsub/1.1.0", semver_matcher("/meshsub/1.1.0"),
+                                    stream_handler)
+
+    stream = await node_a.new_stream(node_b.get_id(), ["/meshsub/1.2.0", "/meshsub/1.0.0"])
+    assert stream.get_protocol() == "/meshsub/1.0.0"
+    # The handler is told which of the matched protocols was selected
+    assert await stream.read() == b"/meshsub/1.0.0"
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_ls_lists_protocols():
+    client_end, responder_end, _ = make_pipes()
+    multiselect = Multiselect()
+    multiselect.add_handler("/echo/1.0.0", None)
+    multiselect.add_handler_match("/ipfs/", prefix_matcher("/ipfs/"), None)
+    client = MultiselectClient()
+
+    async def list_then_select():
+        protocols = await client.list_protocols(client_end)
+        await client.try_select(MultiselectCommunicator(client_end), protocols[0])
+        return protocols
+
+    protocols, (protocol, _) = await asyncio.gather(
+        list_then_select(), multiselect.negotiate(responder_end))
+
+    assert protocols == ["/echo/1.0.0", "/ipfs/"]
+    assert protocol == "/echo/1.0.0"
+    # The response is built once and reused
+    assert multiselect.get_ls_response() is multiselect.get_ls_response()
+
+
+class ByteStream:
+    """
+    Stream of bytes, with no message boundaries kept
+    """
+
+    def __init__(self, data):
+        self.reader = asyncio.StreamReader()
+        self.reader.feed_data(data)
+        self.reader.feed_eof()
+        self.written = b""
+
+    async def write(self, data):
+        self.written += data
+
+    async def read(self, n=-1):
+        return await self.reader.read(n)
+
+    async def readexactly(self, n):
+        return await self.reader.readexactly(n)
+
+
+@pytest.mark.asyncio
+async def test_messages_are_varint_length_prefixed_lines():
+    assert encode_message("/echo/1.0.0") == b"\x0c/echo/1.0.0\n"
+    # Encoded messages are cached
+    assert encode_message("/echo/1.0.0") is encode_message("/echo/1.0.0")
+
+    stream = ByteStream(b"\x13/multistream/1.0.0\n\x03na\n" + b"\x02\xff\n" + b"\x02ok")
+    communicator = MultiselectCommunicator(stream)
+    await communicator.write("/echo/1.0.0")
+    assert stream.written == b"\x0c/echo/1.0.0\n"
+
+    assert await communicator.read_stream_until_eof() == "/multistream/1.0.0"
+    assert await communicator.read_stream_until_eof() == "na"
+    with pytest.raises(MultiselectCommunicatorError):
+        await communicator.read_stream_until_eof()
+    with pytest.raises(MultiselectCommunicatorError):
+        await communicator.read_stream_until_eof()
+    assert await communicator.read_stream_until_eof() == ""
+
+
+def test_malformed_ls_response_is_rejected():
+    assert parse_ls_response(b"\x05/a/1\n\x05/b/2\n") == ["/a/1", "/b/2"]
+    for response in (b"\x05/a/1", b"\x05/a/1x", b"\x03\xff\xfe\n", b"\x80"):
+        with pytest.raises(MultiselectClientError):
+            parse_ls_response(response)
@@ -2,6 +2,7 @@ import asyncio
 import pytest
 import random
 
+from libp2p.peer.id import id_b58_decode
 from libp2p.pubsub.gossipsub import GossipSub
 from libp2p.pubsub.floodsub import FloodSub
 from libp2p.pubsub.pb import rpc_pb2
@@ -269,3 +270,51 @@ async def test_gossip_propagation():
     assert msg.SerializeToString() == packet.publish[0].SerializeToString()
 
     await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_mesh_peers_are_protected():
+    libp2p_hosts = await create_libp2p_hosts(3)
+    pubsubs, gossipsubs = create_pubsub_and_gossipsub_instances(libp2p_hosts, \
+                                                                SUPPORTED_PROTOCOLS, \
+                                                                2, 1, 3, 30, 3, 5, 0.5)
+    for pubsub in pubsubs:
+        await pubsub.subscribe("foobar")
+    await dense_connect(libp2p_hosts)
+
+    # Wait for heartbeat to allow mesh to connect
+    await asyncio.sleep(2)
+
+    connection_manager = libp2p_hosts[0].get_network().connection_manager
+    mesh = gossipsubs[0].mesh["foobar"]
+    assert mesh
+    for peer in mesh:
+        assert connection_manager.is_protected(id_b58_decode(peer))
+
+    # Leaving the topic lifts the protection
+    await gossipsubs[0].leave("foobar")
+    for peer in mesh:
+        assert not connection_manager.is_protected(id_b58_decode(peer))
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_repeated_graft_adds_peer_once():
+    libp2p_hosts = await create_libp2p_hosts(2)
+    _, gossipsubs = create_pubsub_and_gossipsub_instances(libp2p_hosts, \
+                                                          SUPPORTED_PROTOCOLS, \
+                                                          2, 1, 3, 30, 3, 5, 100)
+    gossipsub = gossipsubs[0]
+    connection_manager = libp2p_hosts[0].get_network().connection_manager
+    peer = str(libp2p_hosts[1].get_id())
+
+    for _ in range(2):
+        await gossipsub.handle_graft(rpc_pb2.ControlGraft(topicID="foobar"), peer)
+    assert gossipsub.mesh["foobar"] == [peer]
+    assert connection_manager.is_protected(libp2p_hosts[1].get_id())
+
+    # A single prune takes the peer out of the mesh and lifts its protection
+    await gossipsub.handle_prune(rpc_pb2.ControlPrune(topicID="foobar"), peer)
+    assert gossipsub.mesh["foobar"] == []
+    assert not connection_manager.is_protected(libp2p_hosts[1].get_id())
+    await cleanup()
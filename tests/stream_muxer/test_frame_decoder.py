@@ -0,0 +1,50 @@
+import pytest
+
+from libp2p.stream_muxer.mplex.frame_decoder import FrameDecoder, MplexFrameError
+from libp2p.stream_muxer.mplex.utils import encode_uvarint
+
+
+def encode_frame(stream_id, flag, message):
+    return encode_uvarint(stream_id << 3 | flag) + encode_uvarint(len(message)) + message
+
+
+def test_decodes_multiple_frames_in_one_chunk():
+    decoder = FrameDecoder()
+    data = encode_frame(1, 0, b"") + encode_frame(1, 2, b"hello") + encode_frame(300, 2, b"x" * 200)
+
+    frames = decoder.feed(data)
+
+    assert frames == [(1, 0, b""), (1, 2, b"hello"), (300, 2, b"x" * 200)]
+    assert decoder.buffered_size() == 0
+
+
+def test_keeps_partial_frames_until_complete():
+    decoder = FrameDecoder()
+    data = encode_frame(5, 2, b"a" * 300) + encode_frame(7, 4, b"")
+
+    frames = []
+    for i in range(len(data)):
+        frames.extend(decoder.feed(data[i:i + 1]))
+
+    assert frames == [(5, 2, b"a" * 300), (7, 4, b"")]
+    assert decoder.buffered_size() == 0
+
+
+def test_rejects_oversized_frame():
+    decoder = FrameDecoder(max_message_size=10)
+
+    with pytest.raises(MplexFrameError):
+        decoder.feed(encode_frame(1, 2, b"y" * 11))
+
+
+def test_only_large_messages_are_slices_of_the_chunk_read():
+    decoder = FrameDecoder()
+    data = encode_frame(1, 2, b"hello") + encode_frame(3, 2, b"a" * 100)
+
+    frames = decoder.feed(data[:50])
+    frames += decoder.feed(data[50:])
+
+    assert [bytes(message) for _, _, message in frames] == [b"hello", b"a" * 100]
+    # The short message is copied out of the chunk, so it does not keep it alive
+    assert isinstance(frames[0][2], bytes)
+    assert isinstance(frames[1][2], memoryview)
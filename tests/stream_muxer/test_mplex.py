@@ -0,0 +1,379 @@
+import asyncio
+import os
+import pytest
+
+from libp2p.network.resource_manager import ResourceManager
+from libp2p.network.stream.net_stream import NetStream
+from libp2p.stream_muxer.mplex.constants import MAX_MESSAGE_SIZE, WRITE_QUANTUM, \
+    WRITE_STREAM_HIGH_WATER
+from libp2p.stream_muxer.mplex.mplex import Mplex
+from libp2p.stream_muxer.mplex.mplex_stream import MplexStreamClosed, MplexStreamReset
+from libp2p.tools.connections import create_muxer_pair
+from tests.utils import echo_stream_handler
+
+
+@pytest.mark.asyncio
+async def test_reader_blocks_while_idle():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex)
+
+    await asyncio.sleep(0.3)
+
+    assert not mplex_a.reader_task.done()
+    assert not mplex_b.reader_task.done()
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_close_stops_reader():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex)
+
+    mplex_a.close()
+    await asyncio.sleep(0)
+
+    assert mplex_a.is_closed()
+    assert mplex_a.reader_task.cancelled()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_peer_hang_up_closes_muxer():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex)
+
+    mplex_a.close()
+    await asyncio.wait_for(mplex_b.reader_task, timeout=1)
+
+    assert mplex_b.is_closed()
+
+
+@pytest.mark.asyncio
+async def test_stream_exceeding_window_is_reset():
+    accepted = asyncio.Queue()
+
+    async def handler(stream):
+        await accepted.put(stream)
+
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=handler, stream_window_size=10)
+    slow_stream = await mplex_a.open_stream("/slow/1.0.0", None)
+    other_stream = await mplex_a.open_stream("/other/1.0.0", None)
+    slow_stream_b = await accepted.get()
+    other_stream_b = await accepted.get()
+
+    await slow_stream.write(b"x" * 8)
+    await slow_stream.write(b"y" * 8)
+    await other_stream.write(b"hello")
+
+    # The slow stream is reset without holding up the other stream
+    assert await asyncio.wait_for(other_stream_b.read(), 1) == b"hello"
+    assert await slow_stream_b.read() == b"x" * 8
+    with pytest.raises(MplexStreamReset):
+        await slow_stream_b.read()
+    with pytest.raises(MplexStreamReset):
+        await asyncio.wait_for(slow_stream.read(), 1)
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_frames_queued_together_are_written_together():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex)
+    streams = [await mplex_a.open_stream("/echo/1.0.0", None) for _ in range(10)]
+    await asyncio.sleep(0.1)
+
+    writer = mplex_a.raw_conn.writer
+    batches = []
+    writelines = writer.writelines
+
+    def record_writelines(buffers):
+        batches.append(buffers)
+        writelines(buffers)
+
+    writer.writelines = record_writelines
+
+    await asyncio.gather(*[
+        stream.write(("%d-%d" % (i, j)).encode())
+        for j in range(5) for i, stream in enumerate(streams)
+    ])
+    await asyncio.sleep(0.1)
+
+    assert len(batches) == 1
+    for i, stream in enumerate(streams):
+        for j in range(5):
+            message = await asyncio.wait_for(mplex_b.read_buffer(stream.stream_id), 1)
+            assert message == ("%d-%d" % (i, j)).encode()
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_write_waits_at_most_max_write_delay():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, max_write_delay=0.05)
+    stream = await mplex_a.open_stream("/echo/1.0.0", None)
+    await asyncio.sleep(0.1)
+
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    await stream.write(b"hello")
+
+    assert await asyncio.wait_for(mplex_b.read_buffer(stream.stream_id), 1) == b"hello"
+    assert 0.04 < loop.time() - start < 0.5
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_large_payload_is_split_into_frames():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, stream_window_size=4 * MAX_MESSAGE_SIZE)
+    stream = await mplex_a.open_stream("/echo/1.0.0", None)
+    payload = bytearray(os.urandom(2 * MAX_MESSAGE_SIZE + 10))
+
+    await stream.write(memoryview(payload))
+
+    received = b""
+    while len(received) < len(payload):
+        received += await asyncio.wait_for(mplex_b.read_buffer(stream.stream_id), 1)
+    assert received == payload
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_small_frames_are_not_held_back_by_bulk_stream():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, stream_window_size=16 * MAX_MESSAGE_SIZE)
+    bulk_stream = await mplex_a.open_stream("/bulk/1.0.0", None)
+    control_stream = await mplex_a.open_stream("/control/1.0.0", None)
+    await asyncio.sleep(0.1)
+
+    writer = mplex_a.raw_conn.writer
+    written = []
+    writelines = writer.writelines
+
+    def record_writelines(buffers):
+        if any(len(buffer) == 4 and buffer == b"ping" for buffer in buffers):
+            written.append(mplex_a.write_queue_size)
+        writelines(buffers)
+
+    writer.writelines = record_writelines
+
+    await bulk_stream.write(bytes(8 * MAX_MESSAGE_SIZE))
+    await asyncio.sleep(0)
+    # Only the writer of the stream with a backlog waits for it to be written
+    await asyncio.wait_for(control_stream.write(b"ping"), 1)
+    assert mplex_a.write_queue_size > 4 * MAX_MESSAGE_SIZE
+
+    # The control frame went out while most of the bulk write was still queued
+    assert await asyncio.wait_for(mplex_b.read_buffer(control_stream.stream_id), 1) == b"ping"
+    assert written[0] > 4 * MAX_MESSAGE_SIZE
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_writer_waits_for_backlog_of_its_stream():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex)
+    stream = await mplex_a.open_stream("/echo/1.0.0", None)
+    await asyncio.sleep(0.1)
+
+    # Under the high water mark the write returns once queued
+    mplex_a.queue_frames(stream.stream_id, [(bytes(WRITE_STREAM_HIGH_WATER),)])
+    await stream.write(b"x")
+    assert mplex_a.write_queue_sizes[stream.stream_id] > WRITE_STREAM_HIGH_WATER
+
+    # Over it, the write waits until everything queued for the stream is written
+    await stream.write(b"y")
+    assert mplex_a.write_queue_sizes[stream.stream_id] == 0
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_bandwidth_is_shared_by_priority():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex)
+    low_stream = await mplex_a.open_stream("/low/1.0.0", None)
+    high_stream = await mplex_a.open_stream("/high/1.0.0", None)
+    await asyncio.sleep(0.1)
+    high_stream.set_priority(3)
+    with pytest.raises(ValueError):
+        low_stream.set_priority(0)
+
+    # Queue frames of exactly one quantum each, then batch them before the
+    # writer gets to run
+    low_frame = b"l" * WRITE_QUANTUM
+    high_frame = b"h" * WRITE_QUANTUM
+    mplex_a.queue_frames(low_stream.stream_id, [(low_frame,)] * 8)
+    mplex_a.queue_frames(high_stream.stream_id, [(high_frame,)] * 8)
+    buffers, _ = mplex_a.next_batch()
+
+    assert buffers == [low_frame, high_frame, high_frame, high_frame]
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+async def open_accepted_pair(mplex_a, accepted):
+    stream_a = await mplex_a.open_stream("/echo/1.0.0", None)
+    stream_b = await asyncio.wait_for(accepted.get(), 1)
+    return stream_a, stream_b
+
+
+@pytest.mark.asyncio
+async def test_close_signals_eof_and_allows_writing_back():
+    accepted = asyncio.Queue()
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=accepted.put)
+    stream_a, stream_b = await open_accepted_pair(mplex_a, accepted)
+
+    await stream_a.write(b"request")
+    await stream_a.close()
+    with pytest.raises(MplexStreamClosed):
+        await stream_a.write(b"more")
+
+    assert await asyncio.wait_for(stream_b.read(), 1) == b"request"
+    assert await asyncio.wait_for(stream_b.read(), 1) == b""
+    assert stream_b.remote_closed
+
+    # Half-closed: the other direction still works
+    await stream_b.write(b"response")
+    assert await asyncio.wait_for(stream_a.read(), 1) == b"response"
+    assert stream_a.stream_id in mplex_a.streams
+
+    await stream_b.close()
+    assert await asyncio.wait_for(stream_a.read(), 1) == b""
+    assert not mplex_a.streams
+    assert not mplex_b.streams
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_reset_fails_both_ends_and_removes_state():
+    accepted = asyncio.Queue()
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=accepted.put)
+    stream_a, stream_b = await open_accepted_pair(mplex_a, accepted)
+
+    await stream_b.reset()
+
+    with pytest.raises(MplexStreamReset):
+        await asyncio.wait_for(stream_a.read(), 1)
+    with pytest.raises(MplexStreamReset):
+        await stream_b.read()
+    with pytest.raises(MplexStreamClosed):
+        await stream_a.write(b"data")
+    assert not mplex_a.streams
+    assert not mplex_b.streams
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_connection_close_resets_open_streams():
+    accepted = asyncio.Queue()
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=accepted.put)
+    stream_a, stream_b = await open_accepted_pair(mplex_a, accepted)
+
+    mplex_a.close()
+
+    with pytest.raises(MplexStreamReset):
+        await stream_a.read()
+    with pytest.raises(MplexStreamReset):
+        await asyncio.wait_for(stream_b.read(), 1)
+    assert not mplex_b.streams
+
+
+@pytest.mark.asyncio
+async def test_stream_opened_on_closed_connection_is_forgotten():
+    resource_manager = ResourceManager()
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, resource_manager=resource_manager)
+    mplex_a.close()
+    mplex_b.close()
+
+    with pytest.raises(ConnectionResetError):
+        await mplex_a.open_stream("/echo/1.0.0", None)
+    assert not mplex_a.streams
+    assert resource_manager.system.streams == 0
+
+
+@pytest.mark.asyncio
+async def test_closed_streams_are_reclaimed():
+    async def close_handler(stream):
+        assert await stream.read() == b""
+        await stream.close()
+
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=close_handler)
+
+    for _ in range(2000):
+        stream = await mplex_a.open_stream("/echo/1.0.0", None)
+        await stream.close()
+        assert await asyncio.wait_for(stream.read(), 1) == b""
+
+    assert not mplex_a.streams
+    assert not mplex_b.streams
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_echoed_streams_are_reclaimed():
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=echo_stream_handler)
+
+    for i in range(200):
+        stream = await mplex_a.open_stream("/echo/1.0.0", None)
+        await stream.write(str(i).encode())
+        assert await asyncio.wait_for(stream.read(), 1) == ("ack:%d" % i).encode()
+        await stream.close()
+        assert await asyncio.wait_for(stream.read(), 1) == b""
+
+    assert not mplex_a.streams
+    assert not mplex_b.streams
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_read_n_bytes_across_messages():
+    accepted = asyncio.Queue()
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=accepted.put)
+    stream_a, stream_b = await open_accepted_pair(mplex_a, accepted)
+
+    await stream_a.write(b"\x00\x05hel")
+    await stream_a.write(b"lo line one\nline")
+    await stream_a.write(b" two\n")
+
+    length = int.from_bytes(await asyncio.wait_for(stream_b.readexactly(2), 1), "big")
+    assert await stream_b.readexactly(length) == b"hello"
+    assert await stream_b.readuntil() == b" line one\n"
+    assert await stream_b.read(3) == b"lin"
+    assert await stream_b.readuntil(b"\n") == b"e two\n"
+
+    mplex_a.close()
+    mplex_b.close()
+
+
+@pytest.mark.asyncio
+async def test_read_deadline():
+    accepted = asyncio.Queue()
+    mplex_a, mplex_b = await create_muxer_pair(Mplex, handler_b=accepted.put)
+    stream_a, stream_b = await open_accepted_pair(mplex_a, accepted)
+    net_stream = NetStream(stream_b)
+
+    net_stream.set_read_deadline(0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        await net_stream.read()
+
+    # Data is not lost by a read that timed out
+    await stream_a.write(b"late")
+    assert await net_stream.read() == b"late"
+
+    net_stream.set_read_deadline(None)
+    await stream_a.write(b"no deadline")
+    assert await net_stream.read() == b"no deadline"
+
+    mplex_a.close()
+    mplex_b.close()
@@ -0,0 +1,106 @@
+import asyncio
+import multiaddr
+import pytest
+
+from libp2p import new_node
+from libp2p.peer.peerinfo import info_from_p2p_addr
+from libp2p.protocol_muxer.multiselect_client import MultiselectClientError
+from libp2p.stream_muxer.mplex.mplex import Mplex
+from libp2p.stream_muxer.yamux.yamux import Yamux
+from tests.utils import cleanup
+
+
+MPLEX = "/mplex/6.7.0"
+YAMUX = "/yamux/1.0.0"
+
+
+async def perform_simple_test(expected_muxer, muxers_for_initiator, muxers_for_noninitiator):
+    node1 = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"],
+                           muxer_opt=muxers_for_initiator)
+    node2 = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"],
+                           muxer_opt=muxers_for_noninitiator)
+
+    await node2.get_network().listen(multiaddr.Multiaddr("/ip4/127.0.0.1/tcp/0"))
+    node2.set_stream_handler("/echo/1.0.0", echo)
+
+    info = info_from_p2p_addr(node2.get_addrs()[0])
+    await node1.connect(info)
+
+    # Wait a very short period to allow conns to be stored on the listener
+    await asyncio.sleep(0.1)
+
+    node1_conn = node1.get_network().connections[node2.get_id()]
+    node2_conn = node2.get_network().connections[node1.get_id()]
+    assert isinstance(node1_conn, expected_muxer)
+    assert isinstance(node2_conn, expected_muxer)
+
+    # The negotiated muxer carries streams
+    stream = await node1.new_stream(node2.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"hello")
+    assert await stream.read() == b"hello"
+
+    await cleanup()
+
+
+async def echo(stream):
+    while True:
+        data = await stream.read()
+        if not data:
+            break
+        await stream.write(data)
+
+
+@pytest.mark.asyncio
+async def test_default_muxer_is_mplex():
+    await perform_simple_test(Mplex, None, None)
+
+
+@pytest.mark.asyncio
+async def test_single_yamux_succeeds():
+    await perform_simple_test(Yamux, {YAMUX: Yamux}, {YAMUX: Yamux})
+
+
+@pytest.mark.asyncio
+async def test_initiator_preference_wins():
+    await perform_simple_test(Yamux, {YAMUX: Yamux, MPLEX: Mplex},
+                              {MPLEX: Mplex, YAMUX: Yamux})
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_muxer_supported_by_both():
+    await perform_simple_test(Mplex, {YAMUX: Yamux, MPLEX: Mplex}, {MPLEX: Mplex})
+
+
+@pytest.mark.asyncio
+async def test_no_common_muxer_fails():
+    node1 = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"],
+                           muxer_opt={YAMUX: Yamux})
+    node2 = await new_node(transport_opt=["/ip4/127.0.0.1/tcp/0"],
+                           muxer_opt={MPLEX: Mplex})
+    await node2.get_network().listen(multiaddr.Multiaddr("/ip4/127.0.0.1/tcp/0"))
+
+    # Keep the raw conns of both ends to check they are closed
+    raw_conns = []
+    for node in (node1, node2):
+        upgrader = node.get_network().upgrader
+        upgrade_security = upgrader.upgrade_security
+
+        async def record_raw_conn(raw_conn, peer_id, initiator,
+                                  upgrade_security=upgrade_security):
+            raw_conns.append(raw_conn)
+            return await upgrade_security(raw_conn, peer_id, initiator)
+        upgrader.upgrade_security = record_raw_conn
+
+    info = info_from_p2p_addr(node2.get_addrs()[0])
+    with pytest.raises(MultiselectClientError):
+        await node1.connect(info)
+
+    # Wait a very short period to allow the listener to give up as well
+    await asyncio.sleep(0.1)
+
+    assert len(raw_conns) == 2
+    assert all(raw_conn.writer.is_closing() for raw_conn in raw_conns)
+    assert not node1.get_network().connections
+    assert not node2.get_network().connections
+
+    await cleanup()
@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+
+from libp2p.stream_muxer.stream_buffer import StreamBuffer
+
+
+@pytest.mark.asyncio
+async def test_put_refuses_data_beyond_max_size():
+    buffer = StreamBuffer(10)
+
+    assert buffer.put(b"a" * 6)
+    assert not buffer.put(b"b" * 5)
+    assert buffer.available() == 4
+
+    assert await buffer.get() == b"a" * 6
+    assert buffer.put(b"b" * 5)
+
+
+@pytest.mark.asyncio
+async def test_get_waits_for_data():
+    buffer = StreamBuffer(10)
+    task = asyncio.ensure_future(buffer.get())
+    await asyncio.sleep(0)
+    assert not task.done()
+
+    buffer.put(b"hi")
+
+    assert await task == b"hi"
+
+
+@pytest.mark.asyncio
+async def test_exception_raised_after_buffered_data():
+    buffer = StreamBuffer(10)
+    buffer.put(b"last")
+    buffer.set_exception(ConnectionResetError())
+
+    assert await buffer.get() == b"last"
+    with pytest.raises(ConnectionResetError):
+        await buffer.get()
+
+
+@pytest.mark.asyncio
+async def test_read_joins_chunks_up_to_n_bytes():
+    buffer = StreamBuffer(100)
+    buffer.put(b"abc")
+    buffer.put(memoryview(b"defgh"))
+
+    assert await buffer.read(5) == b"abcde"
+    assert await buffer.read(10) == b"fgh"
+    assert buffer.size == 0
+
+
+@pytest.mark.asyncio
+async def test_readexactly_waits_for_enough_data():
+    buffer = StreamBuffer(100)
+    buffer.put(b"ab")
+    task = asyncio.ensure_future(buffer.readexactly(4))
+    await asyncio.sleep(0)
+    assert not task.done()
+
+    buffer.put(b"cdef")
+
+    assert await task == b"abcd"
+    assert await buffer.get() == b"ef"
+
+
+@pytest.mark.asyncio
+async def test_readexactly_raises_at_eof():
+    buffer = StreamBuffer(100)
+    buffer.put(b"ab")
+    buffer.feed_eof()
+
+    with pytest.raises(asyncio.IncompleteReadError) as error:
+        await buffer.readexactly(4)
+    assert error.value.partial == b"ab"
+    assert await buffer.read(4) == b""
+
+
+@pytest.mark.asyncio
+async def test_readuntil_finds_separator_across_chunks():
+    buffer = StreamBuffer(100)
+    buffer.put(b"first\r")
+    task = asyncio.ensure_future(buffer.readuntil(b"\r\n"))
+    await asyncio.sleep(0)
+    assert not task.done()
+
+    buffer.put(b"\nsecond\r\n")
+
+    assert await task == b"first\r\n"
+    assert await buffer.readuntil(b"\r\n") == b"second\r\n"
+
+
+@pytest.mark.asyncio
+async def test_readuntil_raises_when_full_without_separator():
+    buffer = StreamBuffer(4)
+    buffer.put(b"abcd")
+
+    with pytest.raises(asyncio.LimitOverrunError):
+        await buffer.readuntil(b"\n")
+
+
+@pytest.mark.asyncio
+async def test_readuntil_searches_each_chunk_once():
+    buffer = StreamBuffer(1000)
+    task = asyncio.ensure_future(buffer.readuntil(b"END"))
+    for data in (b"abc", memoryview(b"dE"), b"N", b"xE"):
+        buffer.put(data)
+        await asyncio.sleep(0)
+        assert not task.done()
+
+    buffer.put(b"ND")
+    buffer.put(b"rest")
+
+    assert await task == b"abcdENxEND"
+    assert await buffer.readuntil(b"t") == b"rest"
+
+
+@pytest.mark.asyncio
+async def test_exception_raised_over_partial_data():
+    buffer = StreamBuffer(100)
+    buffer.put(b"ab")
+    buffer.set_exception(ConnectionResetError())
+
+    with pytest.raises(ConnectionResetError):
+        await buffer.readexactly(4)
+    with pytest.raises(ConnectionResetError):
+        await buffer.readuntil(b"\n")
+    assert await buffer.read(4) == b"ab"
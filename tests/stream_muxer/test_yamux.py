@@ -0,0 +1,220 @@
+import asyncio
+import os
+import pytest
+
+from libp2p.network.stream.net_stream import NetStream
+from libp2p.stream_muxer.yamux.constants import FRAME_TYPES, INITIAL_WINDOW_SIZE
+from libp2p.stream_muxer.yamux.frame_decoder import FrameDecoder, encode_header
+from libp2p.stream_muxer.yamux.yamux import Yamux, YamuxError
+from libp2p.stream_muxer.yamux.yamux_stream import YamuxStreamClosed, YamuxStreamReset
+from libp2p.tools.connections import create_muxer_pair
+
+
+async def open_accepted_pair(yamux_a, accepted):
+    stream = await yamux_a.open_stream("/test/1.0.0", None)
+    return stream, await asyncio.wait_for(accepted.get(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_stream_ids_by_role():
+    accepted = asyncio.Queue()
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=accepted.put,
+                                               handler_a=accepted.put)
+
+    stream_a = await yamux_a.open_stream("/test/1.0.0", None)
+    stream_b = await yamux_b.open_stream("/test/1.0.0", None)
+
+    assert stream_a.stream_id % 2 == 1
+    assert stream_b.stream_id % 2 == 0
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_echo():
+    async def echo(stream):
+        while True:
+            data = await stream.read()
+            if not data:
+                break
+            await stream.write(data)
+        await stream.close()
+
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=echo)
+    stream = NetStream(await yamux_a.open_stream("/echo/1.0.0", None))
+
+    for message in (b"hello", b"world", os.urandom(1000)):
+        await stream.write(message)
+        assert await stream.readexactly(len(message)) == message
+    assert stream.muxed_conn is yamux_a
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_set_priority_is_accepted_and_ignored():
+    yamux_a, yamux_b = await create_muxer_pair(Yamux)
+    stream = NetStream(await yamux_a.open_stream("/test/1.0.0", None))
+
+    assert stream.set_priority(4)
+    with pytest.raises(ValueError):
+        stream.set_priority(0)
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_writer_blocks_until_window_update():
+    accepted = asyncio.Queue()
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=accepted.put)
+    stream, stream_b = await open_accepted_pair(yamux_a, accepted)
+
+    payload = os.urandom(INITIAL_WINDOW_SIZE + 1000)
+    write = asyncio.ensure_future(stream.write(payload))
+    await asyncio.sleep(0.2)
+
+    # The reader has not consumed anything, so the whole window is in use
+    assert not write.done()
+    assert stream.send_window == 0
+
+    received = b""
+    while len(received) < len(payload):
+        received += await stream_b.read(len(payload))
+    assert await asyncio.wait_for(write, timeout=1) == len(payload)
+    assert received == payload
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_does_not_block_others():
+    accepted = asyncio.Queue()
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=accepted.put)
+    slow_stream, _ = await open_accepted_pair(yamux_a, accepted)
+    fast_stream, fast_stream_b = await open_accepted_pair(yamux_a, accepted)
+
+    blocked = asyncio.ensure_future(slow_stream.write(b"x" * (2 * INITIAL_WINDOW_SIZE)))
+    await fast_stream.write(b"hello")
+
+    assert await asyncio.wait_for(fast_stream_b.read(), timeout=1) == b"hello"
+    assert not blocked.done()
+    blocked.cancel()
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_larger_stream_window():
+    accepted = asyncio.Queue()
+    window = 4 * INITIAL_WINDOW_SIZE
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=accepted.put,
+                                               stream_window_size=window)
+    stream, stream_b = await open_accepted_pair(yamux_a, accepted)
+    await asyncio.sleep(0.1)
+
+    # Both ends advertised the larger window when opening the stream
+    assert stream.send_window == window
+    assert stream_b.send_window == window
+    await asyncio.wait_for(stream.write(b"x" * window), timeout=1)
+    assert len(await stream_b.readexactly(window)) == window
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_close_sends_eof_and_keeps_other_direction():
+    accepted = asyncio.Queue()
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=accepted.put)
+    stream, stream_b = await open_accepted_pair(yamux_a, accepted)
+
+    await stream.write(b"request")
+    await stream.close()
+
+    assert await stream_b.read() == b"request"
+    assert await asyncio.wait_for(stream_b.read(), timeout=1) == b""
+    with pytest.raises(YamuxStreamClosed):
+        await stream.write(b"more")
+
+    await stream_b.write(b"response")
+    assert await stream.read() == b"response"
+    await stream_b.close()
+    await asyncio.sleep(0.1)
+
+    assert stream.stream_id not in yamux_a.streams
+    assert stream_b.stream_id not in yamux_b.streams
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_reset_fails_reader():
+    accepted = asyncio.Queue()
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=accepted.put)
+    stream, stream_b = await open_accepted_pair(yamux_a, accepted)
+
+    read = asyncio.ensure_future(stream_b.read())
+    await stream.reset()
+
+    with pytest.raises(YamuxStreamReset):
+        await asyncio.wait_for(read, timeout=1)
+    assert stream.stream_id not in yamux_a.streams
+    assert stream_b.stream_id not in yamux_b.streams
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_ping():
+    yamux_a, yamux_b = await create_muxer_pair(Yamux)
+
+    rtt = await yamux_a.ping()
+
+    assert 0 <= rtt < 1
+    assert not yamux_a.pings
+    yamux_a.close()
+    yamux_b.close()
+
+
+@pytest.mark.asyncio
+async def test_go_away_refuses_new_streams():
+    accepted = asyncio.Queue()
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, handler_b=accepted.put)
+    stream, stream_b = await open_accepted_pair(yamux_a, accepted)
+
+    yamux_b.close()
+    await asyncio.wait_for(yamux_a.reader_task, timeout=1)
+
+    assert yamux_a.remote_go_away
+    with pytest.raises(YamuxError):
+        await yamux_a.open_stream("/test/1.0.0", None)
+    with pytest.raises(YamuxStreamReset):
+        await stream.read()
+    with pytest.raises(YamuxStreamReset):
+        await stream_b.read()
+
+
+@pytest.mark.asyncio
+async def test_keepalive_closes_unresponsive_peer():
+    yamux_a, yamux_b = await create_muxer_pair(Yamux, keepalive_interval=0.1)
+    # Stop the peer from answering pings without closing its connection
+    yamux_b.reader_task.cancel()
+
+    await asyncio.wait_for(yamux_a.keepalive_task, timeout=1)
+
+    assert yamux_a.is_closed()
+    yamux_b.close()
+
+
+def test_only_large_payloads_are_slices_of_the_chunk_read():
+    decoder = FrameDecoder(INITIAL_WINDOW_SIZE)
+    data_type = FRAME_TYPES["DATA"]
+    data = encode_header(data_type, 0, 1, 5) + b"hello" \
+        + encode_header(data_type, 0, 3, 100) + b"a" * 100
+
+    frames = decoder.feed(data[:50])
+    frames += decoder.feed(data[50:])
+
+    assert [bytes(frame[4]) for frame in frames] == [b"hello", b"a" * 100]
+    # The short payload is copied out of the chunk, so it does not keep it alive
+    assert isinstance(frames[0][4], bytes)
+    assert isinstance(frames[1][4], memoryview)
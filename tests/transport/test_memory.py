@@ -0,0 +1,117 @@
+import asyncio
+
+import multiaddr
+import pytest
+
+from libp2p import new_node
+from libp2p.transport.memory.memory import HIGH_WATER, MEMORY_PROTOCOL, MemoryNetwork, \
+    MemoryTransport, create_pipe
+from libp2p.transport.tcp.tcp import TCP
+from libp2p.transport.transport_registry import TransportRegistry
+from tests.utils import cleanup
+
+
+@pytest.mark.asyncio
+async def test_hosts_connect_in_memory():
+    # The memory transport is not installed by default
+    network = MemoryNetwork()
+    node_a, node_b = [await new_node(transport_opt=["/ip6/100::"]) for _ in range(2)]
+    for node in (node_a, node_b):
+        node.get_network().add_transport(MEMORY_PROTOCOL, MemoryTransport(network))
+        await node.get_network().listen(multiaddr.Multiaddr("/ip6/100::"))
+
+    async def echo(stream):
+        await stream.write(await stream.read())
+
+    node_b.set_stream_handler("/echo/1.0.0", echo)
+    addrs = node_b.get_network().listeners["/ip6/100::"].get_addrs()
+    assert str(addrs[0]).startswith("/ip6/100::")
+    assert str(addrs[0]) != "/ip6/100::"
+
+    node_a.get_peerstore().add_addrs(node_b.get_id(), node_b.get_addrs(), 10)
+    stream = await node_a.new_stream(node_b.get_id(), ["/echo/1.0.0"])
+    await stream.write(b"hello")
+    assert await stream.read() == b"hello"
+
+    await cleanup()
+
+
+@pytest.mark.asyncio
+async def test_listen_and_dial_errors():
+    network = MemoryNetwork()
+    transport = MemoryTransport(network)
+    listener = transport.create_listener(None)
+    await listener.listen(multiaddr.Multiaddr("/ip6/100::7"))
+
+    with pytest.raises(OSError):
+        await transport.create_listener(None).listen(multiaddr.Multiaddr("/ip6/100::7"))
+    assert transport.can_dial(multiaddr.Multiaddr("/ip6/100::7"))
+    assert not transport.can_dial(multiaddr.Multiaddr("/ip6/::1/tcp/1"))
+    assert not transport.can_dial(multiaddr.Multiaddr("/ip4/127.0.0.1/tcp/1"))
+
+    listener.close()
+    with pytest.raises(ConnectionRefusedError):
+        await transport.dial(multiaddr.Multiaddr("/ip6/100::7"), None)
+
+
+def test_registry_keeps_ip6_tcp_addresses_on_tcp():
+    registry = TransportRegistry()
+    tcp = TCP()
+    memory = MemoryTransport(MemoryNetwork())
+    registry.add_transport("tcp", tcp)
+    registry.add_transport(MEMORY_PROTOCOL, memory)
+
+    assert registry.get_transport(multiaddr.Multiaddr("/ip6/::1/tcp/8000")) is tcp
+    assert registry.get_transport(multiaddr.Multiaddr("/ip6/100::1/tcp/8000")) is tcp
+    assert registry.get_transport(multiaddr.Multiaddr("/ip4/127.0.0.1/tcp/8000")) is tcp
+    assert registry.get_transport(multiaddr.Multiaddr("/ip6/100::1")) is memory
+
+
+@pytest.mark.asyncio
+async def test_pipe_delivers_data_then_eof():
+    (reader_a, writer_a), (reader_b, writer_b) = create_pipe()
+    writer_a.write(b"hello ")
+    writer_a.writelines([b"wor", memoryview(b"ld")])
+    await writer_a.drain()
+    writer_a.close()
+
+    assert await reader_b.read() == b"hello world"
+    assert await reader_a.read() == b""
+
+    # The other end can no longer write
+    writer_b.write(b"dropped")
+    with pytest.raises(ConnectionResetError):
+        await writer_b.drain()
+
+
+@pytest.mark.asyncio
+async def test_pipe_latency_and_bandwidth():
+    loop = asyncio.get_event_loop()
+    (_, writer_a), (reader_b, _) = create_pipe(latency=0.05, bandwidth=100000)
+
+    start = loop.time()
+    writer_a.write(b"x")
+    await reader_b.readexactly(1)
+    assert loop.time() - start >= 0.05
+
+    start = loop.time()
+    writer_a.write(bytes(10000))
+    writer_a.write(bytes(10000))
+    writer_a.close()
+    assert len(await reader_b.read()) == 20000
+    # 20000 bytes at 100000 bytes/sec, plus the latency
+    assert loop.time() - start >= 0.25 - 0.01
+
+
+@pytest.mark.asyncio
+async def test_pipe_drain_waits_for_reader():
+    (_, writer_a), (reader_b, _) = create_pipe()
+    data = bytes(HIGH_WATER)
+    for _ in range(3):
+        writer_a.write(data)
+    drain = asyncio.ensure_future(writer_a.drain())
+    await asyncio.sleep(0.01)
+    assert not drain.done()
+
+    await reader_b.readexactly(3 * HIGH_WATER)
+    await asyncio.wait_for(drain, 1)
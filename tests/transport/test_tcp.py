@@ -18,3 +18,8 @@ async def test_multiaddr_from_socket():
     assert addr.value_for_protocol('ip4') == '127.0.0.1'
     port = addr.value_for_protocol('tcp')
     assert int(port) > 0
+
+    server = await asyncio.start_server(handler, '::1', 0)
+    addr = _multiaddr_from_socket(server.sockets[0])
+    assert addr.value_for_protocol('ip6') == '::1'
+    assert int(addr.value_for_protocol('tcp')) > 0
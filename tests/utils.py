@@ -6,10 +6,13 @@ from libp2p import new_node
 
 
 async def cleanup():
-    pending = asyncio.all_tasks()
+    pending = asyncio.all_tasks() - {asyncio.current_task()}
+    # Cancel every task before awaiting any, so that no task sees the streams
+    # of a connection whose reader was cancelled first being reset
     for task in pending:
         task.cancel()
 
+    for task in pending:
         # Now we should await task to execute it's cancellation.
         # Cancelled task raises asyncio.CancelledError that we can suppress:
         with suppress(asyncio.CancelledError):
@@ -25,10 +28,14 @@ async def set_up_nodes_by_transport_opt(transport_opt_list):
 
 async def echo_stream_handler(stream):
     while True:
-        read_string = (await stream.read()).decode()
+        read_bytes = await stream.read()
+        if not read_bytes:
+            # The other end closed the stream
+            break
 
-        resp = "ack:" + read_string
+        resp = "ack:" + read_bytes.decode()
         await stream.write(resp.encode())
+    await stream.close()
 
 async def perform_two_host_set_up_custom_handler(handler):
     transport_opt_list = [["/ip4/127.0.0.1/tcp/0"], ["/ip4/127.0.0.1/tcp/0"]]